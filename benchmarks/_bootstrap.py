@@ -0,0 +1,36 @@
+"""
+Make the backend importable as `app` (the name it has inside the API
+container) and point it at a scratch database before the settings load.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "src" / "backend"
+
+
+def bootstrap(database_url: str = None):
+    if "app" in sys.modules:
+        return
+    if database_url is None and "DATABASE_URL" not in os.environ:
+        scratch = Path(tempfile.mkdtemp(prefix="opensight-bench-")) / "bench.db"
+        database_url = f"sqlite:///{scratch}"
+        os.environ.setdefault("RAW_BATCH_DIR", str(scratch.parent / "raw_batches"))
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    # Stay offline so timings do not depend on the rates API
+    os.environ.setdefault("FX_LIVE_RATES_URL", "")
+    # Importable by path too, for spawned worker processes
+    link_dir = Path(tempfile.mkdtemp(prefix="opensight-bench-path-"))
+    (link_dir / "app").symlink_to(BACKEND, target_is_directory=True)
+    sys.path.insert(0, str(link_dir))
+
+    spec = importlib.util.spec_from_file_location(
+        "app", BACKEND / "__init__.py", submodule_search_locations=[str(BACKEND)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["app"] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,36 @@
+import os
+import time
+
+import pytest
+
+from _bootstrap import bootstrap
+
+bootstrap()
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    # Minimal stand-in so the cases still run (once, timed) without the plugin
+    class _Benchmark:
+        def __call__(self, fn, *args, **kwargs):
+            return self.pedantic(fn, args=args, kwargs=kwargs)
+
+        def pedantic(self, fn, args=(), kwargs=None, setup=None, rounds=1, iterations=1, **_):
+            result = None
+            for _ in range(rounds):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    result = fn(*args, **(kwargs or {}))
+                print(f"{fn.__name__}: {time.perf_counter() - start:.4f}s")
+            return result
+
+    @pytest.fixture
+    def benchmark():
+        return _Benchmark()
+
+
+@pytest.fixture(scope="session")
+def bench_rows() -> int:
+    return int(os.environ.get("BENCH_ROWS", "10000"))
@@ -0,0 +1,307 @@
+"""
+Benchmark stages shared by the CLI (run.py) and the pytest cases.
+
+Each stage is timed on its own so a regression points at one function:
+synthetic data is written to CSV, bulk-loaded through the upload endpoint,
+extracted, cleaned step by step, loaded into sales_events and then read back
+through every KPIService method, the insight generator and the PDF report.
+"""
+import asyncio
+import os
+import platform
+import resource
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from _bootstrap import ROOT, bootstrap
+
+bootstrap()
+
+from fastapi import UploadFile  # noqa: E402
+from app import main  # noqa: E402,F401  (creates the tables)
+from app.api.endpoints import ingest  # noqa: E402
+from app.core import cache  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.etl import leases, synthetic  # noqa: E402
+from app.etl.flows import main_flow  # noqa: E402
+from app.etl.processors import currency, deduplication, validation  # noqa: E402
+from app.insights.generator import InsightGenerator  # noqa: E402
+from app.models.base import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.raw import OrderRowHash, RawBatch  # noqa: E402
+from app.services.forecasting import forecast_engine  # noqa: E402
+from app.services.kpi_service import KPIService  # noqa: E402
+
+# name -> call on a KPIService
+KPI_CALLS: Dict[str, Callable] = {
+    "get_daily_revenue": lambda kpi: kpi.get_daily_revenue(days=30),
+    "get_conversion_by_channel": lambda kpi: kpi.get_conversion_by_channel(),
+    "get_summary_metrics": lambda kpi: kpi.get_summary_metrics(days=30),
+    "get_revenue_forecast": lambda kpi: kpi.get_revenue_forecast(forecast_days=30),
+    "get_revenue_forecast[channel]": lambda kpi: kpi.get_revenue_forecast(forecast_days=30, by="channel"),
+    "get_revenue_forecast[product_id]": lambda kpi: kpi.get_revenue_forecast(forecast_days=30, by="product_id"),
+}
+
+
+# One loop for every async call so pooled async connections stay usable
+_loop = asyncio.new_event_loop()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def git_sha() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class Recorder:
+    """
+    Collects one timing record per stage.
+    """
+    def __init__(self, rows: int, verbose: bool = True):
+        self.rows = rows
+        self.verbose = verbose
+        self.stages: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        rows = self.rows if rows is None else rows
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        record = {
+            "stage": name,
+            "rows": rows,
+            "seconds": round(seconds, 4),
+            "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        self.stages.append(record)
+        if self.verbose:
+            print(f"  {name:<44} {seconds:>9.3f}s  {record['peak_rss_mb']:>8.1f} MB")
+
+    def skip(self, name: str, reason: str):
+        self.stages.append({"stage": name, "rows": self.rows, "skipped": reason})
+        if self.verbose:
+            print(f"  {name:<44} skipped ({reason})")
+
+
+def reset_database():
+    """
+    Start every run from empty tables and cold caches.
+    """
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    clear_caches()
+
+
+def clear_caches():
+    cache.results.clear()
+    forecast_engine.models.clear()
+    currency._rate_cache.clear()
+
+
+def write_csv(path: Path, n_rows: int, seed: int = 42, chunk_size: int = 500_000) -> Path:
+    """
+    Write synthetic sales data chunk by chunk so large runs stay bounded in memory.
+    """
+    path = Path(path)
+    with open(path, "w", newline="") as fh:
+        for i, chunk in enumerate(synthetic.iter_sales_chunks(n_rows, chunk_size=chunk_size, seed=seed)):
+            chunk.to_csv(fh, header=i == 0, index=False)
+    return path
+
+
+def upload(path: Path) -> dict:
+    """
+    Call the upload endpoint directly, as FastAPI would with a spooled file.
+    """
+    with open(path, "rb") as fh:
+        return _loop.run_until_complete(
+            ingest.upload_file(UploadFile(fh, filename=Path(path).name), mapping=None,
+                               upload_token=None, force=False, timestamp_format=None)
+        )
+
+
+def forget_ingested():
+    """
+    Drop the file and row hashes of earlier uploads, so uploading the same
+    file again is timed as a first upload instead of a skipped duplicate.
+    """
+    db = SessionLocal()
+    try:
+        db.query(OrderRowHash).delete()
+        db.query(RawBatch).update({RawBatch.content_hash: None})
+        db.commit()
+    finally:
+        db.close()
+
+
+def extract() -> pd.DataFrame:
+    return main_flow.extract_raw_events.fn(leases.new_worker_id())
+
+
+def parse_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    # validate_data already parsed timestamp into timestamp_utc
+    if "timestamp_utc" not in df.columns:
+        df["timestamp_utc"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def drop_exact_duplicates(valid_df: pd.DataFrame, invalid_df: pd.DataFrame):
+    """
+    remove_duplicates plus the bookkeeping clean_data does for dropped rows.
+    """
+    deduped = deduplication.remove_duplicates(valid_df, key="order_id")
+    duplicates = valid_df.loc[~valid_df.index.isin(deduped.index)].copy()
+    if not duplicates.empty:
+        duplicates["error"] = "Duplicate order_id in batch"
+        duplicates["error_codes"] = validation.DUPLICATE_ORDER
+        invalid_df = pd.concat([invalid_df, duplicates])
+    return deduped, invalid_df
+
+
+def fuzzy_dedup(df: pd.DataFrame) -> pd.DataFrame:
+    return deduplication.fuzzy_deduplicate_customers(df, workers=settings.DEDUP_WORKERS or None)
+
+
+def run_async(make_coro: Callable):
+    """
+    Run make_coro(db) with a fresh AsyncSession to completion.
+    """
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await make_coro(db)
+    return _loop.run_until_complete(run())
+
+
+def run_kpi(name: str):
+    return run_async(lambda db: KPI_CALLS[name](KPIService(db)))
+
+
+def run_insights():
+    return run_async(lambda db: InsightGenerator(db).generate_insights())
+
+
+def load_report_generator():
+    """
+    The PDF stage needs WeasyPrint and its system libraries; None when missing.
+    """
+    try:
+        from app.generate_report import collect_report_data, render_pdf_report
+    except (ImportError, OSError):
+        return None
+
+    def generate_pdf_report(output_path: str):
+        return render_pdf_report(output_path, run_async(collect_report_data))
+    return generate_pdf_report
+
+
+def run_benchmark(n_rows: int, workdir: Path, seed: int = 42, verbose: bool = True) -> dict:
+    """
+    Run every stage once at `n_rows` rows and return the timing records.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    csv_path = workdir / f"sales_{n_rows}.csv"
+    rec = Recorder(n_rows, verbose=verbose)
+    if verbose:
+        print(f"{n_rows:,} rows")
+
+    reset_database()
+    with rec.stage("generate"):
+        write_csv(csv_path, n_rows, seed=seed)
+    with rec.stage("upload_file"):
+        upload(csv_path)
+    with rec.stage("extract_raw_events"):
+        raw = extract()
+    with rec.stage("validate_data"):
+        valid, invalid = validation.validate_data(raw)
+    del raw
+    with rec.stage("parse_timestamps", len(valid)):
+        valid = parse_timestamps(valid)
+    with rec.stage("normalise", len(valid)):
+        valid = currency.normalise(valid, target_currency="USD")
+    with rec.stage("remove_duplicates", len(valid)):
+        valid, invalid = drop_exact_duplicates(valid, invalid)
+    with rec.stage("fuzzy_deduplicate_customers", len(valid)):
+        valid = fuzzy_dedup(valid)
+    with rec.stage("load_to_canonical", len(valid) + len(invalid)):
+        load_report = main_flow.load_to_canonical.fn(valid, invalid)
+    if "error" in load_report:
+        raise RuntimeError(f"load_to_canonical failed: {load_report['error']}")
+    del valid, invalid
+
+    for name in KPI_CALLS:
+        clear_caches()
+        with rec.stage(f"KPIService.{name}"):
+            run_kpi(name)
+    clear_caches()
+    with rec.stage("generate_insights"):
+        run_insights()
+
+    generate_pdf_report = load_report_generator()
+    if generate_pdf_report is None:
+        rec.skip("generate_pdf_report", "weasyprint not installed")
+    else:
+        clear_caches()
+        with rec.stage("generate_pdf_report"):
+            generate_pdf_report(str(workdir / "report.pdf"))
+
+    if csv_path.exists():
+        os.remove(csv_path)
+    timed = [s["seconds"] for s in rec.stages if "seconds" in s]
+    return {"rows": n_rows, "total_seconds": round(sum(timed), 4), "stages": rec.stages}
+
+
+def result_metadata() -> dict:
+    return {
+        "git_sha": git_sha(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": settings.DATABASE_URL.split(":", 1)[0],
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current: dict, previous: dict, threshold: float = 1.2, min_seconds: float = 0.01) -> List[dict]:
+    """
+    Match stages by (rows, stage) and report the slowdown ratio. Stages that got
+    slower than `threshold` times the previous run are flagged; stages faster
+    than `min_seconds` in both runs are too noisy to flag.
+    """
+    before = {
+        (run["rows"], s["stage"]): s["seconds"]
+        for run in previous.get("runs", []) for s in run["stages"] if "seconds" in s
+    }
+    rows = []
+    for run in current.get("runs", []):
+        for s in run["stages"]:
+            key = (run["rows"], s["stage"])
+            if "seconds" not in s or key not in before:
+                continue
+            old, new = before[key], s["seconds"]
+            ratio = new / old if old > 0 else None
+            rows.append({
+                "rows": run["rows"],
+                "stage": s["stage"],
+                "before": old,
+                "after": new,
+                "ratio": round(ratio, 3) if ratio is not None else None,
+                "regression": bool(ratio and ratio > threshold and max(old, new) >= min_seconds),
+            })
+    return rows
@@ -0,0 +1,63 @@
+"""
+Time every pipeline stage on synthetic data and write the results to JSON.
+
+    python benchmarks/run.py --rows 10000 1000000 10000000
+    python benchmarks/run.py --rows 10000 --compare benchmarks/results/<previous>.json
+
+Set DATABASE_URL to benchmark against Postgres; by default a scratch SQLite
+file is used. Comparing with an earlier results file prints per-stage
+slowdown ratios and exits non-zero when a stage regressed.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import harness
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parent / "results"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000],
+                        help="data set sizes to run (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None,
+                        help="results file (default: benchmarks/results/<sha>-<time>.json)")
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio counted as a regression (default: 1.2)")
+    parser.add_argument("--workdir", type=Path, default=None,
+                        help="directory for generated CSV and PDF files")
+    args = parser.parse_args(argv)
+
+    results = harness.result_metadata()
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="opensight-bench-"))
+    results["runs"] = [harness.run_benchmark(n, workdir, seed=args.seed) for n in args.rows]
+
+    output = args.output
+    if output is None:
+        stamp = results["timestamp"].replace(":", "").replace("-", "")
+        output = DEFAULT_OUTPUT_DIR / f"{(results['git_sha'] or 'nogit')[:10]}-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text())
+        rows = harness.compare(results, previous, threshold=args.threshold)
+        print(f"\nCompared with {args.compare} ({(previous.get('git_sha') or '?')[:10]})")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"  {row['rows']:>10,} {row['stage']:<44} {row['before']:>9.3f}s -> "
+                  f"{row['after']:>9.3f}s  x{row['ratio']}{flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+pytest-benchmark cases for each pipeline stage.
+
+    pytest benchmarks/ --benchmark-json=benchmarks/results/latest.json
+    BENCH_ROWS=1000000 pytest benchmarks/
+
+The module fixture runs the whole pipeline once so every stage can be timed
+on the same input; stages are then re-run on copies of their input.
+"""
+import pytest
+
+import harness
+from app.etl import synthetic
+from app.etl.processors import currency, deduplication, validation
+
+
+@pytest.fixture(scope="module")
+def frames(bench_rows, tmp_path_factory):
+    harness.reset_database()
+    csv_path = harness.write_csv(tmp_path_factory.mktemp("bench") / "sales.csv", bench_rows)
+    harness.upload(csv_path)
+
+    out = {"csv": csv_path, "raw": harness.extract()}
+    valid, invalid = validation.validate_data(out["raw"])
+    out["validated"] = harness.parse_timestamps(valid)
+    out["normalised"] = currency.normalise(out["validated"].copy())
+    valid, invalid = harness.drop_exact_duplicates(out["normalised"], invalid)
+    out["deduped"] = valid
+    out["clean"] = harness.fuzzy_dedup(valid.copy())
+    out["invalid"] = invalid
+    report = harness.main_flow.load_to_canonical.fn(out["clean"], invalid)
+    assert "error" not in report
+    return out
+
+
+def test_generate_sales(benchmark, bench_rows):
+    df = benchmark(synthetic.generate_sales, bench_rows, seed=1)
+    assert len(df) == bench_rows
+
+
+def test_upload_file(benchmark, frames, bench_rows):
+    result = benchmark.pedantic(harness.upload, args=(frames["csv"],), setup=harness.forget_ingested, rounds=1)
+    assert result["rows"] == bench_rows
+
+
+def test_validate_data(benchmark, frames):
+    valid, invalid = benchmark(validation.validate_data, frames["raw"].copy())
+    assert len(valid) + len(invalid) == len(frames["raw"])
+
+
+def test_normalise(benchmark, frames):
+    df = benchmark(currency.normalise, frames["validated"].copy())
+    assert df["net_amount"].notna().all()
+
+
+def test_remove_duplicates(benchmark, frames):
+    df = benchmark(deduplication.remove_duplicates, frames["normalised"], "order_id")
+    assert df["order_id"].is_unique
+
+
+def test_fuzzy_deduplicate_customers(benchmark, frames):
+    df, mapping = benchmark(deduplication.match_customers, frames["deduped"].copy())
+    assert len(mapping) >= df["customer_name"].nunique()
+
+
+def test_load_to_canonical(benchmark, frames):
+    report = benchmark.pedantic(
+        harness.main_flow.load_to_canonical.fn, args=(frames["clean"], frames["invalid"]), rounds=1
+    )
+    assert "error" not in report
+
+
+@pytest.mark.parametrize("name", list(harness.KPI_CALLS))
+def test_kpi_service(benchmark, frames, name):
+    benchmark.pedantic(harness.run_kpi, args=(name,), setup=harness.clear_caches, rounds=3)
+
+
+def test_generate_insights(benchmark, frames):
+    benchmark.pedantic(harness.run_insights, setup=harness.clear_caches, rounds=3)
+
+
+def test_generate_pdf_report(benchmark, frames, tmp_path):
+    generate_pdf_report = harness.load_report_generator()
+    if generate_pdf_report is None:
+        pytest.skip("weasyprint not installed")
+    benchmark.pedantic(
+        generate_pdf_report, args=(str(tmp_path / "report.pdf"),), setup=harness.clear_caches, rounds=1
+    )
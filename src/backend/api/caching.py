@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import get_data_version_async
+
+
+async def check_not_modified(request: Request, response: Response, db: AsyncSession) -> bool:
+    """
+    Set ETag/Last-Modified from the data version and return True when the
+    client's conditional headers show its copy is still current (answer 304).
+    """
+    version, updated_at = await get_data_version_async(db)
+    today = datetime.utcnow().date()
+    # Results depend on "today" too, so validators roll over at midnight UTC
+    last_modified = max(updated_at, datetime.combine(today, datetime.min.time()))
+    etag = f'W/"{version}-{today.isoformat()}"'
+
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_datetime(
+        last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+    )
+    response.headers["Cache-Control"] = "no-cache"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified_response(response: Response) -> Response:
+    return Response(status_code=304, headers={
+        key: response.headers[key] for key in ("ETag", "Last-Modified", "Cache-Control")
+    })
@@ -1,53 +1,233 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-import pandas as pd
-from io import StringIO
-from sqlalchemy.orm import Session
-from app.models.base import get_db
-from app.models.raw import RawEvent
+import asyncio
+import functools
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from app.core.config import settings
+from app.core.executor import run_ingest
+from app.etl.processors import timestamps
+from app.models.base import SessionLocal
+from app.services import ingest_service, upload_preview
+from app.services.event_stream import BufferFull, event_batcher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/upload")
-async def upload_file(
-    file: UploadFile = File(...), 
-    mapping: str = None, # JSON string of mapping
-    db: Session = Depends(get_db)
-):
-    import json
+ALLOWED_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+# Parsed events handed to the batcher at a time during a push
+EVENT_GROUP_SIZE = 1000
+# Rejected lines listed in a push response
+MAX_REPORTED_ERRORS = 20
+# Uploads whose progress /uploads/{upload_id} remembers, per API process
+MAX_TRACKED_UPLOADS = 1000
+
+_progress = OrderedDict()
+_progress_lock = threading.Lock()
+
+
+def _update_progress(upload_id: str, **fields):
+    with _progress_lock:
+        _progress[upload_id] = {**_progress.get(upload_id, {}), **fields}
+        _progress.move_to_end(upload_id)
+        while len(_progress) > MAX_TRACKED_UPLOADS:
+            _progress.popitem(last=False)
+
+@router.post("/preview")
+async def preview_file(file: UploadFile = File(...)):
+    """
+    Stage an upload and describe it from its first rows: encoding,
+    delimiter, column types and date formats, sample rows and a proposed
+    mapping. Ingest it later with the returned upload_token instead of
+    sending the file again.
+    """
     filename = file.filename.lower()
-    contents = await file.read()
-    
+    if not filename.endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(400, "Only CSV or Excel files allowed")
     try:
-        if filename.endswith('.csv'):
-            df = pd.read_csv(StringIO(contents.decode('utf-8')))
-        elif filename.endswith(('.xls', '.xlsx')):
-            from io import BytesIO
-            df = pd.read_excel(BytesIO(contents))
-        else:
-            raise HTTPException(400, "Only CSV or Excel files allowed")
+        return await run_ingest(upload_preview.stage, file.file, filename)
     except Exception as e:
         raise HTTPException(400, f"Error reading file: {e}")
-    
-    # Apply mapping if provided
+
+@router.post("/upload")
+async def upload_file(
+    file: UploadFile = File(None),
+    mapping: str = Form(None), # JSON string of mapping
+    upload_token: str = Form(None), # from /preview, instead of the file
+    force: bool = Form(False), # stage even if this file was ingested before
+    timestamp_format: str = Form(None), # confirmed date format, e.g. a choice from /preview
+    upload_id: str = Form(None), # to follow progress at /uploads/{upload_id}; generated if missing
+):
+    """
+    Stage a file (or a previewed upload_token) as a raw batch. Progress is
+    published at /uploads/{upload_id} while the file is read, and the
+    final counts are returned with the upload_id.
+    """
+    staged = None
+    if upload_token:
+        try:
+            staged = upload_preview.load(upload_token)
+        except KeyError:
+            raise HTTPException(404, "Upload token not found or expired, preview the file again")
+        filename = staged['filename']
+    elif file is not None:
+        filename = file.filename.lower()
+    else:
+        raise HTTPException(400, "Send a file or an upload_token")
+    if not filename.endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(400, "Only CSV or Excel files allowed")
+    if timestamp_format and not timestamps.is_format(timestamp_format):
+        raise HTTPException(400, f"Not a timestamp format: {timestamp_format!r}")
+
+    # Parse mapping once, it is applied to every chunk
+    mapping_dict = None
     if mapping:
         try:
             mapping_dict = json.loads(mapping)
-            # Rename columns based on mapping
-            # mapping_dict format: {"target_field": "source_column"}
-            inv_map = {v: k for k, v in mapping_dict.items()}
-            df = df.rename(columns=inv_map)
         except Exception as e:
             print(f"Mapping error: {e}")
 
-    # Store raw data
-    raw_records = df.to_dict(orient='records')
-    for record in raw_records:
-        raw_event = RawEvent(
-            source=filename,
-            data=record,
-            status="pending"
-        )
-        db.add(raw_event)
-    
-    db.commit()
-    return {"message": "File ingested", "rows": len(df)}
+    upload_id = upload_id or uuid.uuid4().hex
+    _update_progress(upload_id, status="running", filename=filename, rows=0, chunks=0,
+                     bytes_read=0, total_bytes=None)
+
+    def report(progress):
+        _update_progress(upload_id, **progress)
+        logger.debug("Ingest %s: %s rows in %s chunks (%s/%s bytes)", filename, progress['rows'],
+                     progress['chunks'], progress['bytes_read'], progress['total_bytes'])
+
+    def stage(fileobj, **options):
+        # Sessions are not thread-safe: open one in the thread that uses it
+        db = SessionLocal()
+        try:
+            return ingest_service.stage_upload(
+                db, fileobj, filename, mapping=mapping_dict, on_progress=report, force=force,
+                timestamp_format=timestamp_format or None, **options
+            )
+        finally:
+            db.close()
+
+    def stage_staged_file():
+        with open(staged['path'], 'rb') as f:
+            result = stage(f, encoding=staged['encoding'], delimiter=staged['delimiter'])
+        upload_preview.discard(upload_token)
+        return result
+
+    # Stream straight from the spooled upload (or the staged file) instead of
+    # reading it into memory; parsing and the inserts run on the ingest
+    # executor, off the event loop
+    try:
+        if staged is not None:
+            result = await run_ingest(stage_staged_file)
+        else:
+            result = await run_ingest(stage, file.file)
+    except Exception as e:
+        _update_progress(upload_id, status="failed", error=str(e))
+        raise HTTPException(400, f"Error reading file: {e}")
+
+    if result.get("duplicate_of") is not None:
+        response = {"message": "File already ingested", "rows": 0, "chunks": 0, "staged": 0,
+                    "skipped": 0, "duplicate_of": result["duplicate_of"]}
+    else:
+        response = {"message": "File ingested", "rows": result["rows"], "chunks": result["chunks"],
+                    "staged": result["staged"], "skipped": result["skipped"]}
+    _update_progress(upload_id, **response, status="done")
+    return {**response, "upload_id": upload_id}
+
+@router.get("/uploads/{upload_id}")
+def upload_progress(upload_id: str):
+    """
+    Rows, chunks and bytes read so far by an upload to this API process,
+    and its status (running, done or failed).
+    """
+    with _progress_lock:
+        progress = _progress.get(upload_id)
+    if progress is None:
+        raise HTTPException(404, "Upload not found")
+    return progress
+
+@router.post("/events")
+async def push_events(request: Request):
+    """
+    Push sales events as they happen, as NDJSON (one JSON object per line,
+    parsed while the body streams in) or, with Content-Type
+    application/json, as one object or an array of objects. Events are
+    buffered and written to raw batches in micro-batches; when the buffer
+    is full the push waits, and gets a 429 (with the number of events
+    accepted so far) if no room frees up within EVENT_PUT_TIMEOUT.
+    Entries that are not JSON objects are skipped and reported.
+    """
+    accepted, rejected, errors = 0, 0, []
+    group = []
+
+    def add(line, value):
+        nonlocal rejected
+        if isinstance(value, dict):
+            group.append(value)
+            return
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "error": "Expected a JSON object"})
+
+    def add_line(line, raw):
+        nonlocal rejected
+        if not raw.strip():
+            return
+        try:
+            add(line, json.loads(raw))
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": str(e)})
+
+    async def hand_over():
+        nonlocal accepted
+        if not event_batcher.offer(group):
+            # Buffer full: wait for the batcher off the event loop, which
+            # also stops reading the body and slows the client down
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(
+                    None, functools.partial(event_batcher.put, group, settings.EVENT_PUT_TIMEOUT)
+                )
+            except BufferFull as e:
+                detail = {"message": f"Event buffer full: {e}", "accepted": accepted}
+                headers = {"Retry-After": str(max(1, round(settings.EVENT_FLUSH_SECONDS)))}
+                raise HTTPException(429, detail, headers=headers)
+        accepted += len(group)
+        group.clear()
+
+    if request.headers.get("content-type", "").split(";")[0].strip() == "application/json":
+        try:
+            payload = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(400, f"Invalid JSON: {e}")
+        for i, value in enumerate(payload if isinstance(payload, list) else [payload], 1):
+            add(i, value)
+            if len(group) >= EVENT_GROUP_SIZE:
+                await hand_over()
+    else:
+        line, pending = 0, b""
+        async for chunk in request.stream():
+            *lines, pending = (pending + chunk).split(b"\n")
+            for raw in lines:
+                line += 1
+                add_line(line, raw)
+                if len(group) >= EVENT_GROUP_SIZE:
+                    await hand_over()
+        if pending:
+            add_line(line + 1, pending)
+    if group:
+        await hand_over()
+
+    return {"accepted": accepted, "rejected": rejected, "errors": errors}
+
+@router.get("/events/stats")
+def event_stats():
+    """
+    Events accepted, buffered and written by this API process.
+    """
+    return event_batcher.stats()
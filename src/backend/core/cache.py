@@ -0,0 +1,148 @@
+import copy
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.bulk import upsert
+from app.models.version import DataVersion
+
+SALES_DATA = "sales"
+_EPOCH = datetime(1970, 1, 1)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used entry.
+    By default the bound is a number of entries; with `weigh` it is the total
+    weight of the values (e.g. weigh=len for a byte budget).
+    """
+    def __init__(self, maxsize: int, weigh: Optional[Callable] = None):
+        self.maxsize = maxsize
+        self.weigh = weigh or (lambda value: 1)
+        self._data = OrderedDict()
+        self._weights = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        weight = self.weigh(value)
+        with self._lock:
+            self._total += weight - self._weights.get(key, 0)
+            self._data[key] = value
+            self._weights[key] = weight
+            self._data.move_to_end(key)
+            while self._total > self.maxsize and self._data:
+                old, _ = self._data.popitem(last=False)
+                self._total -= self._weights.pop(old)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._total = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+results = LRUCache(settings.RESULT_CACHE_SIZE)
+
+
+def get_data_version(db: Session, name: str = SALES_DATA) -> Tuple[int, datetime]:
+    """
+    Current (version, updated_at) of a data set. Read once per session so that
+    every cached call made while serving one request sees the same version.
+    """
+    key = ("data_version", name)
+    if key not in db.info:
+        row = db.query(DataVersion.version, DataVersion.updated_at).filter(
+            DataVersion.name == name
+        ).first()
+        db.info[key] = (row.version, row.updated_at) if row else (0, _EPOCH)
+    return db.info[key]
+
+
+async def get_data_version_async(db: AsyncSession, name: str = SALES_DATA) -> Tuple[int, datetime]:
+    """
+    get_data_version for an AsyncSession.
+    """
+    key = ("data_version", name)
+    if key not in db.info:
+        result = await db.execute(
+            select(DataVersion.version, DataVersion.updated_at).where(DataVersion.name == name)
+        )
+        row = result.first()
+        db.info[key] = (row.version, row.updated_at) if row else (0, _EPOCH)
+    return db.info[key]
+
+
+def bump_data_version(db: Session, name: str = SALES_DATA):
+    """
+    Increment the version in the caller's transaction; it becomes visible,
+    and invalidates cached results, when the transaction commits.
+    """
+    stmt = upsert(db, DataVersion.__table__, ["name"], ["updated_at"], ["version"])
+    db.execute(stmt, {"name": name, "version": 1, "updated_at": datetime.utcnow()})
+    db.info.pop(("data_version", name), None)
+
+
+def _copy(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+def cached_result(method):
+    """
+    Cache a service method's result keyed by method, arguments, data version
+    and the current UTC date (periods are relative to today). The service
+    must expose its session as `self.db`; coroutine methods need an
+    AsyncSession. Callers get a copy, so mutating a result never corrupts
+    the cache.
+    """
+    def cache_key(args, kwargs, version):
+        return (
+            method.__qualname__, args, tuple(sorted(kwargs.items())),
+            version, datetime.utcnow().date(),
+        )
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            version, _ = await get_data_version_async(self.db)
+            key = cache_key(args, kwargs, version)
+            value = results.get(key)
+            if value is None:
+                value = await method(self, *args, **kwargs)
+                results.set(key, value)
+            return _copy(value)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        version, _ = get_data_version(self.db)
+        key = cache_key(args, kwargs, version)
+        value = results.get(key)
+        if value is None:
+            value = method(self, *args, **kwargs)
+            results.set(key, value)
+        return _copy(value)
+    return wrapper
@@ -1,13 +1,76 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "OpenSight"
     DATABASE_URL: str = "sqlite:///./data.db"
+    # Derived from DATABASE_URL (aiosqlite/asyncpg) when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
     SECRET_KEY: str = "your-secret-key-change-me"
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
-    
+
+    # API
+    CPU_WORKERS: int = 2  # threads running KPI/forecast/insight pandas work off the event loop
+    INGEST_WORKERS: int = 2  # threads parsing and staging uploads
+    REPORT_WORKERS: int = 1  # threads rendering PDF reports
+
+    # Ingestion
+    INGEST_CHUNK_SIZE: int = 50000  # rows parsed and written to the raw batch file at a time
+    RAW_BATCH_DIR: str = "./data/raw_batches"  # one compressed Arrow file per staged upload
+    # Files of raw batches without pending rows are deleted after this
+    RAW_BATCH_RETENTION_DAYS: float = 7
+    UPLOAD_STAGING_DIR: str = "./data/uploads"  # previewed uploads waiting to be ingested
+    UPLOAD_TOKEN_TTL: int = 3600  # seconds a staged upload can be ingested by token
+    PREVIEW_BYTES: int = 64 * 1024  # head of a CSV sniffed for the preview
+    PREVIEW_ROWS: int = 20  # sample rows returned by the preview
+    EVENT_BATCH_SIZE: int = 5000  # pushed events written per raw batch
+    EVENT_FLUSH_SECONDS: float = 1.0  # longest a pushed event waits in memory before it is written
+    EVENT_BUFFER_SIZE: int = 50000  # pushed events held in memory; producers wait beyond this
+    EVENT_PUT_TIMEOUT: float = 5.0  # seconds a push waits for buffer room before a 429
+    EVENT_RUN_ETL: bool = True  # queue an ETL run after written batches of events
+    EVENT_ETL_SECONDS: float = 30.0  # shortest interval between ETL runs queued by pushed events
+
+    # ETL
+    ETL_CHUNKED: bool = True  # process pending raw events in pipelined chunks
+    ETL_CHUNK_SIZE: int = 10000  # raw events per chunk
+    ETL_QUEUE_DEPTH: int = 2  # chunks buffered between extract, clean and load
+    ETL_LEASE_SECONDS: int = 600  # claimed raw events return to the pool after this
+    ETL_WORKERS: int = 4  # processes started by `python -m app.etl.worker`
+    # Queued/running jobs whose API process went quiet this long are failed
+    ETL_JOB_LEASE_SECONDS: int = 120
+    DEFAULT_TIMEZONE: str = "UTC"  # zone of timestamps without an offset
+    # Source name pattern -> zone, e.g. {"shopify_*.csv": "America/New_York"}
+    SOURCE_TIMEZONES: Dict[str, str] = {}
+    # Source name pattern -> format, e.g. {"us_*.csv": "%m/%d/%Y"}
+    SOURCE_TIMESTAMP_FORMATS: Dict[str, str] = {}
+    # "day" or "month": how 03/04/2024 is read when no value of a batch tells
+    DEFAULT_DATE_ORDER: str = "day"
+
+    # Result cache
+    RESULT_CACHE_SIZE: int = 256  # cached KPI/insight results (LRU)
+
+    # Analytics
+    KPI_BACKEND: str = "sql"  # "sql" (daily rollups) or "duckdb" (Parquet copy of sales_events)
+    # Date-partitioned files written by the ETL for duckdb (a symlink to the current copy)
+    PARQUET_PATH: str = "./data/parquet/sales_events"
+
+    # Reports
+    REPORT_CACHE_BYTES: int = 64 * 1024 * 1024  # rendered PDFs kept in memory (LRU)
+
+    # Forecasting
+    FORECAST_WORKERS: int = 2  # processes fitting Holt-Winters models
+    FORECAST_VECTORIZED_MAX_DAYS: int = 28  # shorter series use the vectorized NumPy model
+
+    # Currency rates
+    FX_RATES_PATH: Optional[str] = None  # CSV/Parquet with date,currency,rate (USD per unit)
+    FX_RATES_TTL: int = 3600  # seconds before the rate table is reloaded
+    # Empty to stay offline
+    FX_LIVE_RATES_URL: Optional[str] = "https://open.er-api.com/v6/latest/USD"
+
+    # Customer deduplication
+    DEDUP_WORKERS: int = 0  # scoring processes, 0 = one per CPU
+
     # Google Sheets (optional)
     GOOGLE_SHEETS_CREDENTIALS: Optional[str] = None
 
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from app.core.config import settings
+
+# Blocking work runs here rather than on the event loop or the threadpool
+# that serves sync endpoints, with one pool per workload: a burst of
+# uploads or report renders queues behind itself and never delays the
+# KPI/insight requests, which get CPU_WORKERS threads of their own.
+# ETL runs and Holt-Winters fits use worker processes (see etl_jobs and
+# forecasting), not these threads.
+cpu_executor = ThreadPoolExecutor(max_workers=settings.CPU_WORKERS, thread_name_prefix="cpu")
+ingest_executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS,
+                                     thread_name_prefix="ingest")
+report_executor = ThreadPoolExecutor(max_workers=settings.REPORT_WORKERS,
+                                     thread_name_prefix="report")
+
+
+async def run_in(executor: Executor, fn, *args, **kwargs):
+    """
+    Run a blocking call on `executor` and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run a blocking, CPU-heavy analytics call (pandas, forecasts, insights)
+    on the dedicated executor and await its result.
+    """
+    return await run_in(cpu_executor, fn, *args, **kwargs)
+
+
+async def run_ingest(fn, *args, **kwargs):
+    """
+    Run upload parsing and staging on the ingest executor.
+    """
+    return await run_in(ingest_executor, fn, *args, **kwargs)
+
+
+async def run_report(fn, *args, **kwargs):
+    """
+    Run PDF rendering on the report executor.
+    """
+    return await run_in(report_executor, fn, *args, **kwargs)
@@ -1,31 +1,83 @@
 from prefect import flow, task
+import logging
 import pandas as pd
+from app.core.cache import bump_data_version
+from app.core.config import settings
+from app.etl import leases, raw_batches, row_hashes
+from app.etl.loaders import canonical, columnar
+from app.etl.pipeline import run_pipelined
 from app.etl.processors import currency, deduplication, validation
 from app.models.base import SessionLocal
-from app.models.raw import RawEvent
-from app.models.sales_event import SalesEvent
+from app.services import etl_jobs, event_stream, name_index
 from datetime import datetime
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+def _events_to_frame(raw_events) -> pd.DataFrame:
+    # Flatten the data from JSONB
+    df = pd.DataFrame([event.data for event in raw_events])
+    # Add raw_event_id to track back
+    df['raw_event_id'] = [event.id for event in raw_events]
+    sources = {event.source for event in raw_events}
+    if len(sources) == 1:
+        df.attrs['source'] = sources.pop()
+    return df
 
 @task
-def extract_raw_events():
+def extract_raw_events(worker_id: str):
     """
-    Load from raw_events table (unprocessed)
+    Claim and load all unprocessed events from raw_events and raw batches
     """
     db = SessionLocal()
     try:
-        raw_events = db.query(RawEvent).filter(RawEvent.status == "pending").all()
-        if not raw_events:
+        frames = []
+        raw_events = leases.claim_batch(db, worker_id, None, settings.ETL_LEASE_SECONDS)
+        if raw_events:
+            frames.append(_events_to_frame(raw_events))
+        while True:
+            claim = leases.claim_range(db, worker_id, None, settings.ETL_LEASE_SECONDS)
+            if claim is None:
+                break
+            frames.append(raw_batches.read_rows(db, *claim))
+        if not frames:
             return pd.DataFrame()
-        
-        # Flatten the data from JSONB
-        data = [event.data for event in raw_events]
-        df = pd.DataFrame(data)
-        # Add raw_event_id to track back
-        df['raw_event_id'] = [event.id for event in raw_events]
-        return df
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
     finally:
         db.close()
 
+def iter_raw_event_chunks(worker_id: str, chunk_size: int):
+    """
+    Claim pending raw events in batches of at most `chunk_size` rows and yield
+    them as DataFrames, then the pending rows of raw batches. Claims page on
+    raw_events.id (keyset pagination) or split batch ranges, and are leased
+    to `worker_id`, so concurrent workers get disjoint batches.
+    """
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            raw_events = leases.claim_batch(
+                db, worker_id, chunk_size, settings.ETL_LEASE_SECONDS, after_id=last_id
+            )
+        finally:
+            db.close()
+        if not raw_events:
+            break
+        last_id = raw_events[-1].id
+        yield _events_to_frame(raw_events)
+
+    while True:
+        db = SessionLocal()
+        try:
+            claim = leases.claim_range(db, worker_id, chunk_size, settings.ETL_LEASE_SECONDS)
+            if claim is None:
+                return
+            frame = raw_batches.read_rows(db, *claim)
+        finally:
+            db.close()
+        yield frame
+
 @task
 def clean_data(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
@@ -35,77 +87,171 @@ def clean_data(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     if df.empty:
         return df, df
     
-    # 1. Validation
-    valid_df, invalid_df = validation.validate_data(df)
+    # 1. Validation, which also types the columns the later steps use
+    valid_df, invalid_df = validation.validate_data(
+        df, source=df.attrs.get('source'), batch=df.attrs.get('batch'),
+        timestamp_format=df.attrs.get('timestamp_format'),
+    )
     if valid_df.empty:
         return valid_df, invalid_df
     
-    # 2. Currency normalization
+    # 2. Validation parsed timestamps to UTC (currency conversion uses the order date)
+    if 'timestamp_utc' not in valid_df.columns:
+        valid_df['timestamp_utc'] = datetime.utcnow()
+
+    # 3. Currency normalization
     valid_df = currency.normalise(valid_df, target_currency='USD')
     
-    # 3. Deduplication
+    # 4. Deduplication
     if 'order_id' in valid_df.columns:
-        valid_df = deduplication.remove_duplicates(valid_df, key='order_id')
+        deduped = deduplication.remove_duplicates(valid_df, key='order_id')
+        # Dropped rows still need a final status, otherwise they stay pending
+        duplicates = valid_df.loc[~valid_df.index.isin(deduped.index)].copy()
+        if not duplicates.empty:
+            duplicates['error'] = "Duplicate order_id in batch"
+            duplicates['error_codes'] = validation.DUPLICATE_ORDER
+            invalid_df = pd.concat([invalid_df, duplicates])
+        valid_df = deduped
     
-    # 4. Fuzzy deduplication for customers (optional)
+    # 5. Fuzzy deduplication for customers (optional)
     if 'customer_name' in valid_df.columns:
-        valid_df = deduplication.fuzzy_deduplicate_customers(valid_df)
-    
-    # 5. Basic date parsing
-    if 'timestamp' in valid_df.columns:
-        valid_df['timestamp_utc'] = pd.to_datetime(valid_df['timestamp'])
-    else:
-        valid_df['timestamp_utc'] = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            # Only new names are scored, against the indexed names sharing a block
+            known = name_index.load_candidates(db, valid_df['customer_name'].dropna().unique())
+            valid_df, mapping = deduplication.match_customers(
+                valid_df, known=known, workers=settings.DEDUP_WORKERS or None
+            )
+            name_index.save_mapping(db, mapping)
+        finally:
+            db.close()
         
     return valid_df, invalid_df
 
 @task
-def load_to_canonical(valid_df: pd.DataFrame, invalid_df: pd.DataFrame):
+def load_to_canonical(valid_df: pd.DataFrame, invalid_df: pd.DataFrame,
+                      raise_errors: bool = False) -> dict:
     """
-    Insert into sales_event table and handle invalid records.
+    Upsert into sales_event table and handle invalid records.
+    Rows that fail to load are reported and marked failed instead of
+    rolling back the whole batch. A failure of the batch itself is rolled
+    back and returned as {'error': ...}, or re-raised with `raise_errors`.
     """
     db = SessionLocal()
     try:
+        report = {'inserted': 0, 'updated': 0, 'failed': 0, 'conflicts': [], 'errors': []}
+        failed_ids = []
+        changes = []
+
         # Load valid records
         if not valid_df.empty:
-            for _, row in valid_df.iterrows():
-                sales_event = SalesEvent(
-                    order_id=str(row.get('order_id')),
-                    customer_id=str(row.get('customer_id')),
-                    product_id=str(row.get('product_id')),
-                    amount=float(row.get('amount', 0.0)),
-                    currency=str(row.get('currency', 'USD')),
-                    net_amount=float(row.get('net_amount', 0.0)),
-                    channel=str(row.get('channel', 'Unknown')),
-                    status=str(row.get('status', 'completed')),
-                    timestamp_utc=row.get('timestamp_utc'),
-                    raw_event_id=int(row.get('raw_event_id'))
-                )
-                db.add(sales_event)
-                
-                # Update RawEvent status
-                raw_event = db.query(RawEvent).filter(RawEvent.id == int(row.get('raw_event_id'))).first()
-                if raw_event:
-                    raw_event.status = "processed"
-        
+            frame = canonical.build_sales_frame(valid_df)
+            result = canonical.upsert_sales_events(db, frame)
+            canonical.set_raw_status(db, result['loaded_ids'], "processed")
+            loaded = valid_df['raw_event_id'].isin(result['loaded_ids'])
+            row_hashes.record_loaded(db, valid_df[loaded])
+            failed_ids.extend(result['failed_ids'])
+            changes = result['changes']
+            for key in ('inserted', 'updated', 'conflicts', 'errors'):
+                report[key] += result[key]
+
         # Handle invalid records
         if not invalid_df.empty:
-            for _, row in invalid_df.iterrows():
-                raw_event = db.query(RawEvent).filter(RawEvent.id == int(row.get('raw_event_id'))).first()
-                if raw_event:
-                    raw_event.status = "failed"
-                    # Could store error message in a separate table or JSON field
-        
+            failed_ids.extend(invalid_df['raw_event_id'].astype('int64').tolist())
+            canonical.record_errors(db, invalid_df)
+        canonical.set_raw_status(db, failed_ids, "failed")
+        report['failed'] = len(failed_ids)
+
+        # Invalidate cached KPIs/insights together with the new data
+        if report['inserted'] or report['updated']:
+            if changes:
+                # The duckdb KPI backend reads the Parquet copy: publish it
+                # after sales_events commit and before cached KPIs go stale,
+                # without a rebuild starting in between
+                with columnar.locked():
+                    db.commit()
+                    try:
+                        columnar.append(pd.concat(changes, ignore_index=True))
+                    except Exception:
+                        # The next ETL run (or API start) rebuilds the copy; this
+                        # load is committed, but the run fails
+                        columnar.mark_stale(db)
+                        bump_data_version(db)
+                        db.commit()
+                        raise
+            bump_data_version(db)
         db.commit()
+        if report['errors']:
+            logger.warning("%s rows could not be loaded (recorded as failed), first ones: %s",
+                           len(report['errors']), report['errors'][:5])
+        return report
     except Exception as e:
         db.rollback()
+        if raise_errors:
+            raise
         print(f"Error loading data: {e}")
+        return {'error': str(e)}
     finally:
         db.close()
 
+def _merge_reports(total: dict, report: dict):
+    for key, value in report.items():
+        if isinstance(value, list):
+            total.setdefault(key, []).extend(value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+        else:
+            total[key] = value
+
+def run_chunked(worker_id: str, chunk_size: int, queue_depth: int,
+                on_chunk: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Extract, clean and load in bounded chunks. Reads, cleaning and writes run
+    in separate threads connected by queues of `queue_depth` chunks.
+    `on_chunk` receives the running report after every loaded chunk. A chunk
+    that fails to load stops the pipeline and raises PipelineError.
+    """
+    report = {'chunks': 0}
+
+    def load(chunk):
+        valid_df, invalid_df = chunk
+        _merge_reports(report, load_to_canonical.fn(valid_df, invalid_df, raise_errors=True))
+        report['chunks'] += 1
+        if on_chunk is not None:
+            on_chunk(report)
+
+    run_pipelined(
+        iter_raw_event_chunks(worker_id, chunk_size),
+        [clean_data.fn],
+        load,
+        queue_depth=queue_depth,
+    )
+    return report
+
 @flow
-def etl_pipeline():
-    raw_df = extract_raw_events()
+def etl_pipeline(chunked: Optional[bool] = None, worker_id: Optional[str] = None,
+                 job_id: Optional[str] = None):
+    """
+    Process pending raw events. Any number of pipelines may run at once:
+    each one only loads the raw events it has leased. With `job_id` the
+    running totals are written to that etl_jobs row after every chunk.
+    """
+    if chunked is None:
+        chunked = settings.ETL_CHUNKED
+    worker_id = worker_id or leases.new_worker_id()
+    with SessionLocal() as db:
+        # Housekeeping after earlier runs
+        if columnar.enabled():
+            columnar.repair(db)
+        raw_batches.collect_garbage(db)
+        # Pushed events arrive as many small batches; load them as chunks
+        raw_batches.compact(db, event_stream.SOURCE, settings.ETL_CHUNK_SIZE, worker_id,
+                            settings.ETL_LEASE_SECONDS)
+    if chunked:
+        on_chunk = (lambda report: etl_jobs.record_progress(job_id, report)) if job_id else None
+        return run_chunked(worker_id, settings.ETL_CHUNK_SIZE, settings.ETL_QUEUE_DEPTH, on_chunk)
+
+    raw_df = extract_raw_events(worker_id)
     if not raw_df.empty:
         valid_df, invalid_df = clean_data(raw_df)
-        load_to_canonical(valid_df, invalid_df)
+        return load_to_canonical(valid_df, invalid_df)
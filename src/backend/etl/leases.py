@@ -0,0 +1,101 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.raw import RawBatchRange, RawEvent
+
+
+def new_worker_id() -> str:
+    """
+    Identifier recorded in raw_events.claimed_by and raw_batch_ranges.claimed_by.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_batch(
+    db: Session,
+    worker_id: str,
+    batch_size: Optional[int],
+    lease_seconds: int,
+    after_id: int = 0,
+) -> List:
+    """
+    Atomically claim up to `batch_size` pending raw events for `worker_id`.
+
+    Pending rows are claimable when unleased or when their lease has expired,
+    so work abandoned by a crashed worker is picked up again. On Postgres the
+    candidate rows are locked with FOR UPDATE SKIP LOCKED, letting concurrent
+    workers claim disjoint batches without blocking each other; SQLite
+    serialises writers, so the single UPDATE is already atomic there.
+    `after_id` is a keyset cursor so successive claims by one run do not
+    rescan rows it already holds. Returns the claimed (id, data) rows in id order.
+    """
+    now = datetime.utcnow()
+    candidates = select(RawEvent.id).where(
+        RawEvent.status == "pending",
+        RawEvent.id > after_id,
+        or_(RawEvent.lease_until.is_(None), RawEvent.lease_until < now)
+    ).order_by(RawEvent.id).limit(batch_size).with_for_update(skip_locked=True)
+
+    stmt = update(RawEvent).where(RawEvent.id.in_(candidates)).values(
+        claimed_by=worker_id,
+        lease_until=now + timedelta(seconds=lease_seconds)
+    ).returning(RawEvent.id, RawEvent.data)
+
+    rows = db.execute(stmt, execution_options={"synchronize_session": False}).all()
+    db.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def claim_range(
+    db: Session,
+    worker_id: str,
+    max_rows: Optional[int],
+    lease_seconds: int,
+) -> Optional[Tuple[int, int, int]]:
+    """
+    Atomically claim the first pending range of a raw batch for `worker_id`,
+    cut to at most `max_rows` rows; the rest stays pending as a new range.
+
+    Same lease rules as claim_batch. The claim is a compare-and-set UPDATE
+    on the range's current end, so when another worker took or split the
+    range first the next candidate is tried. Returns (batch_id, start, stop)
+    or None when nothing is pending.
+    """
+    while True:
+        now = datetime.utcnow()
+        claimable = (
+            RawBatchRange.status == "pending",
+            or_(RawBatchRange.lease_until.is_(None), RawBatchRange.lease_until < now),
+        )
+        row = db.execute(
+            select(RawBatchRange.id, RawBatchRange.batch_id,
+                   RawBatchRange.start, RawBatchRange.stop)
+            .where(*claimable)
+            .order_by(RawBatchRange.batch_id, RawBatchRange.start)
+            .limit(1).with_for_update(skip_locked=True)
+        ).first()
+        if row is None:
+            db.commit()
+            return None
+
+        stop = min(row.stop, row.start + max_rows) if max_rows else row.stop
+        claimed = db.execute(
+            update(RawBatchRange)
+            .where(RawBatchRange.id == row.id, RawBatchRange.stop == row.stop, *claimable)
+            .values(stop=stop, claimed_by=worker_id,
+                    lease_until=now + timedelta(seconds=lease_seconds)),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            continue
+        if stop < row.stop:
+            db.execute(insert(RawBatchRange).values(
+                batch_id=row.batch_id, start=stop, stop=row.stop, status="pending"
+            ))
+        db.commit()
+        return row.batch_id, row.start, stop
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, List
+from sqlalchemy import text, update
+from sqlalchemy.orm import Session
+from app.etl import raw_batches
+from app.etl.loaders import columnar, rollups
+from app.models.bulk import chunked, upsert
+from app.models.raw import RawEvent, RawEventError
+from app.models.sales_event import SalesEvent
+
+# Rows per INSERT ... ON CONFLICT executemany
+LOAD_CHUNK_SIZE = 5000
+
+# column -> default used when the column is missing or the value is null
+DEFAULTS = {
+    'order_id': None,
+    'customer_id': None,
+    'product_id': None,
+    'amount': 0.0,
+    'currency': 'USD',
+    'net_amount': 0.0,
+    'channel': 'Unknown',
+    'status': 'completed',
+}
+SALES_COLUMNS = list(DEFAULTS) + ['timestamp_utc', 'raw_event_id', 'raw_batch_ref']
+UPDATE_COLUMNS = [c for c in SALES_COLUMNS if c != 'order_id']
+
+
+def build_sales_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build typed insert parameters for sales_events from DataFrame columns.
+    """
+    out = pd.DataFrame(index=df.index)
+    for col, default in DEFAULTS.items():
+        if col in ('amount', 'net_amount'):
+            values = pd.to_numeric(df[col], errors='coerce') if col in df.columns else default
+            out[col] = pd.Series(values, index=df.index, dtype='float64').fillna(default)
+        elif col in df.columns:
+            values = df[col].astype(object)
+            values = values.where(values.isna(), values.astype(str))
+            out[col] = values if default is None else values.fillna(default)
+        else:
+            out[col] = default
+    out['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'])
+    out['raw_event_id'] = df['raw_event_id'].astype('int64')
+    return out
+
+
+def _to_params(frame: pd.DataFrame) -> List[dict]:
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict(orient='records')
+
+
+def upsert_sales_events(db: Session, frame: pd.DataFrame,
+                        chunk_size: int = LOAD_CHUNK_SIZE) -> dict:
+    """
+    INSERT ... ON CONFLICT (order_id) DO UPDATE in chunks, each inside a savepoint.
+    A chunk that fails is retried row by row so only the offending rows are rejected.
+    Daily rollups are adjusted in the same savepoint: new rows are added and the
+    previous version of every updated order is subtracted. The orders are
+    locked before their previous versions are read, so concurrent loads of
+    the same order serialise instead of both subtracting the same version.
+    Returns row-level results: inserted/updated raw ids, updated order ids and errors.
+    With the duckdb KPI backend `changes` also holds the signed change rows
+    to append to the Parquet copy once the transaction commits.
+    """
+    report = {'loaded_ids': [], 'failed_ids': [], 'inserted': 0, 'updated': 0,
+              'conflicts': [], 'errors': [], 'changes': []}
+    stmt = upsert(db, SalesEvent.__table__, ['order_id'], UPDATE_COLUMNS)
+    _lock_orders(db, frame['order_id'].dropna().unique().tolist())
+
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size]
+        previous = _previous_versions(db, chunk['order_id'].dropna().tolist())
+
+        try:
+            with db.begin_nested():
+                _write(db, stmt, chunk, previous)
+            _record(report, chunk, previous)
+        except Exception:
+            for _, row in chunk.iterrows():
+                row_frame = row.to_frame().T
+                try:
+                    with db.begin_nested():
+                        _write(db, stmt, row_frame, previous)
+                    _record(report, row_frame, previous)
+                except Exception as e:
+                    report['failed_ids'].append(int(row['raw_event_id']))
+                    report['errors'].append({
+                        'raw_event_id': int(row['raw_event_id']),
+                        'order_id': row['order_id'],
+                        'error': str(getattr(e, 'orig', e)),
+                    })
+    return report
+
+
+def _lock_orders(db: Session, order_ids: List[str]):
+    # Held until the transaction ends. PostgreSQL: one advisory lock per
+    # order, which also covers orders not inserted yet (FOR UPDATE would
+    # not), taken in one statement in a fixed order so loads cannot
+    # deadlock. SQLite: a no-op write takes the database write lock.
+    if not order_ids:
+        return
+    if db.get_bind().dialect.name == 'postgresql':
+        db.execute(text(
+            "SELECT pg_advisory_xact_lock(k) FROM "
+            "(SELECT DISTINCT hashtext(id) AS k FROM unnest(CAST(:ids AS text[])) AS id) AS keys "
+            "ORDER BY k"
+        ), {'ids': order_ids})
+    else:
+        db.execute(text("UPDATE sales_events SET order_id = order_id WHERE 0"))
+
+
+def _previous_versions(db: Session, order_ids: List[str]) -> pd.DataFrame:
+    columns = ['order_id', 'timestamp_utc', 'channel', 'product_id', 'status',
+               'amount', 'net_amount']
+    rows = []
+    for ids in chunked(order_ids):
+        rows.extend(db.query(*[getattr(SalesEvent, c) for c in columns]).filter(
+            SalesEvent.order_id.in_(ids)
+        ).all())
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _write(db: Session, stmt, chunk: pd.DataFrame, previous: pd.DataFrame):
+    params = chunk.drop(columns='raw_event_id').join(raw_batches.lineage(chunk['raw_event_id']))
+    db.execute(stmt, _to_params(params))
+    replaced = previous[previous['order_id'].isin(chunk['order_id'])]
+    rollups.apply_deltas(db, pd.concat([
+        rollups.aggregate(chunk),
+        rollups.aggregate(replaced, sign=-1),
+    ]))
+
+
+def _record(report: dict, chunk: pd.DataFrame, previous: pd.DataFrame):
+    is_update = chunk['order_id'].isin(previous['order_id'])
+    report['loaded_ids'].extend(chunk['raw_event_id'].astype('int64').tolist())
+    report['updated'] += int(is_update.sum())
+    report['inserted'] += int((~is_update).sum())
+    report['conflicts'].extend(chunk.loc[is_update, 'order_id'].tolist())
+    if columnar.enabled():
+        replaced = previous[previous['order_id'].isin(chunk['order_id'])]
+        report['changes'].append(columnar.changes(chunk, replaced))
+
+
+def set_raw_status(db: Session, raw_ids: Iterable[int], status: str):
+    """
+    Flip raw_events.status with one UPDATE ... WHERE id IN (...) per chunk
+    and release the ETL lease on those rows. Rows of raw batches are
+    recorded as row ranges instead.
+    """
+    ids = np.unique(np.asarray(list(raw_ids), dtype='int64'))
+    in_batches = ids >= raw_batches.FIRST_REF
+    if in_batches.any():
+        raw_batches.set_status(db, ids[in_batches], status)
+    for chunk_ids in chunked(ids[~in_batches].tolist()):
+        db.execute(
+            update(RawEvent).where(RawEvent.id.in_(chunk_ids))
+            .values(status=status, lease_until=None),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def record_errors(db: Session, invalid_df: pd.DataFrame):
+    """
+    Store the validation error code of every rejected row in raw_event_errors.
+    """
+    if 'error_codes' not in invalid_df.columns:
+        return
+    rows = invalid_df[invalid_df['error_codes'].notna()]
+    params = [
+        {'raw_event_id': raw_id, 'error_codes': codes}
+        for raw_id, codes in zip(rows['raw_event_id'].astype('int64').tolist(),
+                                 rows['error_codes'].astype('int64').tolist())
+    ]
+    for start in range(0, len(params), LOAD_CHUNK_SIZE):
+        db.execute(upsert(db, RawEventError.__table__, ['raw_event_id'], ['error_codes']),
+                   params[start:start + LOAD_CHUNK_SIZE])
@@ -0,0 +1,196 @@
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from sqlalchemy.orm import Session
+from app.core.cache import bump_data_version, get_data_version
+from app.core.config import settings
+from app.models.sales_event import SalesEvent
+from app.models.version import DataVersion
+try:
+    import duckdb
+except ImportError:
+    # Only needed for KPI_BACKEND=duckdb
+    duckdb = None
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): the lock only covers this process
+    fcntl = None
+
+# Columns of the Parquet copy; `day` is the hive partition (day=YYYY-MM-DD)
+CHANGE_COLUMNS = ['order_id', 'timestamp_utc', 'channel', 'product_id', 'status',
+                  'amount', 'net_amount', 'sign']
+EXPORT_CHUNK_SIZE = 100000
+# Data version counting appends that failed since the last rebuild; while
+# it is non-zero the Parquet copy is behind sales_events
+STALE = "sales_parquet_stale"
+_local_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.KPI_BACKEND == 'duckdb'
+
+
+def changes(chunk: pd.DataFrame, replaced: pd.DataFrame) -> pd.DataFrame:
+    """
+    Signed change rows for one loaded chunk: every new version with sign +1
+    and the previous version of every updated order with sign -1, so sums
+    over the Parquet files equal sums over sales_events.
+    """
+    frames = [chunk.reindex(columns=CHANGE_COLUMNS[:-1]).assign(sign=1)]
+    if not replaced.empty:
+        frames.append(replaced.reindex(columns=CHANGE_COLUMNS[:-1]).assign(sign=-1))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _normalise(frame: pd.DataFrame) -> pd.DataFrame:
+    # Same keys as the rollups: undated rows are skipped, missing labels are ''
+    frame = frame[frame['timestamp_utc'].notna()]
+    timestamps = pd.to_datetime(frame['timestamp_utc'])
+    return pd.DataFrame({
+        'order_id': frame['order_id'].astype(object),
+        'timestamp_utc': timestamps,
+        'channel': frame['channel'].fillna('').astype(str),
+        'product_id': frame['product_id'].fillna('').astype(str),
+        'status': frame['status'].fillna('').astype(str),
+        'amount': frame['amount'].astype('float64').fillna(0.0),
+        'net_amount': frame['net_amount'].astype('float64').fillna(0.0),
+        'sign': frame['sign'].astype('int8'),
+        'day': timestamps.dt.date,
+    })
+
+
+@contextmanager
+def locked(root: str = None):
+    """
+    Hold the Parquet copy's lock, across processes. Loads hold it from
+    their sales_events commit to their append and rebuild() from its read
+    of sales_events to the swap, so an append is neither written into a
+    copy being replaced nor counted twice. Not re-entrant.
+    """
+    root = os.path.abspath(root or settings.PARQUET_PATH)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    os.makedirs(os.path.dirname(root), exist_ok=True)
+    with open(f"{root}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def append(frame: pd.DataFrame, root: str = None):
+    """
+    Append change rows to the date-partitioned Parquet files under `root`.
+    Files are written to a staging directory first and moved into their
+    day=... partition with an atomic rename, so readers never see a
+    partially written file.
+    """
+    if duckdb is None:
+        raise RuntimeError("KPI_BACKEND=duckdb requires the duckdb package")
+    root = root or settings.PARQUET_PATH
+    frame = _normalise(frame)
+    if frame.empty:
+        return
+    staging = os.path.join(root, '.staging', uuid.uuid4().hex)
+    os.makedirs(os.path.dirname(staging), exist_ok=True)
+    try:
+        con = duckdb.connect()
+        try:
+            con.register('changes', frame)
+            con.execute(
+                f"COPY (SELECT * FROM changes) TO '{_quote(staging)}' "
+                "(FORMAT PARQUET, PARTITION_BY (day), FILENAME_PATTERN 'part_{uuid}')"
+            )
+        finally:
+            con.close()
+        for partition in os.listdir(staging):
+            target = os.path.join(root, partition)
+            os.makedirs(target, exist_ok=True)
+            for name in os.listdir(os.path.join(staging, partition)):
+                os.replace(os.path.join(staging, partition, name), os.path.join(target, name))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def mark_stale(db: Session):
+    """
+    Record, in the caller's transaction, that changes committed to
+    sales_events could not be appended; repair() rebuilds the copy.
+    """
+    bump_data_version(db, STALE)
+
+
+def repair(db: Session, root: str = None) -> bool:
+    """
+    Rebuild the Parquet copy if an append failed since the last rebuild.
+    Failures recorded while rebuilding keep the copy marked stale.
+    Returns whether it rebuilt.
+    """
+    failures, _ = get_data_version(db, STALE)
+    if not failures:
+        return False
+    rebuild(db, root)
+    db.query(DataVersion).filter(DataVersion.name == STALE, DataVersion.version == failures).update(
+        {'version': 0}, synchronize_session=False
+    )
+    db.commit()
+    db.info.pop(("data_version", STALE), None)
+    return True
+
+
+def rebuild(db: Session, root: str = None):
+    """
+    Rewrite the Parquet copy from sales_events (backfill, repair, or to
+    compact the many small files appended by ETL runs). The new copy is
+    written to a directory of its own and published by atomically
+    replacing the `root` symlink, so readers always find a complete copy;
+    loads wait for the swap before they commit (see locked()).
+    """
+    root = os.path.abspath(root or settings.PARQUET_PATH)
+    with locked(root):
+        fresh = f"{root}.{uuid.uuid4().hex}"
+        columns = [getattr(SalesEvent, c) for c in CHANGE_COLUMNS[:-1]]
+        query = db.query(*columns).yield_per(EXPORT_CHUNK_SIZE)
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) >= EXPORT_CHUNK_SIZE:
+                append(pd.DataFrame(batch, columns=CHANGE_COLUMNS[:-1]).assign(sign=1), fresh)
+                batch = []
+        if batch:
+            append(pd.DataFrame(batch, columns=CHANGE_COLUMNS[:-1]).assign(sign=1), fresh)
+        os.makedirs(fresh, exist_ok=True)
+
+        link = f"{root}.link-{uuid.uuid4().hex}"
+        os.symlink(os.path.basename(fresh), link, target_is_directory=True)
+        old = os.path.realpath(root) if os.path.lexists(root) else None
+        if os.path.isdir(root) and not os.path.islink(root):
+            # A copy from before root was a symlink: move it aside first
+            # (readers wait on the lock while root is missing)
+            old = f"{root}.old-{uuid.uuid4().hex}"
+            os.replace(root, old)
+        os.replace(link, root)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def ensure_backfilled(db: Session, root: str = None):
+    """
+    Export sales_events once when the duckdb backend is switched on for a
+    database that already has sales, and rebuild a copy that fell behind.
+    """
+    root = root or settings.PARQUET_PATH
+    repair(db, root)
+    if not os.path.isdir(root) and db.query(SalesEvent.id).first() is not None:
+        rebuild(db, root)
+
+
+def _quote(path: str) -> str:
+    return path.replace("'", "''")
@@ -0,0 +1,87 @@
+import pandas as pd
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.core.cache import bump_data_version
+from app.models.bulk import upsert
+from app.models.rollup import DailySalesRollup
+from app.models.sales_event import SalesEvent
+
+KEY_COLUMNS = ['day', 'channel', 'product_id', 'status']
+MEASURE_COLUMNS = ['order_count', 'amount', 'net_amount']
+
+
+def aggregate(frame: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+    """
+    Aggregate sales rows (timestamp_utc, channel, product_id, status, amount,
+    net_amount) to rollup grain. `sign=-1` produces the deltas that remove them.
+    """
+    frame = frame[frame['timestamp_utc'].notna()]
+    keys = pd.DataFrame({
+        'day': pd.to_datetime(frame['timestamp_utc']).dt.date,
+        'channel': frame['channel'].fillna(''),
+        'product_id': frame['product_id'].fillna(''),
+        'status': frame['status'].fillna(''),
+    })
+    measures = pd.DataFrame({
+        'order_count': sign,
+        'amount': sign * frame['amount'].astype('float64').fillna(0.0),
+        'net_amount': sign * frame['net_amount'].astype('float64').fillna(0.0),
+    }, index=frame.index)
+    return pd.concat([keys, measures], axis=1).groupby(KEY_COLUMNS, as_index=False).sum()
+
+
+def apply_deltas(db: Session, deltas: pd.DataFrame):
+    """
+    Add deltas to the rollup table with INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x,
+    then delete the rows left without orders (e.g. every order of a status
+    moved to another one). Runs in the caller's transaction so rollups
+    commit together with sales_events.
+    """
+    if deltas.empty:
+        return
+    deltas = deltas.groupby(KEY_COLUMNS, as_index=False)[MEASURE_COLUMNS].sum()
+    changed = (deltas['order_count'] != 0) | (deltas['net_amount'] != 0) | (deltas['amount'] != 0)
+    deltas = deltas[changed]
+    if deltas.empty:
+        return
+    stmt = upsert(db, DailySalesRollup.__table__, KEY_COLUMNS, increment_columns=MEASURE_COLUMNS)
+    db.execute(stmt, deltas.astype(object).to_dict(orient='records'))
+    emptied = deltas.loc[deltas['order_count'] < 0, 'day'].unique().tolist()
+    if emptied:
+        db.execute(delete(DailySalesRollup).where(
+            DailySalesRollup.day.in_(emptied), DailySalesRollup.order_count <= 0,
+        ))
+
+
+def rebuild(db: Session):
+    """
+    Recompute all rollups from sales_events (backfill or repair).
+    """
+    day = func.date(SalesEvent.timestamp_utc)
+    source = select(
+        day,
+        func.coalesce(SalesEvent.channel, ''),
+        func.coalesce(SalesEvent.product_id, ''),
+        func.coalesce(SalesEvent.status, ''),
+        func.count(SalesEvent.id),
+        func.coalesce(func.sum(SalesEvent.amount), 0.0),
+        func.coalesce(func.sum(SalesEvent.net_amount), 0.0),
+    ).where(SalesEvent.timestamp_utc.isnot(None)).group_by(
+        day,
+        func.coalesce(SalesEvent.channel, ''),
+        func.coalesce(SalesEvent.product_id, ''),
+        func.coalesce(SalesEvent.status, ''),
+    )
+    db.execute(delete(DailySalesRollup))
+    db.execute(insert(DailySalesRollup).from_select(KEY_COLUMNS + MEASURE_COLUMNS, source))
+    bump_data_version(db)
+    db.commit()
+
+
+def ensure_backfilled(db: Session):
+    """
+    Build rollups once for databases that have sales_events but no rollups yet.
+    """
+    has_rollups = db.query(DailySalesRollup.day).first() is not None
+    if not has_rollups and db.query(SalesEvent.id).first() is not None:
+        rebuild(db)
@@ -0,0 +1,94 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator
+
+_DONE = object()
+
+
+class PipelineError(Exception):
+    pass
+
+
+def run_pipelined(
+    source: Iterable,
+    stages: Iterable[Callable],
+    sink: Callable,
+    queue_depth: int = 2,
+):
+    """
+    Run `source -> stages... -> sink` with each step in its own thread,
+    connected by bounded queues of `queue_depth` items.
+
+    The source (e.g. DB reads), CPU-bound stages and the sink (DB writes)
+    overlap, while at most `queue_depth` chunks wait between any two steps,
+    so memory stays bounded by the chunk size. The first error stops the
+    pipeline and is re-raised in the caller.
+    """
+    stop = threading.Event()
+    errors = []
+    stages = list(stages)
+    queues = [queue.Queue(maxsize=queue_depth) for _ in range(len(stages) + 1)]
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(q) -> Iterator:
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def produce():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(queues[0], _DONE)
+
+    def transform(fn, inbox, outbox):
+        try:
+            for item in drain(inbox):
+                if not put(outbox, fn(item)):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(outbox, _DONE)
+
+    threads = [threading.Thread(target=produce, name="etl-extract", daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(
+            target=transform, args=(fn, queues[i], queues[i + 1]),
+            name=f"etl-stage-{i}", daemon=True,
+        ))
+    for t in threads:
+        t.start()
+
+    try:
+        for item in drain(queues[-1]):
+            sink(item)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise PipelineError(f"ETL pipeline failed: {errors[0]}") from errors[0]
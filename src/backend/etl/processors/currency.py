@@ -1,39 +1,181 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
 import pandas as pd
 import requests
-from functools import lru_cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Value of one unit of each currency in USD
+FALLBACK_RATES = {
+    'USD': 1.0,
+    'PKR': 0.0036,
+    'EUR': 1.08,
+    'GBP': 1.26
+}
+
+RATE_COLUMNS = ['date', 'currency', 'rate']
+
+
+class TTLCache:
+    """
+    Minimal thread-safe in-process cache whose entries expire after `ttl` seconds.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_rate_cache = TTLCache(ttl=settings.FX_RATES_TTL)
+
 
-@lru_cache(maxsize=1)
 def get_live_rates():
     """
-    Fetch live exchange rates from a free API.
-    """
-    try:
-        # Using a free API (exchangerate-api.com)
-        response = requests.get("https://open.er-api.com/v6/latest/USD")
-        if response.status_code == 200:
-            return response.json().get('rates', {})
-    except Exception as e:
-        print(f"Error fetching live rates: {e}")
-    
-    # Fallback rates
-    return {
-        'USD': 1.0,
-        'PKR': 0.0036,
-        'EUR': 1.08,
-        'GBP': 1.26
-    }
+    Fetch today's exchange rates (USD per unit) from a free API.
+    """
+    if settings.FX_LIVE_RATES_URL:
+        try:
+            # The API quotes units per USD, invert to USD per unit
+            response = requests.get(settings.FX_LIVE_RATES_URL, timeout=10)
+            if response.status_code == 200:
+                rates = response.json().get('rates', {})
+                return {cur: 1.0 / rate for cur, rate in rates.items() if rate}
+            logger.warning("Live rates request returned HTTP %s, using fallback rates",
+                           response.status_code)
+        except Exception as e:
+            logger.warning("Error fetching live rates, using fallback rates: %s", e)
+
+    return dict(FALLBACK_RATES)
+
+
+def load_rate_table(path: str) -> pd.DataFrame:
+    """
+    Load historical rates from a CSV or Parquet file with columns
+    date, currency, rate (USD per unit of currency).
+    """
+    if path.endswith('.parquet'):
+        table = pd.read_parquet(path, columns=RATE_COLUMNS)
+    else:
+        table = pd.read_csv(path, usecols=RATE_COLUMNS)
+    return _prepare_rate_table(table)
+
+
+def get_rate_table() -> pd.DataFrame:
+    """
+    Historical rate table keyed by (date, currency), cached for FX_RATES_TTL seconds.
+    Today's live (or fallback) rates are appended so recent orders always have a rate.
+    """
+    return _rate_cache.get('rates', _build_rate_table)
+
+
+def _build_rate_table() -> pd.DataFrame:
+    frames = []
+    path = settings.FX_RATES_PATH
+    if path and os.path.exists(path):
+        try:
+            frames.append(load_rate_table(path))
+        except Exception as e:
+            logger.warning("Error loading rate table %s, using live or fallback rates only: %s",
+                           path, e)
+    elif path:
+        logger.warning("Rate table %s not found, using live or fallback rates only", path)
+
+    today = pd.Timestamp.now(tz='UTC').tz_localize(None).normalize()
+    live = get_live_rates()
+    frames.append(pd.DataFrame({
+        'date': today,
+        'currency': list(live.keys()),
+        'rate': list(live.values()),
+    }))
+    return _prepare_rate_table(pd.concat(frames, ignore_index=True))
+
+
+def _prepare_rate_table(table: pd.DataFrame) -> pd.DataFrame:
+    table = table.copy()
+    table['date'] = pd.to_datetime(table['date']).dt.tz_localize(None).astype('datetime64[ns]')
+    table['currency'] = table['currency'].astype(str).str.upper()
+    table['rate'] = pd.to_numeric(table['rate'], errors='coerce')
+    table = table.dropna(subset=['date', 'rate'])
+    # Keep the last quote per key so file entries can be overridden by live ones
+    table = table.drop_duplicates(subset=['date', 'currency'], keep='last')
+    return table.sort_values('date', kind='mergesort').reset_index(drop=True)
+
+
+def lookup_rates(timestamps: pd.Series, currencies: pd.Series, table: pd.DataFrame) -> np.ndarray:
+    """
+    As-of join: the most recent rate on or before each timestamp for each currency.
+    Rows older than the table use the earliest known rate; unknown currencies get 1.0.
+    """
+    left = pd.DataFrame({
+        'date': timestamps.to_numpy().astype('datetime64[ns]'),
+        'currency': currencies.to_numpy(),
+        'pos': np.arange(len(timestamps)),
+    })
+    # merge_asof needs non-null sorted keys; undated rows use the latest rate
+    left['date'] = left['date'].fillna(table['date'].max())
+    left = left.sort_values('date', kind='mergesort')
+
+    merged = pd.merge_asof(left, table, on='date', by='currency', direction='backward')
+    earliest = table.groupby('currency')['rate'].first()
+    rate = merged['rate'].fillna(merged['currency'].map(earliest)).fillna(1.0)
+
+    out = np.empty(len(timestamps), dtype='float64')
+    out[merged['pos'].to_numpy()] = rate.to_numpy()
+    return out
+
 
 def normalise(df: pd.DataFrame, target_currency: str = 'USD') -> pd.DataFrame:
     """
-    Normalise currency to a base currency.
-    """
-    rates = get_live_rates()
-    
-    def convert(row):
-        currency = row.get('currency', 'USD')
-        amount = row.get('amount', 0.0)
-        rate = rates.get(currency, 1.0)
-        return amount * rate
-    
-    df['net_amount'] = df.apply(convert, axis=1)
+    Normalise currency to a base currency using the rate in effect at each order's time.
+    """
+    if df.empty:
+        df['net_amount'] = pd.Series(dtype='float64')
+        return df
+
+    table = get_rate_table()
+
+    if 'currency' in df.columns:
+        currencies = df['currency'].astype(object).fillna('USD').astype(str).str.upper()
+    else:
+        currencies = pd.Series('USD', index=df.index)
+
+    if 'timestamp_utc' in df.columns:
+        timestamps = pd.to_datetime(df['timestamp_utc'], errors='coerce')
+    elif 'timestamp' in df.columns:
+        timestamps = pd.to_datetime(df['timestamp'], errors='coerce')
+    else:
+        timestamps = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    if getattr(timestamps.dt, 'tz', None) is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+
+    if 'amount' in df.columns:
+        amounts = pd.to_numeric(df['amount'], errors='coerce')
+    else:
+        amounts = pd.Series(0.0, index=df.index)
+    usd = amounts.to_numpy(dtype='float64') * lookup_rates(timestamps, currencies, table)
+
+    if target_currency.upper() != 'USD':
+        target = pd.Series(target_currency.upper(), index=df.index)
+        usd = usd / lookup_rates(timestamps, target, table)
+
+    df['net_amount'] = usd
     return df
@@ -1,3 +1,13 @@
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 try:
     from rapidfuzz import process, fuzz
@@ -5,31 +15,254 @@ except ImportError:
     # Fallback if rapidfuzz is not installed
     process = None
 
+# Below this many candidate pairs scoring in-process beats using the pool
+PARALLEL_MIN_PAIRS = 2_000_000
+# Rows of a block scored per cdist call, bounds the score matrix size
+BLOCK_SLICE = 2000
+
+# Scoring pool, kept for the life of the process: ETL calls match_customers
+# once per chunk and spawned workers are slow to start
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+_NON_ALNUM = re.compile(r'[^a-z0-9 ]+')
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(
+    ['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r']) for c in letters}
+
+
 def remove_duplicates(df: pd.DataFrame, key: str) -> pd.DataFrame:
     """
     Exact match deduplication.
     """
     return df.drop_duplicates(subset=[key], keep='first')
 
-def fuzzy_deduplicate_customers(df: pd.DataFrame, threshold: int = 90) -> pd.DataFrame:
+
+def normalise_name(name) -> str:
+    """
+    Lowercase, strip accents and punctuation, and sort tokens so that
+    "Smith, John" and "john smith" compare equal.
+    """
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    tokens = _NON_ALNUM.sub(' ', text.lower()).split()
+    return ' '.join(sorted(tokens))
+
+
+def soundex(token: str) -> str:
+    """
+    Classic 4-character Soundex code.
+    """
+    if not token:
+        return ''
+    first = token[0].upper()
+    digits = []
+    prev = _SOUNDEX_CODES.get(token[0], '')
+    for c in token[1:]:
+        code = _SOUNDEX_CODES.get(c, '')
+        if code and code != '0' and code != prev:
+            digits.append(code)
+        if c not in 'hw':
+            prev = code
+    return (first + ''.join(digits) + '000')[:4]
+
+
+def blocking_keys(norm: str) -> Tuple[str, str]:
+    """
+    Cheap keys used to bucket names: a phonetic code of the first two tokens
+    and a 4-character prefix of the compacted name. Names are only scored
+    against names sharing at least one key.
+    """
+    tokens = norm.split()
+    phonetic = 's:' + ''.join(soundex(t) for t in tokens[:2])
+    prefix = 'p:' + norm.replace(' ', '')[:4]
+    return phonetic, prefix
+
+
+class UnionFind:
+    """
+    Disjoint sets over integer ids with path compression and union by rank.
+    """
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.rank = [0] * n
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+
+
+def _score_block(args) -> List[Tuple[int, int]]:
+    """
+    Score one block with rapidfuzz cdist and return matching (i, j) id pairs.
+    Only pairs involving at least one new name are scored.
+    """
+    new_ids, old_ids, new_strings, old_strings, threshold = args
+    targets = new_ids + old_ids
+    target_strings = new_strings + old_strings
+    pairs = []
+    for start in range(0, len(new_ids), BLOCK_SLICE):
+        scores = process.cdist(
+            new_strings[start:start + BLOCK_SLICE], target_strings,
+            scorer=fuzz.token_sort_ratio, processor=None,
+            score_cutoff=threshold, dtype=np.uint8,
+        )
+        r, c = np.nonzero(scores)
+        for ri, ci in zip(r.tolist(), c.tolist()):
+            a, b = new_ids[start + ri], targets[ci]
+            if a != b:
+                pairs.append((a, b))
+    return pairs
+
+
+def build_customer_mapping(
+    names: Iterable,
+    threshold: int = 90,
+    known: Optional[Dict[str, str]] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Map each name to a canonical name.
+
+    `known` is the persistent canonical-name index ({name: canonical_name})
+    restricted to candidates that could match; only names missing from it are
+    scored, within their blocks, and clusters are resolved with union-find so
+    the mapping is transitive. Clusters keep an existing canonical name when
+    they touch the index, otherwise the lexicographically smallest name wins,
+    which keeps the result independent of input order.
+    """
+    known = known or {}
+    new_names = sorted({str(n) for n in names if pd.notna(n)} - set(known))
+    all_names = new_names + sorted(known)
+    n_new = len(new_names)
+    if n_new == 0:
+        return {n: known[n] for n in all_names}
+
+    strings = [normalise_name(n) for n in all_names]
+
+    # Bucket by blocking keys; blocks without a new name need no scoring
+    blocks = defaultdict(list)
+    for i, norm in enumerate(strings):
+        for key in blocking_keys(norm):
+            blocks[key].append(i)
+
+    tasks = []
+    for ids in blocks.values():
+        new_ids = [i for i in ids if i < n_new]
+        if new_ids and len(ids) > 1:
+            old_ids = [i for i in ids if i >= n_new]
+            tasks.append((
+                new_ids, old_ids,
+                [strings[i] for i in new_ids], [strings[i] for i in old_ids],
+                threshold,
+            ))
+
+    uf = UnionFind(len(all_names))
+    for pairs in _run_blocks(tasks, workers):
+        for a, b in pairs:
+            uf.union(a, b)
+
+    # Names already in the index keep their clusters
+    by_canonical = {}
+    for i in range(n_new, len(all_names)):
+        canonical = known[all_names[i]]
+        if canonical in by_canonical:
+            uf.union(i, by_canonical[canonical])
+        else:
+            by_canonical[canonical] = i
+
+    clusters = defaultdict(list)
+    for i in range(len(all_names)):
+        clusters[uf.find(i)].append(i)
+
+    mapping = {}
+    for members in clusters.values():
+        indexed = sorted(known[all_names[i]] for i in members if i >= n_new)
+        canonical = indexed[0] if indexed else min(all_names[i] for i in members)
+        for i in members:
+            mapping[all_names[i]] = canonical
+    return mapping
+
+
+def _run_blocks(tasks, workers: Optional[int]):
+    pair_count = sum(len(t[0]) * (len(t[0]) + len(t[1])) for t in tasks)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1 or pair_count < PARALLEL_MIN_PAIRS:
+        return map(_score_block, tasks)
+
+    # Largest blocks first so the pool stays balanced
+    tasks.sort(key=lambda t: len(t[0]) * (len(t[0]) + len(t[1])), reverse=True)
+    try:
+        return list(_get_pool(workers).map(_score_block, tasks, chunksize=16))
+    except BrokenProcessPool:
+        # A worker died; score here and start a new pool next time
+        _discard_pool()
+        return map(_score_block, tasks)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn: never fork the threads of the pipelined ETL or the API server
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def match_customers(
+    df: pd.DataFrame,
+    threshold: int = 90,
+    known: Optional[Dict[str, str]] = None,
+    workers: Optional[int] = None,
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
     """
     Fuzzy matching for customer names to catch near-duplicates.
+    Returns the frame with `customer_name_clean` and the name mapping, which
+    callers persist as the canonical-name index for later runs.
     """
     if process is None or 'customer_name' not in df.columns:
-        return df
-    
-    unique_names = df['customer_name'].unique()
-    mapping = {}
-    
-    for name in unique_names:
-        if name in mapping:
-            continue
-        
-        # Find matches for this name
-        matches = process.extract(name, unique_names, scorer=fuzz.token_sort_ratio, limit=10)
-        for match_name, score, _ in matches:
-            if score >= threshold:
-                mapping[match_name] = name
-                
-    df['customer_name_clean'] = df['customer_name'].map(mapping)
-    return df
+        return df, {}
+
+    names = df['customer_name'].dropna().unique()
+    mapping = build_customer_mapping(names, threshold, known, workers)
+    df['customer_name_clean'] = df['customer_name'].astype(str).map(mapping)
+    return df, mapping
+
+
+def fuzzy_deduplicate_customers(
+    df: pd.DataFrame,
+    threshold: int = 90,
+    known: Optional[Dict[str, str]] = None,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Fuzzy matching for customer names to catch near-duplicates.
+    Adds `customer_name_clean`; use match_customers to also get the mapping.
+    """
+    return match_customers(df, threshold, known, workers)[0]
@@ -0,0 +1,289 @@
+import fnmatch
+import logging
+import re
+from typing import Hashable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+# Tried in order after epoch numbers and ISO 8601. Each day-first format
+# comes before its month-first twin; values both read (all days <= 12)
+# are resolved by DEFAULT_DATE_ORDER, see FormatInference.
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M',
+    '%m/%d/%Y', '%d.%m.%Y %H:%M', '%d.%m.%Y', '%d-%m-%Y', '%Y/%m/%d',
+    '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y', '%d-%b-%Y', '%d %b %Y %H:%M',
+]
+ISO8601 = 'ISO8601'
+# Eight digits read as a date before they are read as epoch seconds
+COMPACT_DATE = '%Y%m%d'
+# Epoch numbers, by the smallest magnitude that still means that unit
+# (1e11 s is the year 5138, 1e11 ms is 1973)
+EPOCH_UNITS = [(1e17, 'ns'), (1e14, 'us'), (1e11, 'ms'), (0, 's')]
+# Distinct values a format is tried on before it is checked against all of them
+SAMPLE_SIZE = 200
+
+_ISO_PREFIX = r'^\d{4}-\d{2}-\d{2}'
+_EPOCH = r'^-?\d+(\.\d+)?$'
+_OFFSET = r'(?:Z|[+-]\d{2}:?\d{2})$'
+# Formats of numeric fields only, other than ISO 8601 dates
+_NUMERIC_FORMAT = re.compile(r'^(?!%Y-%m-%d)(%[YmdHMS]|[ /.:T-])+$')
+# Inferred format per batch or source
+_formats = LRUCache(maxsize=1024)
+
+logger = logging.getLogger(__name__)
+
+
+# Stand-in for the epoch formats while values are checked; the unit
+# follows from the largest number seen (see EPOCH_UNITS)
+_EPOCH_CANDIDATE = 'epoch'
+
+
+def _distinct(values: pd.Series) -> pd.Series:
+    text = pa.array(values.dropna().astype(str), type=pa.string())
+    text = pc.unique(pc.utf8_trim_whitespace(text))
+    text = text.filter(pc.not_equal(text, ''))
+    return pd.Series(text.to_numpy(zero_copy_only=False), dtype=object)
+
+
+def _matches(values: pd.Series, pattern: str) -> np.ndarray:
+    # Arrow's regex kernel: no Python call per value
+    matched = pc.match_substring_regex(pa.array(values, type=pa.string()), pattern)
+    return matched.fill_null(False).to_numpy(zero_copy_only=False)
+
+
+def _swap_day_month(fmt: str) -> str:
+    return fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+
+
+def _day_first(fmt: str) -> bool:
+    return '%d' in fmt and '%m' in fmt and fmt.index('%d') < fmt.index('%m')
+
+
+def _parsed_count(values: pd.Series, fmt: str) -> int:
+    return int(_to_datetime(values, fmt)[0].notna().sum())
+
+
+class FormatInference:
+    """
+    Infers one timestamp format from values seen chunk by chunk, e.g. while
+    a batch is staged. Only the formats that parse every value seen so far
+    stay candidates, so the result holds for all the values while a single
+    chunk is in memory: COMPACT_DATE, 'epoch_<unit>' for numbers, 'ISO8601',
+    or the first of DATE_FORMATS.
+    When both a day-first format and its month-first twin read every value,
+    and some value as different dates (all days <= 12), DEFAULT_DATE_ORDER
+    picks one.
+    """
+    def __init__(self):
+        self.candidates: Optional[List[str]] = None
+        self.largest = 0.0
+        # Day-first formats whose month-first twin read some value as another date
+        self.conflicting = set()
+
+    def update(self, values: pd.Series):
+        distinct = _distinct(values)
+        if distinct.empty or self.candidates == []:
+            return
+        candidates = self.candidates
+        if candidates is None:
+            candidates = [COMPACT_DATE, _EPOCH_CANDIDATE, ISO8601] + DATE_FORMATS
+        sample = distinct.head(SAMPLE_SIZE)
+        parsed = {}
+        for fmt in candidates:
+            if fmt == _EPOCH_CANDIDATE:
+                if _matches(distinct, _EPOCH).all():
+                    self.largest = max(self.largest, float(pd.to_numeric(distinct).abs().max()))
+                    parsed[fmt] = None
+                continue
+            if fmt == COMPACT_DATE and not distinct.str.len().eq(8).all():
+                continue
+            if fmt == ISO8601 and not _matches(distinct, _ISO_PREFIX).all():
+                continue
+            if _parsed_count(sample, fmt) < len(sample):
+                continue
+            values_parsed = _to_datetime(distinct, fmt)[0]
+            if values_parsed.notna().all():
+                parsed[fmt] = values_parsed
+        self.candidates = [fmt for fmt in candidates if fmt in parsed]
+        for fmt in self.candidates:
+            swapped = _swap_day_month(fmt)
+            if _day_first(fmt) and swapped in parsed and (parsed[fmt] != parsed[swapped]).any():
+                self.conflicting.add(fmt)
+
+    def ambiguous(self) -> Optional[Tuple[str, str]]:
+        """
+        (day-first, month-first) formats when both read every value, and
+        some value as different dates.
+        """
+        if not self.candidates:
+            return None
+        fmt = self.candidates[0]
+        if fmt in self.conflicting and _swap_day_month(fmt) in self.candidates:
+            return fmt, _swap_day_month(fmt)
+        return None
+
+    def result(self, label: Optional[str] = None) -> Optional[str]:
+        """
+        The inferred format, None when no format read every value. When
+        DEFAULT_DATE_ORDER has to decide, a warning naming `label` (where
+        the values come from) is logged; none without a label.
+        """
+        if not self.candidates:
+            return None
+        fmt = self.candidates[0]
+        if fmt == _EPOCH_CANDIDATE:
+            return next(f'epoch_{unit}' for bound, unit in EPOCH_UNITS if self.largest >= bound)
+        ambiguous = self.ambiguous()
+        if ambiguous is not None:
+            fmt = ambiguous[1] if settings.DEFAULT_DATE_ORDER == 'month' else ambiguous[0]
+            if label is not None:
+                logger.warning("Timestamps of %s read day or month first, taking %r "
+                               "(DEFAULT_DATE_ORDER); set SOURCE_TIMESTAMP_FORMATS to choose",
+                               label, fmt)
+        return fmt
+
+
+def infer_format(values: pd.Series, partial: bool = False,
+                 label: Optional[str] = None) -> Optional[str]:
+    """
+    Format of timestamp strings (see FormatInference); None when nothing
+    parses every distinct value. With `partial` the format parsing the
+    most values is used then instead.
+    """
+    inference = FormatInference()
+    inference.update(values)
+    fmt = inference.result(label)
+    if fmt is not None or not partial:
+        return fmt
+    distinct = _distinct(values)
+    candidates = DATE_FORMATS
+    if _matches(distinct, _ISO_PREFIX).all():
+        candidates = [ISO8601] + DATE_FORMATS
+    best, best_count = None, 0
+    for candidate in candidates:
+        count = _parsed_count(distinct, candidate)
+        if count > best_count:
+            best, best_count = candidate, count
+    return best
+
+
+def is_format(fmt: str) -> bool:
+    """
+    Whether `fmt` names a format parse() reads: ISO8601, 'epoch_<unit>' or
+    a strptime format.
+    """
+    return fmt == ISO8601 or fmt in {f'epoch_{unit}' for _, unit in EPOCH_UNITS} or '%' in fmt
+
+
+def _to_datetime(values: pd.Series, fmt: str) -> Tuple[pd.Series, np.ndarray]:
+    # Vectorised parse with one explicit format: naive datetimes, in UTC
+    # where the value said so (an offset, or an epoch number), and which
+    # values those were
+    if fmt.startswith('epoch_'):
+        numbers = pd.to_numeric(values, errors='coerce')
+        parsed = pd.to_datetime(numbers, unit=fmt[len('epoch_'):], errors='coerce')
+        return parsed, np.ones(len(values), dtype=bool)
+    if _NUMERIC_FORMAT.match(fmt):
+        # Arrow's strptime is an order of magnitude faster than pandas'
+        # for these; pandas has its own fast path for ISO 8601
+        parsed = pc.strptime(pa.array(values, type=pa.string()), format=fmt, unit='ns',
+                             error_is_null=True)
+        parsed = pd.Series(parsed.to_numpy(zero_copy_only=False), index=values.index)
+        return parsed, np.zeros(len(values), dtype=bool)
+    # Only ISO 8601 values carry offsets; those count as UTC, the rest are naive
+    aware = np.zeros(len(values), dtype=bool)
+    if fmt == ISO8601:
+        aware = _matches(values, _OFFSET)
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce', utc=bool(aware.any()))
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_convert('UTC').dt.tz_localize(None)
+    return parsed.astype('datetime64[ns]'), aware
+
+
+def _for_source(patterns: dict, source: Optional[str]) -> Optional[str]:
+    # Value of the first source name pattern matching `source`
+    if source:
+        for pattern, value in patterns.items():
+            if fnmatch.fnmatch(source, pattern):
+                return value
+    return None
+
+
+def source_timezone(source: Optional[str]) -> str:
+    """
+    Zone naive timestamps of `source` are in: the first SOURCE_TIMEZONES
+    pattern matching the source name, else DEFAULT_TIMEZONE.
+    """
+    return _for_source(settings.SOURCE_TIMEZONES, source) or settings.DEFAULT_TIMEZONE
+
+
+def source_format(source: Optional[str]) -> Optional[str]:
+    """
+    Format configured for timestamps of `source` (SOURCE_TIMESTAMP_FORMATS),
+    if any; it is used as is, without inference.
+    """
+    return _for_source(settings.SOURCE_TIMESTAMP_FORMATS, source)
+
+
+def to_utc(parsed: pd.Series, zone: str) -> pd.Series:
+    """
+    Naive UTC datetimes: aware values are converted, naive ones are read as
+    local time in `zone`. Times a DST change skips move forward, and
+    ambiguous ones take the standard-time reading.
+    """
+    if parsed.dt.tz is None:
+        if zone.upper() == 'UTC':
+            return parsed
+        parsed = parsed.dt.tz_localize(zone, ambiguous=np.zeros(len(parsed), dtype=bool),
+                                       nonexistent='shift_forward')
+    return parsed.dt.tz_convert('UTC').dt.tz_localize(None)
+
+
+def _parse_with(text: pd.Series, fmt: Optional[str]) -> Tuple[pd.Series, np.ndarray]:
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    aware = np.zeros(len(text), dtype=bool)
+    present = text.notna().to_numpy()
+    if fmt is not None and present.any():
+        values, values_aware = _to_datetime(text[present], fmt)
+        parsed[present] = values.to_numpy()
+        aware[present] = values_aware
+    return parsed, aware
+
+
+def parse(values: pd.Series, source: Optional[str] = None, key: Optional[Hashable] = None,
+          fmt: Optional[str] = None) -> pd.Series:
+    """
+    Parse timestamp strings to naive UTC datetimes (NaT where unparseable).
+
+    Every value is read with one format: `fmt` when given (the format of a
+    raw batch, inferred from all its rows when it was staged), else the
+    one configured for the source (see source_format), else one inferred
+    from the values and cached under `key` (the source name by default),
+    so later chunks go straight to one vectorised parse. When the cached
+    format misses a value it is inferred again from all the values. Values
+    the format misses stay NaT rather than being read with another format.
+    Values with an offset are converted from it; naive ones are read in
+    the source's zone (see source_timezone).
+    """
+    key = key if key is not None else source
+    text = values.astype(str).where(values.notna(), None)
+    fixed = fmt or source_format(source)
+    fmt = fixed or (_formats.get(key) if key is not None else None)
+    parsed, aware = _parse_with(text, fmt)
+    if fixed is None and parsed.isna().to_numpy()[text.notna().to_numpy()].any():
+        inferred = infer_format(text, partial=True, label=source or str(key))
+        if inferred is not None and key is not None:
+            _formats.set(key, inferred)
+        if inferred != fmt:
+            parsed, aware = _parse_with(text, inferred)
+
+    zone = source_timezone(source)
+    local = ~aware & parsed.notna().to_numpy()
+    if zone.upper() != 'UTC' and local.any():
+        parsed[local] = to_utc(parsed[local], zone).to_numpy()
+    return parsed
@@ -1,33 +1,200 @@
+import re
+from typing import Hashable, List, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
+from app.etl.processors import timestamps
 
-def validate_data(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+# Checks a field can declare, in bit order. A field's checks occupy
+# len(CHECKS) consecutive bits of the error code, so codes stored for
+# earlier rows keep their meaning as long as fields are only appended.
+CHECKS = ('required', 'type', 'allowed', 'range', 'pattern')
+# Set by the pipeline, not the schema: another row of the order in the batch was kept
+DUPLICATE_ORDER = 1 << 62
+
+
+class Field:
+    """
+    Declarative rule set for one canonical column.
+
+    `kind` is the typed column handed to later stages: 'string' (object),
+    'number' (float64), 'datetime' (naive UTC, written to timestamp_utc) or
+    'category'. `allowed` values match case-insensitively and are stored in
+    their declared spelling; `min`/`max` bound numbers and datetimes;
+    `pattern` must match the whole trimmed text.
+    """
+    def __init__(self, name: str, kind: str = 'string', required: bool = False,
+                 allowed: Optional[Sequence[str]] = None, min=None, max=None,
+                 pattern: Optional[str] = None, case: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.allowed = list(allowed) if allowed is not None else None
+        self.min = min
+        self.max = max
+        self.pattern = pattern
+        self.case = case  # 'upper'/'lower' applied to text before checking
+
+
+SCHEMA = [
+    Field('order_id', required=True),
+    Field('customer_id', required=True),
+    Field('customer_name'),
+    Field('product_id'),
+    Field('amount', 'number', required=True, min=-1e12, max=1e12),
+    Field('currency', 'category', pattern=r'[A-Z]{3}', case='upper'),
+    Field('channel', 'category'),
+    Field('status', 'category', allowed=['completed', 'pending', 'cancelled', 'refunded']),
+    Field('timestamp', 'datetime', min=pd.Timestamp('1970-01-01'), max=pd.Timestamp('2100-01-01')),
+]
+
+
+def code(field_name: str, check: str, schema: Sequence[Field] = SCHEMA) -> int:
+    """
+    Error bit for one check of one field.
+    """
+    index = next(i for i, f in enumerate(schema) if f.name == field_name)
+    return 1 << (index * len(CHECKS) + CHECKS.index(check))
+
+
+def describe(error_codes: int, schema: Sequence[Field] = SCHEMA) -> List[str]:
+    """
+    'field: check' for every bit set in an error code.
+    """
+    messages = []
+    for i, f in enumerate(schema):
+        for j, check in enumerate(CHECKS):
+            if error_codes & (1 << (i * len(CHECKS) + j)):
+                messages.append(f"{f.name}: {check}")
+    if error_codes & DUPLICATE_ORDER:
+        messages.append("order_id: duplicate in batch")
+    return messages
+
+
+def _distinct(values: pd.Series, case: Optional[str]) -> Tuple[np.ndarray, pd.Series]:
+    # Row -> distinct value index (-1 for null) and the trimmed distinct
+    # values, '' counting as null: checks and parsing run once per value
+    rows, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    if case == 'upper':
+        text = text.str.upper()
+    elif case == 'lower':
+        text = text.str.lower()
+    return rows, text.where(text != '', None)
+
+
+def _spread(values, rows: np.ndarray, fill) -> np.ndarray:
+    # Per distinct value -> per row; null rows (-1) pick `fill`
+    return np.append(np.asarray(values), fill)[rows]
+
+
+class CompiledSchema:
+    """
+    A schema turned into vectorised checks: one pass over the frame builds
+    an int64 error code per row and the typed columns later stages use, so
+    nothing is parsed twice. Each column is factorised first, so trimming,
+    parsing and matching run once per distinct value, not once per row.
+    """
+    def __init__(self, schema: Sequence[Field] = SCHEMA):
+        self.schema = list(schema)
+        self._patterns = {f.name: re.compile(f.pattern) for f in self.schema if f.pattern}
+        self._categories = {
+            f.name: pd.CategoricalDtype(f.allowed)
+            for f in self.schema if f.kind == 'category' and f.allowed
+        }
+        self._lookups = {
+            f.name: {v.lower(): v for v in f.allowed} for f in self.schema if f.allowed
+        }
+
+    def apply(self, df: pd.DataFrame, source: Optional[str] = None,
+              batch: Optional[Hashable] = None,
+              timestamp_format: Optional[str] = None) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Typed copy of `df` and the error code of every row (0 = valid).
+        `source`, `batch` and `timestamp_format` pick the timezone and
+        format of timestamps (see timestamps.parse).
+        """
+        out = df.copy()
+        codes = np.zeros(len(df), dtype='int64')
+        for index, f in enumerate(self.schema):
+            bit = {check: np.int64(1) << np.int64(index * len(CHECKS) + j)
+                   for j, check in enumerate(CHECKS)}
+            missing = bit['required'] if f.required else np.int64(0)
+            if f.name not in df.columns:
+                codes |= missing
+                continue
+
+            rows, text = _distinct(df[f.name], f.case)
+            present = text.notna().to_numpy()
+            errors = np.where(present, np.int64(0), missing)
+
+            if f.kind == 'number':
+                values = pd.to_numeric(text, errors='coerce').astype('float64')
+                errors[present & ~np.isfinite(values.to_numpy())] |= bit['type']
+            elif f.kind == 'datetime':
+                values = timestamps.parse(text, source, batch, timestamp_format)
+                errors[present & values.isna().to_numpy()] |= bit['type']
+            else:
+                values = text
+
+            if f.allowed is not None:
+                values = text.str.lower().map(self._lookups[f.name])
+                errors[present & values.isna().to_numpy()] |= bit['allowed']
+
+            if f.min is not None or f.max is not None:
+                out_of_range = np.zeros(len(text), dtype=bool)
+                if f.min is not None:
+                    out_of_range |= (values < f.min).to_numpy()
+                if f.max is not None:
+                    out_of_range |= (values > f.max).to_numpy()
+                errors[out_of_range] |= bit['range']
+
+            if f.name in self._patterns:
+                matched = text.str.fullmatch(self._patterns[f.name])
+                errors[present & ~matched.fillna(False).to_numpy(dtype=bool)] |= bit['pattern']
+
+            codes |= _spread(errors, rows, missing)
+            if f.kind == 'number':
+                out[f.name] = _spread(values, rows, np.nan)
+            elif f.kind == 'datetime':
+                taken = values.array.take(rows, allow_fill=True)
+                out['timestamp_utc'] = pd.Series(taken, index=df.index)
+            elif f.kind == 'category':
+                if f.name in self._categories:
+                    dtype = self._categories[f.name]
+                    category_codes = dtype.categories.get_indexer(values)
+                else:
+                    category_codes, categories = pd.factorize(values)
+                    dtype = pd.CategoricalDtype(categories)
+                codes_by_row = _spread(category_codes, rows, -1)
+                out[f.name] = pd.Categorical.from_codes(codes_by_row, dtype=dtype)
+            else:
+                out[f.name] = _spread(values.to_numpy(dtype=object), rows, None)
+        return out, codes
+
+
+_compiled = CompiledSchema()
+
+
+def validate_data(df: pd.DataFrame, schema: Optional[CompiledSchema] = None,
+                  source: Optional[str] = None, batch: Optional[Hashable] = None,
+                  timestamp_format: Optional[str] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Simple data validation.
-    Returns (valid_df, invalid_df)
+    Check rows against the schema (SCHEMA by default); timestamps become
+    UTC using the zone configured for `source`, read with
+    `timestamp_format` when the batch has one.
+    Returns (valid_df, invalid_df): valid rows with typed columns, and
+    invalid rows with their `error_codes` bitmask and a readable `error`.
     """
     if df.empty:
         return df, df
-    
-    # Required columns
-    required_cols = ['order_id', 'amount', 'customer_id']
-    
-    # Check for missing required columns
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        # If critical columns are missing, all records are invalid
-        df['error'] = f"Missing columns: {', '.join(missing_cols)}"
-        return pd.DataFrame(columns=df.columns), df
-    
-    # Check for nulls in required columns
-    is_valid = df[required_cols].notnull().all(axis=1)
-    
-    # Check for numeric amount
-    is_valid &= pd.to_numeric(df['amount'], errors='coerce').notnull()
-    
-    valid_df = df[is_valid].copy()
+    schema = schema or _compiled
+    typed, codes = schema.apply(df, source, batch, timestamp_format)
+    is_valid = codes == 0
+    valid_df = typed if is_valid.all() else typed[is_valid].copy()
     invalid_df = df[~is_valid].copy()
-    
     if not invalid_df.empty:
-        invalid_df['error'] = "Missing required data or invalid amount format"
-        
+        invalid_df['error_codes'] = codes[~is_valid]
+        messages = {c: ', '.join(describe(int(c), schema.schema))
+                    for c in np.unique(codes[~is_valid])}
+        invalid_df['error'] = invalid_df['error_codes'].map(messages)
     return valid_df, invalid_df
@@ -0,0 +1,377 @@
+import bisect
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.etl import row_hashes
+from app.etl.processors import timestamps
+from app.models.bulk import chunked
+from app.models.raw import RawBatch, RawBatchRange
+
+# Rows of a raw batch travel through the ETL in the raw_event_id column
+# like raw_events rows do: batch id in the high bits, row number in the
+# low 32 bits. raw_events ids stay below the first batch reference.
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+FIRST_REF = 1 << ROW_BITS
+# Fast to decompress; only the record batches an ETL chunk touches are read
+COMPRESSION = 'lz4'
+# Column whose format is inferred while staging (validation.SCHEMA's datetime field)
+TIMESTAMP_COLUMN = 'timestamp'
+
+
+def refs(batch_id: int, start: int, stop: int) -> np.ndarray:
+    """
+    raw_event_id references of the rows [start, stop) of a batch.
+    """
+    return (np.int64(batch_id) << ROW_BITS) + np.arange(start, stop, dtype='int64')
+
+
+def lineage(raw_ids: pd.Series) -> pd.DataFrame:
+    """
+    sales_events lineage columns for loaded rows: raw_event_id for rows of
+    raw_events, raw_batch_ref (the reference itself) for rows of a raw batch,
+    which have no raw_events row to point at.
+    """
+    ids = raw_ids.astype('int64')
+    in_batch = ids >= FIRST_REF
+    return pd.DataFrame({
+        'raw_event_id': ids.astype(object).where(~in_batch, None),
+        'raw_batch_ref': ids.astype(object).where(in_batch, None),
+    }, index=raw_ids.index)
+
+
+def _as_text(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Object columns become strings, so every chunk of an upload has the
+    # same Arrow schema whatever mix of values it holds
+    chunk = chunk.copy()
+    chunk.columns = [str(c) for c in chunk.columns]
+    for column in chunk.columns[chunk.dtypes == object]:
+        values = chunk[column]
+        chunk[column] = values.where(values.isna(), values.astype(str))
+    return chunk
+
+
+def _schema(chunk: pd.DataFrame, batch_rows: int) -> pa.Schema:
+    inferred = pa.Schema.from_pandas(chunk, preserve_index=False)
+    fields = [pa.field(f.name, pa.string()) if chunk[f.name].dtype == object else f
+              for f in inferred]
+    return pa.schema(fields, metadata={b'batch_rows': str(batch_rows).encode()})
+
+
+def write_batch(db: Session, chunks: Iterable[pd.DataFrame], source: str,
+                content_hash: Optional[str] = None, replaces: Sequence[int] = (),
+                timestamp_format: Optional[str] = None) -> dict:
+    """
+    Write DataFrame chunks to one compressed Arrow IPC file and register it
+    as a raw batch with a single pending range. Every row gets a row hash
+    (see etl.row_hashes) and rows already loaded unchanged are dropped.
+    Record batches hold exactly ETL_CHUNK_SIZE rows, so an ETL claim decodes
+    only the batches it covers. The file gets its final name and the batch
+    is committed only once all chunks are written, so the ETL never sees a
+    partial upload; memory is bounded by one chunk.
+    Returns the batch id (None when nothing was staged), staged and skipped
+    rows. With `content_hash` the batch is recorded even when every row was
+    skipped, so the same file is recognised next time. The batches listed
+    in `replaces` are deleted in the same transaction (see compact).
+    The format of the timestamp column is `timestamp_format`, else the one
+    configured for the source, else inferred from every row, and stored
+    with the batch so all its ETL chunks are read alike.
+    """
+    batch_rows = settings.ETL_CHUNK_SIZE
+    os.makedirs(settings.RAW_BATCH_DIR, exist_ok=True)
+    name = f"{uuid.uuid4().hex}.arrow"
+    path = os.path.join(settings.RAW_BATCH_DIR, name)
+    partial = f"{path}.partial"
+    rows = skipped = 0
+    timestamp_format = timestamp_format or timestamps.source_format(source)
+    inference = timestamps.FormatInference() if timestamp_format is None else None
+    try:
+        with pa.OSFile(partial, 'wb') as sink:
+            writer = schema = carry = None
+            for chunk in chunks:
+                chunk = _as_text(chunk)
+                if inference is not None and TIMESTAMP_COLUMN in chunk.columns:
+                    inference.update(chunk[TIMESTAMP_COLUMN])
+                chunk[row_hashes.HASH_COLUMN] = row_hashes.compute(chunk)
+                staged = row_hashes.drop_loaded(db, chunk)
+                skipped += len(chunk) - len(staged)
+                if writer is None:
+                    schema = _schema(staged, batch_rows)
+                    options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+                    writer = pa.ipc.new_file(sink, schema, options=options)
+                table = pa.Table.from_pandas(staged, schema=schema, preserve_index=False)
+                if carry is not None and len(carry):
+                    # One contiguous table, else record batches follow the pieces
+                    table = pa.concat_tables([carry, table]).combine_chunks()
+                full = len(table) - len(table) % batch_rows
+                if full:
+                    writer.write_table(table.slice(0, full), max_chunksize=batch_rows)
+                carry = table.slice(full)
+                rows += len(staged)
+            if writer is not None:
+                if len(carry):
+                    writer.write_table(carry)
+                writer.close()
+        if rows:
+            os.replace(partial, path)
+        else:
+            os.remove(partial)
+            if content_hash is None and not replaces:
+                db.rollback()
+                return {"batch_id": None, "rows": 0, "skipped": skipped}
+
+        batch_id = None
+        if rows or content_hash is not None:
+            if inference is not None:
+                timestamp_format = inference.result(source)
+            batch_id = db.execute(
+                insert(RawBatch).values(source=source, path=name if rows else None, rows=rows,
+                                        content_hash=content_hash,
+                                        timestamp_format=timestamp_format)
+                .returning(RawBatch.id)
+            ).scalar_one()
+        if rows:
+            db.execute(insert(RawBatchRange).values(batch_id=batch_id, start=0, stop=rows,
+                                                    status="pending"))
+        replaced = _delete_batches(db, replaces)
+        db.commit()
+        _remove_files(replaced)
+        return {"batch_id": batch_id, "rows": rows, "skipped": skipped}
+    except BaseException:
+        db.rollback()
+        for leftover in (partial, path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+
+def read_rows(db: Session, batch_id: int, start: int, stop: int) -> pd.DataFrame:
+    """
+    Rows [start, stop) of a raw batch as a DataFrame with their raw_event_id
+    references. The file is memory-mapped and only the record batches
+    covering the range are decompressed; there is no per-row decoding.
+    """
+    batch = db.get(RawBatch, batch_id)
+    reader = pa.ipc.open_file(pa.memory_map(os.path.join(settings.RAW_BATCH_DIR, batch.path)))
+    batch_rows = int(reader.schema.metadata[b'batch_rows'])
+    first, last = start // batch_rows, (stop - 1) // batch_rows
+    record_batches = [reader.get_batch(i) for i in range(first, last + 1)]
+    table = pa.Table.from_batches(record_batches, schema=reader.schema)
+    df = table.slice(start - first * batch_rows, stop - start).to_pandas()
+    df['raw_event_id'] = refs(batch_id, start, stop)
+    # Timestamps are read with the batch's format, in the source's zone
+    df.attrs.update(source=batch.source, batch=('raw_batch', batch_id),
+                    timestamp_format=batch.timestamp_format)
+    return df
+
+
+def set_status(db: Session, raw_ids, status: str):
+    """
+    Record `status` for batch rows given by their raw_event_id references
+    and release their lease. Consecutive rows become one range, so a chunk
+    with a few failed rows is stored as a handful of ranges, not per row.
+    A batch with failed rows gives up its content hash, so uploading the
+    same file again stages it instead of skipping it as a duplicate.
+    """
+    ids = np.unique(np.asarray(raw_ids, dtype='int64'))
+    batch_ids = ids >> ROW_BITS
+    for batch_id in np.unique(batch_ids):
+        rows = ids[batch_ids == batch_id] & ROW_MASK
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        runs = [(int(run[0]), int(run[-1]) + 1) for run in np.split(rows, breaks)]
+        _split_ranges(db, int(batch_id), runs, status)
+    if status == "failed":
+        for ids in chunked(np.unique(batch_ids).tolist()):
+            db.execute(update(RawBatch).where(RawBatch.id.in_(ids)).values(content_hash=None),
+                       execution_options={"synchronize_session": False})
+
+
+def is_loaded(db: Session, batch_id: int) -> bool:
+    """
+    Whether the ETL has finished with every row of a batch.
+    """
+    pending = select(RawBatchRange.id).where(RawBatchRange.batch_id == batch_id,
+                                             RawBatchRange.status == "pending")
+    return db.execute(pending.limit(1)).first() is None
+
+
+def _split_ranges(db: Session, batch_id: int, runs: List[Tuple[int, int]], status: str):
+    # Cut the ranges overlapping `runs` at the run boundaries, give the rows
+    # inside the runs the new status, then merge equal neighbours. The
+    # ranges just before and after the runs take part in the merge; they
+    # may belong to other workers, hence the row locks
+    ranges = db.execute(
+        select(RawBatchRange.id, RawBatchRange.start, RawBatchRange.stop, RawBatchRange.status,
+               RawBatchRange.claimed_by, RawBatchRange.lease_until)
+        .where(RawBatchRange.batch_id == batch_id,
+               RawBatchRange.start <= runs[-1][1], RawBatchRange.stop >= runs[0][0])
+        .order_by(RawBatchRange.start)
+        .with_for_update()
+    ).all()
+    if not ranges:
+        return
+    ends = [stop for _, stop in runs]
+    pieces = []
+    for r in ranges:
+        kept = (r.status, r.claimed_by, r.lease_until)
+        done = (status, r.claimed_by, None)
+        position = r.start
+        i = bisect.bisect_right(ends, r.start)
+        while i < len(runs) and runs[i][0] < r.stop:
+            start, stop = max(runs[i][0], r.start), min(runs[i][1], r.stop)
+            if start > position:
+                pieces.append([position, start, kept])
+            pieces.append([start, stop, done])
+            position = stop
+            i += 1
+        if position < r.stop:
+            pieces.append([position, r.stop, kept])
+
+    merged = []
+    for piece in pieces:
+        if merged and merged[-1][1] == piece[0] and merged[-1][2] == piece[2]:
+            merged[-1][1] = piece[1]
+        else:
+            merged.append(piece)
+
+    for ids in chunked([r.id for r in ranges]):
+        db.execute(delete(RawBatchRange).where(RawBatchRange.id.in_(ids)),
+                   execution_options={"synchronize_session": False})
+    db.execute(insert(RawBatchRange), [
+        {"batch_id": batch_id, "start": start, "stop": stop, "status": s,
+         "claimed_by": claimed_by, "lease_until": lease_until}
+        for start, stop, (s, claimed_by, lease_until) in merged
+    ])
+
+
+def compact(db: Session, source: str, max_rows: int, worker_id: str, lease_seconds: int) -> int:
+    """
+    Merge untouched pending batches of `source` smaller than `max_rows`
+    (the micro-batches of pushed events) into batches of up to `max_rows`
+    rows, so the ETL claims, loads and publishes them as one chunk instead
+    of one per flush. The small batches are leased to `worker_id` while
+    they are copied and deleted when the merged batch is committed; nothing
+    was loaded from them, so no lineage points at them. Only batches
+    staged with the same timestamp format are merged, and the merged batch
+    keeps that format.
+    Returns the number of batches merged away.
+    """
+    merged = 0
+    while True:
+        now = datetime.utcnow()
+        claimable = (
+            RawBatchRange.status == "pending",
+            RawBatchRange.start == 0,
+            or_(RawBatchRange.lease_until.is_(None), RawBatchRange.lease_until < now),
+        )
+        candidates = db.execute(
+            select(RawBatchRange.id, RawBatchRange.batch_id, RawBatchRange.stop,
+                   RawBatch.timestamp_format)
+            .join(RawBatch, RawBatch.id == RawBatchRange.batch_id)
+            .where(RawBatch.source == source, RawBatch.rows < max_rows,
+                   RawBatchRange.stop == RawBatch.rows, *claimable)
+            .order_by(RawBatchRange.batch_id)
+            .with_for_update(skip_locked=True)
+        ).all()
+        # Rows are read with their batch's format: a format inferred over
+        # rows of batches in different formats could reject some of them
+        by_format = {}
+        for candidate in candidates:
+            by_format.setdefault(candidate.timestamp_format, []).append(candidate)
+        picked = []
+        for group in by_format.values():
+            picked, rows = [], 0
+            for candidate in group:
+                if rows + candidate.stop > max_rows:
+                    break
+                picked.append(candidate)
+                rows += candidate.stop
+            if len(picked) >= 2:
+                break
+        if len(picked) < 2:
+            db.commit()
+            return merged
+
+        claimed = db.execute(
+            update(RawBatchRange)
+            .where(RawBatchRange.id.in_([c.id for c in picked]), *claimable)
+            .values(claimed_by=worker_id, lease_until=now + timedelta(seconds=lease_seconds)),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if claimed != len(picked):
+            # Another worker claimed one first; leave the rest to the ETL
+            db.rollback()
+            return merged
+        db.commit()
+
+        added = ['raw_event_id', row_hashes.HASH_COLUMN]
+        frames = [read_rows(db, c.batch_id, 0, c.stop).drop(columns=added) for c in picked]
+        write_batch(db, [pd.concat(frames, ignore_index=True)], source=source,
+                    replaces=[c.batch_id for c in picked],
+                    timestamp_format=picked[0].timestamp_format)
+        merged += len(picked)
+
+
+def _delete_batches(db: Session, batch_ids: Sequence[int]) -> List[str]:
+    # Caller commits, then removes the returned files
+    paths = []
+    for ids in chunked(list(batch_ids)):
+        files = select(RawBatch.path).where(RawBatch.id.in_(ids), RawBatch.path.isnot(None))
+        paths.extend(db.execute(files).scalars().all())
+        db.execute(delete(RawBatchRange).where(RawBatchRange.batch_id.in_(ids)),
+                   execution_options={"synchronize_session": False})
+        db.execute(delete(RawBatch).where(RawBatch.id.in_(ids)),
+                   execution_options={"synchronize_session": False})
+    return paths
+
+
+def _remove_files(names: Iterable[str]):
+    for name in names:
+        try:
+            os.remove(os.path.join(settings.RAW_BATCH_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def collect_garbage(db: Session, retention_days: Optional[float] = None) -> int:
+    """
+    Delete the files and ranges of raw batches older than `retention_days`
+    (RAW_BATCH_RETENTION_DAYS) that have no pending rows left. The
+    raw_batches row stays: it names the source of loaded rows
+    (sales_events.raw_batch_ref) and holds the upload's content hash.
+    Returns the number of batches collected.
+    """
+    if retention_days is None:
+        retention_days = settings.RAW_BATCH_RETENTION_DAYS
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pending = select(RawBatchRange.batch_id).where(RawBatchRange.status == "pending")
+    done = db.execute(
+        select(RawBatch.id, RawBatch.path)
+        .where(RawBatch.path.isnot(None), RawBatch.timestamp < cutoff, RawBatch.id.not_in(pending))
+    ).all()
+    for ids in chunked([batch.id for batch in done]):
+        db.execute(delete(RawBatchRange).where(RawBatchRange.batch_id.in_(ids)),
+                   execution_options={"synchronize_session": False})
+        db.execute(update(RawBatch).where(RawBatch.id.in_(ids)).values(path=None),
+                   execution_options={"synchronize_session": False})
+    db.commit()
+    # Files go once no row points at them any more
+    _remove_files(batch.path for batch in done)
+    return len(done)
+
+
+def delete_all(db: Session):
+    """
+    Drop every raw batch and its file (demo reset).
+    """
+    paths = db.execute(select(RawBatch.path).where(RawBatch.path.isnot(None))).scalars().all()
+    db.query(RawBatchRange).delete()
+    db.query(RawBatch).delete()
+    _remove_files(paths)
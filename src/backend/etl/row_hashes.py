@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, and_, insert, select
+from sqlalchemy.orm import Session
+from app.models.bulk import upsert
+from app.models.raw import OrderRowHash
+
+# Fields a row hash covers, in hash order; other columns do not make a row
+# different. Hashes are 64-bit, so two different rows of one order collide
+# with negligible probability.
+ROW_HASH_FIELDS = ['order_id', 'customer_id', 'customer_name', 'product_id', 'amount',
+                   'currency', 'channel', 'status', 'timestamp']
+HASH_COLUMN = 'row_hash'
+
+# Per-connection scratch table for the staging anti-join
+_staged = Table(
+    'staged_row_hashes', MetaData(),
+    Column('order_id', String),
+    Column('row_hash', BigInteger),
+    prefixes=['TEMPORARY'],
+)
+
+
+def _text(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().where(values.notna(), '')
+
+
+def _hash(values) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(values))
+
+
+# Hash of a missing field: the same as an empty one
+_EMPTY = _hash(np.array([''], dtype=object))[0]
+_MULTIPLIER = np.uint64(1000003)
+
+
+def compute(df: pd.DataFrame) -> np.ndarray:
+    """
+    One int64 hash per row over ROW_HASH_FIELDS, on trimmed text; amounts
+    compare as numbers, so 10.5 and '10.50 ' hash the same. Column hashes
+    are combined directly instead of building a normalised frame.
+    """
+    combined = np.zeros(len(df), dtype='uint64')
+    for field in ROW_HASH_FIELDS:
+        if field not in df.columns:
+            hashed = _EMPTY
+        elif field == 'amount':
+            amounts = pd.to_numeric(df[field], errors='coerce')
+            hashed = np.where(amounts.notna(), _hash(amounts.round(6)),
+                              _hash(_text(df[field]).astype(object)))
+        else:
+            hashed = _hash(_text(df[field]).astype(object))
+        combined = combined * _MULTIPLIER ^ hashed
+    return combined.view('int64')
+
+
+def _keys(df: pd.DataFrame) -> pd.DataFrame:
+    keys = pd.DataFrame({'order_id': _text(df['order_id']), 'row_hash': df[HASH_COLUMN]})
+    return keys[(keys['order_id'] != '') & keys['row_hash'].notna()]
+
+
+def drop_loaded(db: Session, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of `df` (with its row_hash column) minus those whose order was last
+    loaded with the same hash. The chunk's keys go to a temporary table and
+    are anti-joined with order_row_hashes in the database, so the index is
+    never read into memory.
+    """
+    if df.empty or 'order_id' not in df.columns:
+        return df
+    keys = _keys(df)
+    if keys.empty or db.query(OrderRowHash.order_id).first() is None:
+        return df
+    _staged.create(db.connection(), checkfirst=True)
+    db.execute(_staged.delete())
+    db.execute(insert(_staged), [
+        {'order_id': order_id, 'row_hash': row_hash}
+        for order_id, row_hash in zip(keys['order_id'].tolist(),
+                                      keys['row_hash'].astype('int64').tolist())
+    ])
+    loaded = db.execute(
+        select(_staged.c.row_hash).join(OrderRowHash, and_(
+            OrderRowHash.order_id == _staged.c.order_id,
+            OrderRowHash.row_hash == _staged.c.row_hash,
+        ))
+    ).scalars().all()
+    if not loaded:
+        return df
+    return df[~df[HASH_COLUMN].isin(loaded)]
+
+
+def record_loaded(db: Session, df: pd.DataFrame):
+    """
+    Remember the row hash of every loaded row, per order, for later staging.
+    Rows staged before row hashes existed have none and are skipped.
+    """
+    if df.empty or HASH_COLUMN not in df.columns or 'order_id' not in df.columns:
+        return
+    # The last row of an order is the version the upsert kept
+    keys = _keys(df).drop_duplicates('order_id', keep='last')
+    if keys.empty:
+        return
+    db.execute(upsert(db, OrderRowHash.__table__, ['order_id'], ['row_hash']), [
+        {'order_id': order_id, 'row_hash': row_hash}
+        for order_id, row_hash in zip(keys['order_id'].tolist(),
+                                      keys['row_hash'].astype('int64').tolist())
+    ])
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Iterator, Optional, Sequence
+
+CHANNELS = ["Instagram", "WhatsApp", "Web", "Facebook"]
+CHANNEL_WEIGHTS = [0.35, 0.25, 0.3, 0.1]
+PRODUCTS = ["PROD-A", "PROD-B", "PROD-C"]
+# currency -> (share of orders, approx. units per USD)
+CURRENCIES = {"USD": (0.6, 1.0), "EUR": (0.15, 0.93), "GBP": (0.1, 0.79), "PKR": (0.15, 278.0)}
+STATUSES = ["completed", "pending", "cancelled"]
+STATUS_WEIGHTS = [0.85, 0.08, 0.07]
+# Relative order volume Monday..Sunday
+WEEKDAY_WEIGHTS = np.array([0.9, 0.95, 1.0, 1.0, 1.15, 1.35, 1.25])
+
+_FIRST = ["Ali", "Sara", "Ahmed", "Fatima", "John", "Maria", "Omar", "Ayesha", "David", "Zainab",
+          "Usman", "Hina", "Michael", "Noor", "Bilal", "Emma", "Hamza", "Sana", "James", "Amna"]
+_LAST = ["Khan", "Ahmed", "Smith", "Malik", "Hussain", "Brown", "Qureshi", "Garcia", "Sheikh",
+         "Butt", "Wilson", "Raza", "Iqbal", "Taylor", "Chaudhry", "Lee", "Mirza", "Shah"]
+
+
+def _name_pool(rng: np.random.Generator, n_customers: int, noise: float) -> np.ndarray:
+    """
+    One display name per customer; a `noise` share get a typo, case change or
+    token swap so fuzzy deduplication has near-duplicates to find.
+    """
+    first = np.array(_FIRST)[rng.integers(0, len(_FIRST), n_customers)]
+    last = np.array(_LAST)[rng.integers(0, len(_LAST), n_customers)]
+    suffix = rng.integers(1, 1000, n_customers).astype(str)
+    names = pd.Series(first).str.cat([pd.Series(last), pd.Series(suffix)], sep=" ")
+
+    noisy = rng.random(n_customers) < noise
+    kind = rng.integers(0, 3, n_customers)
+    lower = noisy & (kind == 0)
+    swap = noisy & (kind == 1)
+    typo = noisy & (kind == 2)
+    names[lower] = names[lower].str.lower()
+    names[swap] = pd.Series(last[swap]).str.cat(
+        [pd.Series(first[swap]), pd.Series(suffix[swap])], sep=", ").to_numpy()
+    # Drop one character from the first name
+    names[typo] = names[typo].str.slice_replace(1, 2, "")
+    return names.to_numpy(dtype=object)
+
+
+def generate_sales(
+    n_rows: int,
+    days: int = 365,
+    seed: Optional[int] = None,
+    n_customers: Optional[int] = None,
+    currencies: Optional[Sequence[str]] = None,
+    statuses: Optional[Sequence[str]] = None,
+    duplicate_rate: float = 0.02,
+    name_noise: float = 0.05,
+    end: Optional[datetime] = None,
+    order_offset: int = 0,
+) -> pd.DataFrame:
+    """
+    Generate `n_rows` synthetic orders over the last `days` days, fully vectorized.
+
+    Volume follows a weekly pattern and a slow upward trend, amounts are
+    log-normal per product, orders come in several currencies, a
+    `duplicate_rate` share of rows repeat an earlier order_id, and a
+    `name_noise` share of customer names are misspelt variants.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.utcnow()
+    n_customers = n_customers or max(50, n_rows // 20)
+
+    # Day offsets weighted by weekday seasonality and trend
+    day_index = np.arange(days)
+    dates = pd.Timestamp(end).normalize() - pd.to_timedelta(days - 1 - day_index, unit="D")
+    weights = WEEKDAY_WEIGHTS[dates.dayofweek] * np.linspace(0.8, 1.2, days)
+    day_pick = rng.choice(days, size=n_rows, p=weights / weights.sum())
+    seconds = rng.integers(0, 86400, n_rows)
+    timestamps = dates.to_numpy()[day_pick] + seconds.astype("timedelta64[s]")
+
+    product_idx = rng.integers(0, len(PRODUCTS), n_rows)
+    base_price = np.array([60.0, 120.0, 240.0])[product_idx]
+    usd_amount = base_price * rng.lognormal(0.0, 0.4, n_rows)
+
+    currency_names = list(currencies or CURRENCIES)
+    shares = np.array([CURRENCIES.get(c, (1.0, 1.0))[0] for c in currency_names])
+    currency_idx = rng.choice(len(currency_names), size=n_rows, p=shares / shares.sum())
+    per_usd = np.array([CURRENCIES.get(c, (1.0, 1.0))[1] for c in currency_names])
+    amount = np.round(usd_amount * per_usd[currency_idx], 2)
+
+    status_names = list(statuses or STATUSES)
+    if statuses is None:
+        status_idx = rng.choice(len(STATUSES), size=n_rows, p=STATUS_WEIGHTS)
+    else:
+        status_idx = rng.integers(0, len(status_names), n_rows)
+
+    customer_idx = rng.integers(0, n_customers, n_rows)
+    names = _name_pool(rng, n_customers, name_noise)
+
+    order_numbers = np.arange(order_offset, order_offset + n_rows)
+    dupes = rng.random(n_rows) < duplicate_rate
+    order_numbers[dupes] = order_numbers[rng.integers(0, n_rows, dupes.sum())]
+
+    return pd.DataFrame({
+        "order_id": pd.Series(order_numbers).map("ORD-{:08d}".format),
+        "customer_id": pd.Series(customer_idx).map("CUST-{:06d}".format),
+        "customer_name": names[customer_idx],
+        "product_id": np.array(PRODUCTS)[product_idx],
+        "amount": amount,
+        "currency": np.array(currency_names)[currency_idx],
+        "channel": np.array(CHANNELS)[rng.choice(len(CHANNELS), size=n_rows, p=CHANNEL_WEIGHTS)],
+        "status": np.array(status_names)[status_idx],
+        "timestamp": pd.Series(timestamps).dt.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+def iter_sales_chunks(n_rows: int, chunk_size: int = 500_000, seed: Optional[int] = None,
+                      **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Generate a large data set in chunks with globally unique order numbers,
+    so 10M-row runs never hold the whole frame in memory.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - start)
+        yield generate_sales(size, seed=int(rng.integers(1 << 31)), order_offset=start, **kwargs)
+
+
+def demo_records(n_rows: int = 120, days: int = 60) -> list:
+    """
+    Small clean USD data set for the dashboard demo.
+    """
+    df = generate_sales(
+        n_rows, days=days + 1, n_customers=50, currencies=["USD"], statuses=["completed"],
+        duplicate_rate=0.0, name_noise=0.0,
+    ).drop(columns=["customer_name"])
+    df["order_id"] = [f"DEMO-{1000 + i}" for i in range(n_rows)]
+    return df.to_dict(orient="records")
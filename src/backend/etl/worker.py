@@ -0,0 +1,46 @@
+"""
+Run ETL workers as separate processes:
+
+    python -m app.etl.worker --workers 4 --poll 5
+
+Each worker leases disjoint batches of pending raw events, so throughput
+scales with the number of workers up to what the database can absorb.
+"""
+import argparse
+import time
+from multiprocessing import Process
+from app.core.config import settings
+
+
+def run_worker(poll: float):
+    from app.etl.flows.main_flow import etl_pipeline
+    from app.etl.leases import new_worker_id
+
+    worker_id = new_worker_id()
+    while True:
+        report = etl_pipeline(chunked=True, worker_id=worker_id) or {}
+        print(f"[{worker_id}] {report.get('chunks', 0)} chunks, "
+              f"{report.get('inserted', 0)} inserted, {report.get('updated', 0)} updated, "
+              f"{report.get('failed', 0)} failed")
+        if poll <= 0:
+            return
+        if not report.get('chunks'):
+            time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenSight ETL workers")
+    parser.add_argument("--workers", type=int, default=settings.ETL_WORKERS)
+    parser.add_argument("--poll", type=float, default=0,
+                        help="seconds to wait between polls when idle; 0 drains once and exits")
+    args = parser.parse_args()
+
+    processes = [Process(target=run_worker, args=(args.poll,)) for _ in range(args.workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,72 @@
+import asyncio
 import os
 from jinja2 import Environment, FileSystemLoader
+from sqlalchemy.ext.asyncio import AsyncSession
 from weasyprint import HTML
+from app.core.cache import get_data_version_async
 from app.services.kpi_service import KPIService
 from app.insights.generator import InsightGenerator
-from app.models.base import SessionLocal
+from app.models.base import AsyncSessionLocal, begin_snapshot
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# Setup Jinja2 once per process; templates are not edited at runtime
+_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), auto_reload=False)
+_template = _env.get_template('report.html')
+
+async def collect_report_data(db: AsyncSession, days: int = 30) -> dict:
+    """
+    Query the KPIs, insights and forecast shown in the report, and the data
+    version they are cached under, from one snapshot of a fresh session, so
+    a concurrent ETL load cannot land between them. The version is returned
+    as `data_version`.
+    """
+    await begin_snapshot(db)
+    version, _ = await get_data_version_async(db)
+    kpi_service = KPIService(db)
+    insight_gen = InsightGenerator(db)
+
+    kpis = await kpi_service.get_summary_metrics(days=days)
+    insights = await insight_gen.generate_insights()
+
+    # Get forecast data
+    forecast_df = await kpi_service.get_revenue_forecast(forecast_days=30)
+    forecast_data = {}
+    if not forecast_df.empty:
+        forecast_data = {
+            'forecast': True,
+            'forecast_total': forecast_df['revenue'].sum(),
+            'forecast_7d': forecast_df.head(7)['revenue'].sum()
+        }
+    return {'data_version': version, 'kpis': kpis, 'insights': insights, **forecast_data}
+
+def render_pdf(data: dict, client_name: str = "OpenSight Demo") -> bytes:
+    """
+    Render the report data to PDF bytes with Jinja2 and WeasyPrint.
+    CPU-bound; the API runs it on the report executor (run_report), so
+    renders never take the threads that serve KPI requests.
+    """
+    html_out = _template.render(
+        client=client_name,
+        logo="https://via.placeholder.com/150x50?text=OpenSight",
+        **data
+    )
+    return HTML(string=html_out).write_pdf()
+
+def render_pdf_report(output_path: str, data: dict, client_name: str = "OpenSight Demo"):
+    with open(output_path, 'wb') as f:
+        f.write(render_pdf(data, client_name))
+    return output_path
 
 def generate_pdf_report(output_path: str, client_name: str = "OpenSight Demo"):
     """
     Generate a PDF report using WeasyPrint and Jinja2.
     """
-    db = SessionLocal()
-    try:
-        kpi_service = KPIService(db)
-        insight_gen = InsightGenerator(db)
-        
-        kpis = kpi_service.get_summary_metrics()
-        insights = insight_gen.generate_insights()
-        
-        # Get forecast data
-        forecast_df = kpi_service.get_revenue_forecast(forecast_days=30)
-        forecast_data = {}
-        if not forecast_df.empty:
-            forecast_data = {
-                'forecast': True,
-                'forecast_total': forecast_df['revenue'].sum(),
-                'forecast_7d': forecast_df.head(7)['revenue'].sum()
-            }
-        
-        # Setup Jinja2
-        template_dir = os.path.join(os.path.dirname(__file__), 'templates')
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template('report.html')
-        
-        # Render HTML
-        html_out = template.render(
-            client=client_name,
-            logo="https://via.placeholder.com/150x50?text=OpenSight",
-            kpis=kpis,
-            insights=insights,
-            **forecast_data
-        )
-        
-        # Generate PDF
-        HTML(string=html_out).write_pdf(output_path)
-        return output_path
-    finally:
-        db.close()
+    async def collect():
+        async with AsyncSessionLocal() as db:
+            return await collect_report_data(db)
+
+    return render_pdf_report(output_path, asyncio.run(collect()), client_name)
 
 if __name__ == "__main__":
     generate_pdf_report("leakage_report.pdf")
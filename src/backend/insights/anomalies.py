@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Sequence
+
+# Segment levels scored together: every (channel, product), every channel,
+# every product and the whole business
+LEVELS = ('channel_product', 'channel', 'product', 'total')
+ALL = '*'
+
+
+def daily_matrix(df: pd.DataFrame, end: date, days: int,
+                 dims: Sequence[str] = ('channel', 'product_id')):
+    """
+    Pivot (day, *dims, revenue) rows into a dense segments x days matrix for
+    the `days` days ending on `end`; missing days are 0. Returns
+    (segment index, matrix).
+    """
+    calendar = pd.date_range(end=pd.Timestamp(end), periods=days, freq='D')
+    if df.empty:
+        return pd.MultiIndex.from_tuples([], names=list(dims)), np.zeros((0, days))
+    df = df.assign(day=pd.to_datetime(df['day']))
+    wide = df.pivot_table(index=list(dims), columns='day', values='revenue', aggfunc='sum',
+                          fill_value=0.0)
+    wide = wide.reindex(columns=calendar, fill_value=0.0)
+    return wide.index, wide.to_numpy(dtype='float64')
+
+
+def with_rollups(index: pd.MultiIndex, matrix: np.ndarray):
+    """
+    Append channel-level, product-level and total rows to a (channel, product)
+    matrix. Returns (frame of segment labels with a `level` column, matrix).
+    """
+    labels = index.to_frame(index=False)
+    labels.columns = ['channel', 'product_id']
+    frames = [labels.assign(level='channel_product')]
+    blocks = [matrix]
+    for level, column in (('channel', 'channel'), ('product', 'product_id')):
+        codes, uniques = pd.factorize(labels[column])
+        summed = np.zeros((len(uniques), matrix.shape[1]))
+        np.add.at(summed, codes, matrix)
+        other = 'product_id' if column == 'channel' else 'channel'
+        frames.append(pd.DataFrame({column: uniques, other: ALL, 'level': level}))
+        blocks.append(summed)
+    frames.append(pd.DataFrame({'channel': [ALL], 'product_id': [ALL], 'level': ['total']}))
+    blocks.append(matrix.sum(axis=0, keepdims=True))
+    return pd.concat(frames, ignore_index=True), np.vstack(blocks)
+
+
+def score_weeks(matrix: np.ndarray, weeks: int = 8, min_std_ratio: float = 0.1) -> dict:
+    """
+    Score the latest 7 days of every row against the `weeks` preceding 7-day
+    windows, all rows at once. Weekly sums cancel the weekday pattern.
+    Weeks before a row's first sale are not part of its baseline, and rows
+    with fewer than two baseline weeks get no z-score.
+    Returns arrays: current, previous (last week), baseline (mean), z, wow.
+    The std is floored at `min_std_ratio` x baseline (and 1.0) so flat
+    series do not produce huge z-scores from tiny changes.
+    """
+    n_days = 7 * (weeks + 1)
+    window = matrix[:, -n_days:]
+    if window.shape[1] < n_days:
+        window = np.pad(window, ((0, 0), (n_days - window.shape[1], 0)))
+    weekly = window.reshape(len(window), weeks + 1, 7).sum(axis=2)
+    current = weekly[:, -1]
+    previous = weekly[:, -2]
+
+    # Baselines start at the first full week after the segment's first sale
+    active = window != 0
+    first_week = np.where(active.any(axis=1), -(-active.argmax(axis=1) // 7), weeks + 1)
+    valid = np.arange(weeks)[None, :] >= first_week[:, None]
+    history = np.where(valid, weekly[:, :-1], 0.0)
+    n_valid = valid.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseline = history.sum(axis=1) / n_valid
+        sq_dev = np.where(valid, (history - baseline[:, None]) ** 2, 0.0)
+        std = np.sqrt(sq_dev.sum(axis=1) / (n_valid - 1))
+        std = np.fmax(std, np.maximum(min_std_ratio * np.abs(baseline), 1.0))
+        z = np.where(n_valid >= 2, (current - baseline) / std, np.nan)
+        wow = np.where(previous > 0, (current - previous) / previous, np.nan)
+    return {'current': current, 'previous': previous, 'baseline': baseline, 'z': z, 'wow': wow}
+
+
+def rank_anomalies(labels: pd.DataFrame, scores: dict, z_threshold: float = 3.0,
+                   min_baseline: float = 0.0, top: int = 10) -> pd.DataFrame:
+    """
+    Segments whose latest week is at least `z_threshold` deviations from
+    their baseline, ranked by revenue impact (current - baseline).
+    """
+    out = labels.assign(**scores)
+    out['impact'] = out['current'] - out['baseline']
+    flagged = out[(out['z'].abs() >= z_threshold) & (out['baseline'] >= min_baseline)]
+    order = flagged['impact'].abs().sort_values(ascending=False, kind='mergesort').index
+    return flagged.loc[order].head(top).reset_index(drop=True)
+
+
+def detect_anomalies(df: pd.DataFrame, end: date, weeks: int = 8, z_threshold: float = 3.0,
+                     min_share: float = 0.0, top: int = 10):
+    """
+    Score every segment level of a (day, channel, product_id, revenue) frame
+    in one vectorized pass. Segments below `min_share` of total baseline
+    revenue are not flagged. Returns (all scores, top anomalies).
+    """
+    index, matrix = daily_matrix(df, end, 7 * (weeks + 1))
+    labels, matrix = with_rollups(index, matrix)
+    scores = score_weeks(matrix, weeks=weeks)
+    total_baseline = np.nan_to_num(scores['baseline'][-1])
+    ranked = rank_anomalies(labels, scores, z_threshold=z_threshold,
+                            min_baseline=min_share * total_baseline, top=top)
+    return labels.assign(**scores), ranked
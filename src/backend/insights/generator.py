@@ -1,49 +1,117 @@
+import math
 import pandas as pd
+from datetime import datetime, timedelta
+from app.core.cache import cached_result
+from app.core.executor import run_cpu
+from app.insights.anomalies import ALL, detect_anomalies
 from app.services.kpi_service import KPIService
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Baseline weeks each segment's latest week is compared against
+ANOMALY_WEEKS = 8
+Z_THRESHOLD = 3.0
+MAX_SEGMENT_INSIGHTS = 5
+# Daily history the anomaly scores need: the baseline weeks plus the latest
+# one, which ends yesterday, and today
+ANOMALY_DAYS = 7 * (ANOMALY_WEEKS + 1) + 1
+
+def _segment_name(row) -> str:
+    channel = row.channel or 'Unknown'
+    product = row.product_id or 'unknown product'
+    if row.level == 'channel_product':
+        return f"{product} on {channel}"
+    if row.level == 'channel':
+        return f"the {channel} channel"
+    return f"product {product}"
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def build_insights(segments: pd.DataFrame, channel_perf: pd.DataFrame, today) -> list:
+    """
+    Rule-based insights and segment anomaly alerts from daily
+    (day, channel, product_id, revenue) rows covering the anomaly window and
+    per-channel revenue. CPU-bound.
+    """
+    insights = []
+
+    # Every segment is scored at once. The latest week ends yesterday: today
+    # is still filling up and would read as a drop against full weeks
+    scores, anomalies = detect_anomalies(
+        segments, today - timedelta(days=1), weeks=ANOMALY_WEEKS, z_threshold=Z_THRESHOLD,
+        top=MAX_SEGMENT_INSIGHTS + 1,
+    )
+
+    # Check for revenue drop
+    total = scores[scores['level'] == 'total'].iloc[0]
+    if total['previous'] > 0:
+        drop_pct = -total['wow']
+        if drop_pct > 0.1:
+            insights.append({
+                "type": "revenue_drop",
+                "description": f"Revenue dropped by {drop_pct:.1%} in the last 7 days "
+                               "compared to the previous week.",
+                "suggested_action": "Check your ad campaigns and lead conversion funnel."
+            })
+
+    # Segment anomalies, largest revenue impact first
+    for row in anomalies[anomalies['level'] != 'total'].head(MAX_SEGMENT_INSIGHTS).itertuples():
+        change = row.impact / row.baseline if row.baseline else math.inf
+        drop = row.impact < 0
+        insights.append({
+            "type": "segment_drop" if drop else "segment_spike",
+            "description": (
+                f"Revenue for {_segment_name(row)} is {'down' if drop else 'up'} {abs(change):.0%} "
+                f"against its weekly average (${row.current:,.2f} in the last 7 days)."
+            ),
+            "suggested_action": (
+                "Check stock, pricing and campaigns for this segment." if drop else
+                "Make sure stock and fulfilment keep up, and find what drove the increase."
+            ),
+            "segment": {
+                "level": row.level,
+                "channel": None if row.channel == ALL else row.channel,
+                "product_id": None if row.product_id == ALL else row.product_id,
+            },
+            "z_score": _number(row.z),
+            "wow_change": _number(row.wow),
+            "revenue": _number(row.current),
+            "baseline": _number(row.baseline),
+        })
+
+    # Check for channel performance
+    if not channel_perf.empty:
+        best_channel = channel_perf.loc[channel_perf['revenue'].idxmax()]
+        insights.append({
+            "type": "best_channel",
+            "description": f"The best performing channel is {best_channel['channel']} "
+                           f"with ${best_channel['revenue']:.2f} in revenue.",
+            "suggested_action": "Consider increasing ad spend on this channel."
+        })
+
+    # Default insight if none generated
+    if not insights:
+        insights.append({
+            "type": "general",
+            "description": "System is running smoothly. No significant anomalies detected.",
+            "suggested_action": "Continue monitoring your daily metrics."
+        })
+
+    return insights
 
 class InsightGenerator:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.kpi_service = KPIService(db)
 
-    def generate_insights(self):
+    @cached_result
+    async def generate_insights(self):
         """
-        Generate rule-based insights based on KPI data.
+        Generate rule-based insights based on KPI data, plus anomaly alerts
+        for every channel, product and channel x product segment.
         """
-        insights = []
-        
-        # Check for revenue drop
-        daily_revenue = self.kpi_service.get_daily_revenue(days=14)
-        if len(daily_revenue) >= 7:
-            last_7_days = daily_revenue.tail(7)['revenue'].sum()
-            prev_7_days = daily_revenue.head(7)['revenue'].sum()
-            
-            if prev_7_days > 0:
-                drop_pct = (prev_7_days - last_7_days) / prev_7_days
-                if drop_pct > 0.1:
-                    insights.append({
-                        "type": "revenue_drop",
-                        "description": f"Revenue dropped by {drop_pct:.1%} in the last 7 days compared to the previous week.",
-                        "suggested_action": "Check your ad campaigns and lead conversion funnel."
-                    })
-        
-        # Check for channel performance
-        channel_perf = self.kpi_service.get_conversion_by_channel()
-        if not channel_perf.empty:
-            best_channel = channel_perf.loc[channel_perf['revenue'].idxmax()]
-            insights.append({
-                "type": "best_channel",
-                "description": f"The best performing channel is {best_channel['channel']} with ${best_channel['revenue']:.2f} in revenue.",
-                "suggested_action": "Consider increasing ad spend on this channel."
-            })
-            
-        # Default insight if none generated
-        if not insights:
-            insights.append({
-                "type": "general",
-                "description": "System is running smoothly. No significant anomalies detected.",
-                "suggested_action": "Continue monitoring your daily metrics."
-            })
-            
-        return insights
+        # One daily (channel x product) query covers every segment
+        segments = await self.kpi_service.get_segment_daily_revenue(days=ANOMALY_DAYS)
+        channel_perf = await self.kpi_service.get_conversion_by_channel()
+        return await run_cpu(build_insights, segments, channel_perf, datetime.utcnow().date())
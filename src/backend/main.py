@@ -1,102 +1,284 @@
-from fastapi import FastAPI, Depends
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.api.caching import check_not_modified, not_modified_response
 from app.api.endpoints import ingest
-from app.services.kpi_service import KPIService
+from app.core.cache import bump_data_version
+from app.core.executor import run_ingest
+from app.services import etl_jobs, export
+from app.services.etl_jobs import job_queue
+from app.services.forecasting import forecast_engine
+from app.services.reports import report_service
+from app.services.dashboard import DashboardService
+from app.services.analytics import DIMENSIONS
+from app.services.kpi_service import KPIService, FORECAST_DIMENSIONS
 from app.insights.generator import InsightGenerator
-from app.models.base import get_db, engine, Base
-from app.etl.flows.main_flow import etl_pipeline
+from app.models.base import (
+    get_async_db, get_db, engine, Base, SessionLocal, add_missing_columns, create_indexes
+)
+from app.etl.loaders import columnar, rollups
+import asyncio
+import json
 import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
+create_indexes(engine)
 
-app = FastAPI(title="OpenSight API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Backfill daily rollups (and the Parquet copy read by the duckdb KPI
+    # backend) for databases loaded before they existed, once per server
+    with SessionLocal() as db:
+        rollups.ensure_backfilled(db)
+        if columnar.enabled():
+            columnar.ensure_backfilled(db)
+    job_queue.start()
+    yield
+
+app = FastAPI(title="OpenSight API", lifespan=lifespan)
 
 # Include routers
 app.include_router(ingest.router, prefix="/api/ingest", tags=["ingestion"])
 
 @app.get("/api/kpis/summary")
-def get_kpi_summary(db: Session = Depends(get_db), days: int = 30):
+async def get_kpi_summary(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db), days: int = 30
+):
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
     kpi_service = KPIService(db)
-    return kpi_service.get_summary_metrics(days=days)
+    return await kpi_service.get_summary_metrics(days=days)
 
 @app.get("/api/kpis/daily")
-def get_daily_revenue(db: Session = Depends(get_db), days: int = 30):
+async def get_daily_revenue(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db), days: int = 30
+):
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
     kpi_service = KPIService(db)
-    df = kpi_service.get_daily_revenue(days=days)
+    df = await kpi_service.get_daily_revenue(days=days)
     return df.to_dict(orient='records')
 
 @app.get("/api/kpis/forecast")
-def get_revenue_forecast(db: Session = Depends(get_db), days: int = 30):
+async def get_revenue_forecast(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db),
+    days: int = 30, by: Optional[str] = None
+):
+    if by is not None and by not in FORECAST_DIMENSIONS:
+        raise HTTPException(400, f"by must be one of {', '.join(FORECAST_DIMENSIONS)}")
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
+    kpi_service = KPIService(db)
+    df = await kpi_service.get_revenue_forecast(forecast_days=days, by=by)
+    return df.to_dict(orient='records')
+
+@app.get("/api/segments")
+async def get_segments(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db),
+    group_by: List[str] = Query(["channel"]), days: int = 30,
+    start: Optional[date] = None, end: Optional[date] = None,
+    channel: List[str] = Query([]), product_id: List[str] = Query([]), status: List[str] = Query([])
+):
+    """
+    Orders and revenue per segment. Repeat group_by (day, channel,
+    product_id, status) and the channel/product_id/status filters to combine
+    them; the period is start..end, or the last `days` days.
+    """
+    unknown = [d for d in group_by if d not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(400, f"group_by must be among {', '.join(DIMENSIONS)}")
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
+    if start is None:
+        start = datetime.utcnow().date() - timedelta(days=days)
     kpi_service = KPIService(db)
-    df = kpi_service.get_revenue_forecast(forecast_days=days)
+    df = await kpi_service.get_segments(
+        tuple(dict.fromkeys(group_by)), start, end,
+        channel=tuple(channel), product_id=tuple(product_id), status=tuple(status),
+    )
     return df.to_dict(orient='records')
 
+@app.get("/api/export")
+def export_sales_events(
+    format: str = "csv", start: Optional[date] = None, end: Optional[date] = None,
+    channel: List[str] = Query([]), product_id: List[str] = Query([]), status: List[str] = Query([])
+):
+    """
+    Stream canonical sales events as CSV, Parquet or XLSX, filtered by
+    date range (inclusive days) and channel/product_id/status values.
+    """
+    if format not in export.FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(export.FORMATS)}")
+    try:
+        export.check_available(format)
+    except RuntimeError as e:
+        raise HTTPException(501, str(e))
+    media_type, extension = export.FORMATS[format]
+    rows = export.stream(format, start=start, end=end, channel=channel, product_id=product_id,
+                         status=status)
+    return StreamingResponse(rows, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="sales_events.{extension}"',
+    })
+
+@app.get("/api/kpis/forecast/stats")
+async def get_forecast_stats():
+    return forecast_engine.stats
+
 @app.get("/api/insights")
-def get_insights(db: Session = Depends(get_db)):
+async def get_insights(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+):
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
     insight_gen = InsightGenerator(db)
-    return insight_gen.generate_insights()
+    return await insight_gen.generate_insights()
 
-@app.post("/api/etl/run")
-def run_etl():
-    etl_pipeline()
-    return {"message": "ETL pipeline executed"}
+@app.get("/api/dashboard")
+async def get_dashboard(
+    request: Request, response: Response, db: AsyncSession = Depends(get_async_db),
+    days: int = 30, forecast_days: int = 30
+):
+    """
+    Every dashboard panel in one round trip, streamed as NDJSON: one
+    {"panel": ..., "data": ...} line per panel (summary, daily, channels,
+    forecast, insights) as soon as it is ready.
+    """
+    if await check_not_modified(request, response, db):
+        return not_modified_response(response)
+    panels = await DashboardService(db).panels(days=days, forecast_days=forecast_days)
 
-@app.post("/api/sample-data")
-def load_sample_data(db: Session = Depends(get_db)):
+    async def lines():
+        async for name, data in panels:
+            yield json.dumps({"panel": name, "data": jsonable_encoder(data)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={
+        key: response.headers[key] for key in ("ETag", "Last-Modified", "Cache-Control")
+    })
+
+@app.post("/api/etl/run", status_code=202)
+def run_etl():
     """
-    Load synthetic sample data for demo purposes.
+    Queue an ETL run and return at once; poll /api/etl/jobs/{job_id}.
+    Triggers arriving while a run is already queued join that run.
     """
+    job_id, coalesced = job_queue.submit(trigger="api")
+    return {"job_id": job_id, "coalesced": coalesced, "status_url": f"/api/etl/jobs/{job_id}"}
+
+@app.get("/api/etl/jobs/{job_id}")
+def get_etl_job(job_id: str, db: Session = Depends(get_db)):
+    job = etl_jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(404, "ETL job not found")
+    return etl_jobs.job_to_dict(job)
+
+def _load_sample_data():
     import pandas as pd
-    from app.models.raw import RawEvent
-    from datetime import datetime, timedelta
-    import random
-    
-    # Clear existing data for demo
-    from app.models.sales_event import SalesEvent
-    db.query(SalesEvent).delete()
-    db.query(RawEvent).delete()
-    
-    # Generate 60 days of data
-    channels = ["Instagram", "WhatsApp", "Web", "Facebook"]
-    products = ["PROD-A", "PROD-B", "PROD-C"]
+    from app.etl import raw_batches
+    from app.models.raw import OrderRowHash, RawEvent, RawEventError
+    from app.etl.synthetic import demo_records
     
-    raw_records = []
-    for i in range(120):
-        days_ago = random.randint(0, 60)
-        timestamp = datetime.utcnow() - timedelta(days=days_ago)
-        amount = random.uniform(50, 500)
+    db = SessionLocal()
+    try:
+        # Clear existing data for demo
+        from app.models.sales_event import SalesEvent
+        from app.models.rollup import DailySalesRollup
+        db.query(DailySalesRollup).delete()
+        db.query(SalesEvent).delete()
+        db.query(RawEvent).delete()
+        db.query(OrderRowHash).delete()
+        db.query(RawEventError).delete()
+        raw_batches.delete_all(db)
+        if columnar.enabled():
+            # The Parquet copy still holds the deleted sales
+            columnar.mark_stale(db)
+        bump_data_version(db)
+        db.commit()
+        if columnar.enabled():
+            columnar.repair(db)
+            # Drop KPIs cached from the old copy while it was rebuilt
+            bump_data_version(db)
+            db.commit()
         
-        record = {
-            "order_id": f"DEMO-{1000+i}",
-            "customer_id": f"CUST-{random.randint(1, 50)}",
-            "product_id": random.choice(products),
-            "amount": amount,
-            "currency": "USD",
-            "channel": random.choice(channels),
-            "status": "completed",
-            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
-        raw_event = RawEvent(
-            source="demo",
-            data=record,
-            status="pending"
-        )
-        db.add(raw_event)
-    
-    db.commit()
-    # Run ETL immediately
-    etl_pipeline()
-    return {"message": "Sample data loaded and processed"}
+        # Generate 60 days of data
+        records = demo_records(n_rows=120, days=60)
+        raw_batches.write_batch(db, [pd.DataFrame(records)], source="demo")
+    finally:
+        db.close()
+
+@app.post("/api/sample-data")
+async def load_sample_data():
+    """
+    Load synthetic sample data for demo purposes.
+    """
+    await run_ingest(_load_sample_data)
+    # Process it in the background like any other ETL trigger
+    job_id, _ = await run_ingest(job_queue.submit, "sample-data")
+    return {"message": "Sample data loaded, processing started", "job_id": job_id}
+
+def _pdf_response(job, pdf: bytes) -> Response:
+    filename = f"opensight_report_{job.days}d.pdf"
+    return Response(pdf, media_type="application/pdf", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "ETag": f'"{job.id}"',
+    })
+
+@app.post("/api/reports", status_code=202)
+async def request_report(
+    response: Response, db: AsyncSession = Depends(get_async_db),
+    client_name: str = "OpenSight Demo", days: int = 30
+):
+    """
+    Start rendering a report in the background, or return the finished or
+    in-progress job for the same client, period and data version.
+    """
+    job = await report_service.request(db, client_name, days)
+    if job.status == 'ready':
+        response.status_code = 200
+    return {**job.to_dict(), "pdf_url": f"/api/reports/{job.id}/pdf"}
+
+@app.get("/api/reports/{report_id}")
+async def get_report(report_id: str):
+    job = report_service.get(report_id)
+    if job is None:
+        raise HTTPException(404, "Report not found")
+    return {**job.to_dict(), "pdf_url": f"/api/reports/{job.id}/pdf"}
+
+@app.get("/api/reports/{report_id}/pdf")
+async def download_report(report_id: str):
+    job = report_service.get(report_id)
+    if job is None:
+        raise HTTPException(404, "Report not found")
+    if job.status == 'failed':
+        raise HTTPException(500, f"Report failed: {job.error}")
+    if job.status != 'ready':
+        return Response(status_code=202, headers={"Retry-After": "1"})
+    pdf = report_service.pdf(report_id)
+    if pdf is None:
+        raise HTTPException(404, "Report expired from the cache, request it again")
+    return _pdf_response(job, pdf)
 
 @app.post("/api/report/generate")
-def generate_report():
-    from report.generate_report import generate_pdf_report
-    report_path = "opensight_report.pdf"
-    generate_pdf_report(report_path)
-    return FileResponse(report_path, media_type="application/pdf", filename="opensight_report.pdf")
+async def generate_report(
+    db: AsyncSession = Depends(get_async_db), client_name: str = "OpenSight Demo", days: int = 30
+):
+    """
+    Request a report and wait for it; returns at once when it is cached.
+    """
+    job = await report_service.request(db, client_name, days)
+    if job.task is not None and not job.task.done():
+        # Shielded: a client disconnect must not cancel a render others may share
+        await asyncio.shield(job.task)
+    pdf = report_service.pdf(job.id)
+    if pdf is None:
+        raise HTTPException(500, f"Report failed: {job.error}")
+    return _pdf_response(job, pdf)
 
 @app.get("/")
 def read_root():
@@ -1,5 +1,6 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
@@ -8,9 +9,80 @@ Base = declarative_base()
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# driver-less URL prefix -> async driver
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+}
+
+
+def async_database_url(url: str) -> str:
+    """
+    Same database as `url` through an async driver (aiosqlite / asyncpg).
+    """
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def add_missing_columns(bind):
+    """
+    Add declared nullable columns missing from existing tables (e.g. the
+    raw_events lease columns); create_all only creates whole tables.
+    Safe to run on every startup.
+    """
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                preparer = conn.dialect.identifier_preparer
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+                )
+
+def create_indexes(bind):
+    """
+    Create declared indexes that are missing; create_all skips the indexes
+    of tables that already exist.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def begin_snapshot(db: AsyncSession):
+    """
+    Make every later read of `db` see one snapshot of the database until the
+    session ends: REPEATABLE READ on PostgreSQL, an explicit BEGIN on SQLite
+    (its driver only opens transactions for writes). Call before the
+    session's first query.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    else:
+        await db.execute(text("BEGIN"))
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,42 @@
+from typing import Iterator, List, Sequence
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Stays well below SQLite's bound-parameter limit for IN (...) lists
+IN_CHUNK_SIZE = 500
+
+
+def chunked(items: Sequence, size: int = IN_CHUNK_SIZE) -> Iterator[List]:
+    """
+    Yield consecutive slices of `items` of at most `size` elements.
+    """
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def upsert(
+    db: Session,
+    table,
+    index_elements: List[str],
+    update_columns: List[str] = None,
+    increment_columns: List[str] = None,
+):
+    """
+    Build an INSERT ... ON CONFLICT statement for the session's dialect.
+    Conflicting rows get `update_columns` overwritten and `increment_columns`
+    added to; with neither, conflicting rows are skipped.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+    set_ = {col: stmt.excluded[col] for col in update_columns or []}
+    set_.update({col: table.c[col] + stmt.excluded[col] for col in increment_columns or []})
+    if not set_:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
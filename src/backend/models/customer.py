@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String
+from .base import Base
+
+class CustomerAlias(Base):
+    """
+    Persistent canonical-name index for fuzzy customer deduplication.
+    """
+    __tablename__ = "customer_aliases"
+
+    name = Column(String, primary_key=True)
+    canonical_name = Column(String, index=True)
+    phonetic_key = Column(String, index=True)
+    prefix_key = Column(String, index=True)
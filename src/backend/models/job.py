@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, JSON, String, Text
+from datetime import datetime
+from .base import Base
+
+class EtlJob(Base):
+    """
+    One queued or executed ETL run. Rows are written by the API process and
+    by the pool process running the job, so status survives either one.
+    """
+    __tablename__ = "etl_jobs"
+
+    id = Column(String, primary_key=True)
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    trigger = Column(String, nullable=True)  # e.g. 'api', 'upload', 'sample-data'
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    progress = Column(JSON, nullable=True)  # running totals, updated per chunk
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    owner = Column(String, nullable=True)  # JobQueue (API process) that queued it
+    heartbeat_at = Column(DateTime, nullable=True)  # refreshed by the owner while queued or running
@@ -1,12 +1,76 @@
-from sqlalchemy import Column, Integer, JSON, DateTime, String
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, JSON, DateTime, String
 from datetime import datetime
 from .base import Base
 
 class RawEvent(Base):
     __tablename__ = "raw_events"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     source = Column(String)  # e.g., 'csv', 'gsheets'
     data = Column(JSON)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    status = Column(String, default="pending")  # pending, processed, failed
+    status = Column(String, default="pending", index=True)  # pending, processed, failed
+    claimed_by = Column(String, nullable=True)  # ETL worker holding the lease
+    lease_until = Column(DateTime, nullable=True)  # claim expires after this time
+
+
+class RawBatch(Base):
+    """
+    One staged upload, kept as a single compressed Arrow IPC file under
+    RAW_BATCH_DIR instead of one raw_events row per record.
+    """
+    __tablename__ = "raw_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String)  # upload filename, 'demo', ...
+    path = Column(String)  # file name relative to RAW_BATCH_DIR
+    rows = Column(Integer)
+    # sha256 of file + mapping; repeat uploads are skipped
+    content_hash = Column(String, unique=True, nullable=True)
+    # Format of the timestamp column, inferred from every row when staged
+    timestamp_format = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+
+class RawBatchRange(Base):
+    """
+    Status of the rows [start, stop) of a raw batch. A batch starts as one
+    pending range; ETL claims split it into chunks, and loading splits a
+    chunk into runs of processed and failed rows.
+    """
+    __tablename__ = "raw_batch_ranges"
+    __table_args__ = (
+        Index("ix_raw_batch_ranges_batch_start", "batch_id", "start"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey("raw_batches.id"), nullable=False)
+    start = Column(Integer, nullable=False)
+    stop = Column(Integer, nullable=False)
+    status = Column(String, default="pending", index=True)  # pending, processed, failed
+    claimed_by = Column(String, nullable=True)  # ETL worker holding the lease
+    lease_until = Column(DateTime, nullable=True)  # claim expires after this time
+
+
+class OrderRowHash(Base):
+    """
+    Hash of the normalised raw row last loaded for each order. Staging
+    drops rows whose order already has that hash, so unchanged rows of
+    repeat or cumulative uploads are never staged again.
+    """
+    __tablename__ = "order_row_hashes"
+
+    order_id = Column(String, primary_key=True)
+    row_hash = Column(BigInteger, nullable=False)
+
+
+class RawEventError(Base):
+    """
+    Validation error code of a rejected raw row: a bitmask of the schema
+    checks it failed (see etl.processors.validation.describe). Keyed by
+    raw_event_id as the ETL sees it, so rows of raw batches are covered too.
+    """
+    __tablename__ = "raw_event_errors"
+
+    raw_event_id = Column(BigInteger, primary_key=True)
+    error_codes = Column(BigInteger, nullable=False)
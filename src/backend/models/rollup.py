@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Date, Float, Index, Integer, String
+from .base import Base
+
+class DailySalesRollup(Base):
+    """
+    Pre-aggregated sales_events at (day, channel, product_id, status) grain,
+    maintained incrementally by the ETL load step. Null channel/product ids
+    are stored as '' so they can be part of the primary key.
+    """
+    __tablename__ = "daily_sales_rollups"
+    __table_args__ = (
+        # Segment queries filter by status and a day range (the primary key
+        # leads with day), or slice one product across days
+        Index("ix_daily_sales_rollups_status_day", "status", "day", "channel", "product_id"),
+        Index("ix_daily_sales_rollups_product_status_day", "product_id", "status", "day"),
+    )
+
+    day = Column(Date, primary_key=True)
+    channel = Column(String, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    order_count = Column(Integer, default=0)
+    amount = Column(Float, default=0.0)  # sum of amount in original currencies
+    net_amount = Column(Float, default=0.0)  # sum of net_amount (revenue)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, Float, String, DateTime, ForeignKey
 from datetime import datetime
 from .base import Base
 
@@ -16,3 +16,5 @@ class SalesEvent(Base):
     status = Column(String)  # completed, pending, cancelled
     timestamp_utc = Column(DateTime, default=datetime.utcnow)
     raw_event_id = Column(Integer, ForeignKey("raw_events.id"))
+    # Source row in a raw batch (see etl.raw_batches.refs)
+    raw_batch_ref = Column(BigInteger, nullable=True)
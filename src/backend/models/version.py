@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from datetime import datetime
+from .base import Base
+
+class DataVersion(Base):
+    """
+    Counter bumped whenever the ETL commits new canonical data; cached
+    KPI/insight results and HTTP validators are derived from it.
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,144 @@
+import glob
+import os
+from datetime import date
+from typing import Dict, Optional, Sequence
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.executor import run_cpu
+from app.etl.loaders import columnar
+from app.models.rollup import DailySalesRollup
+try:
+    import duckdb
+except ImportError:
+    # Only needed for KPI_BACKEND=duckdb
+    duckdb = None
+
+# Columns KPI queries can group and filter by
+DIMENSIONS = ('day', 'channel', 'product_id', 'status')
+
+
+def _check_dimensions(columns: Sequence[str]):
+    unknown = [c for c in columns if c not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s) {unknown}, expected one of {DIMENSIONS}")
+
+
+class SQLAnalytics:
+    """
+    Aggregates over the daily rollup table in the system-of-record database.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def aggregate(self, group_by: Sequence[str] = (), start: Optional[date] = None,
+                        end: Optional[date] = None,
+                        filters: Optional[Dict[str, Sequence]] = None) -> pd.DataFrame:
+        """
+        Order counts and net revenue grouped by `group_by`, for days in
+        [start, end] and rows whose dimension values are in `filters`.
+        Returns a frame of the group columns plus `orders` and `revenue`.
+        """
+        filters = filters or {}
+        _check_dimensions([*group_by, *filters])
+        columns = [getattr(DailySalesRollup, c) for c in group_by]
+        stmt = select(
+            *columns,
+            func.sum(DailySalesRollup.order_count).label('orders'),
+            func.sum(DailySalesRollup.net_amount).label('revenue'),
+        )
+        if start is not None:
+            stmt = stmt.where(DailySalesRollup.day >= start)
+        if end is not None:
+            stmt = stmt.where(DailySalesRollup.day <= end)
+        for column, values in filters.items():
+            stmt = stmt.where(getattr(DailySalesRollup, column).in_(list(values)))
+        if columns:
+            stmt = stmt.group_by(*columns).order_by(*columns)
+        rows = (await self.db.execute(stmt)).all()
+        return pd.DataFrame(rows, columns=[*group_by, 'orders', 'revenue'])
+
+
+class DuckDBAnalytics:
+    """
+    The same aggregates over the date-partitioned Parquet copy of
+    sales_events, queried with an embedded DuckDB. Filters on `day` prune
+    whole partitions, so a 30-day KPI reads 30 directories whatever the
+    history length. Each row carries a sign (+1 new version, -1 replaced
+    version), so sums stay exact across updates without rewriting files.
+    """
+    def __init__(self, path: str):
+        if duckdb is None:
+            raise RuntimeError("KPI_BACKEND=duckdb requires the duckdb package")
+        self.path = path
+
+    async def aggregate(self, group_by: Sequence[str] = (), start: Optional[date] = None,
+                        end: Optional[date] = None,
+                        filters: Optional[Dict[str, Sequence]] = None) -> pd.DataFrame:
+        filters = filters or {}
+        _check_dimensions([*group_by, *filters])
+        return await run_cpu(self._aggregate, list(group_by), start, end, filters)
+
+    def _aggregate(self, group_by, start, end, filters) -> pd.DataFrame:
+        if not os.path.lexists(self.path):
+            # Not built yet, or a rebuild is moving an old copy aside
+            with columnar.locked(self.path):
+                pass
+        # Query the copy `path` points at now; if a rebuild swaps it and
+        # removes the files mid-query, query the new copy
+        copy = os.path.realpath(self.path)
+        try:
+            return self._query(copy, group_by, start, end, filters)
+        except duckdb.IOException:
+            if os.path.realpath(self.path) == copy:
+                raise
+            return self._query(os.path.realpath(self.path), group_by, start, end, filters)
+
+    def _query(self, copy, group_by, start, end, filters) -> pd.DataFrame:
+        columns = [*group_by, 'orders', 'revenue']
+        pattern = os.path.join(copy, 'day=*', '*.parquet')
+        if not glob.glob(pattern):
+            return pd.DataFrame(columns=columns)
+
+        where, params = [], {'files': pattern}
+        if start is not None:
+            where.append("day >= $start")
+            params['start'] = start
+        if end is not None:
+            where.append("day <= $end")
+            params['end'] = end
+        for column, values in filters.items():
+            names = []
+            for i, value in enumerate(values):
+                params[f"{column}_{i}"] = value
+                names.append(f"${column}_{i}")
+            where.append(f"{column} IN ({', '.join(names)})" if names else "FALSE")
+
+        keys = ', '.join(group_by)
+        sql = (
+            f"SELECT {keys + ', ' if keys else ''}"
+            "CAST(SUM(sign) AS BIGINT) AS orders, SUM(sign * net_amount) AS revenue "
+            "FROM read_parquet($files, hive_partitioning = true, hive_types = {'day': DATE})"
+            + (f" WHERE {' AND '.join(where)}" if where else '')
+            # Groups whose orders were all retracted sum to 0 orders; the
+            # rollups delete such rows, so leave them out here too
+            + (f" GROUP BY {keys} HAVING SUM(sign) > 0 ORDER BY {keys}" if keys else '')
+        )
+        con = duckdb.connect()
+        try:
+            df = con.execute(sql, params).df()
+        finally:
+            con.close()
+        if 'day' in df.columns:
+            df['day'] = pd.to_datetime(df['day']).dt.date
+        return df[columns]
+
+
+def get_analytics(db: AsyncSession):
+    """
+    Backend selected by KPI_BACKEND; the SQL rollups are the default.
+    """
+    if settings.KPI_BACKEND == 'duckdb':
+        return DuckDBAnalytics(settings.PARQUET_PATH)
+    return SQLAnalytics(db)
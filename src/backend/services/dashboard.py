@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Tuple
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import get_data_version_async
+from app.core.executor import run_cpu
+from app.insights.generator import ANOMALY_DAYS, build_insights
+from app.services.kpi_service import (
+    FORECAST_HISTORY_DAYS, KPIService, forecast_total, summary_metrics
+)
+
+
+def _records(df: pd.DataFrame) -> list:
+    return df.to_dict(orient='records')
+
+
+def overview(segments: pd.DataFrame, today: date, days: int) -> dict:
+    """
+    Summary metrics, the daily revenue series and the channel breakdown for
+    the last `days` days, all from the shared (day, channel, product_id)
+    frame.
+    """
+    start_date = today - timedelta(days=days)
+    daily = segments.groupby('day', as_index=False)[['orders', 'revenue']].sum()
+    in_period = segments[segments['day'] >= start_date]
+    channels = in_period.groupby('channel', as_index=False)[['orders', 'revenue']].sum()
+    return {
+        'summary': summary_metrics(daily, start_date, start_date - timedelta(days=days)),
+        'daily': _records(daily.loc[daily['day'] >= start_date, ['day', 'revenue']]),
+        'channels': _records(channels.sort_values('revenue', ascending=False)),
+    }
+
+
+def forecast(segments: pd.DataFrame, today: date, forecast_days: int, version: int) -> list:
+    daily = segments[segments['day'] >= today - timedelta(days=FORECAST_HISTORY_DAYS)]
+    daily = daily.groupby('day', as_index=False)['revenue'].sum()
+    return _records(forecast_total(daily, forecast_days, version=version))
+
+
+def insights(segments: pd.DataFrame, channel_perf: pd.DataFrame, today: date) -> list:
+    recent = segments[segments['day'] > today - timedelta(days=ANOMALY_DAYS)]
+    return build_insights(recent, channel_perf, today)
+
+
+class DashboardService:
+    """
+    Every dashboard panel from one shared read of daily completed revenue per
+    (channel, product), covering the longest window any panel needs. The
+    queries run first, on the one session; the panels are then computed
+    concurrently on the CPU executor and handed out as each one finishes.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.kpi_service = KPIService(db)
+
+    async def panels(self, days: int = 30,
+                     forecast_days: int = 30) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Run the queries for the `days`-day period and return an async iterator
+        of (panel name, JSON-ready data) pairs that yields each panel as it
+        becomes ready. The iterator no longer needs the session, so it can
+        be streamed after the request's session is closed.
+        """
+        today = datetime.utcnow().date()
+        history_days = max(2 * days, FORECAST_HISTORY_DAYS, ANOMALY_DAYS) + 1
+        # Cached per data version, like every KPI query
+        segments = await self.kpi_service.get_segment_daily_revenue(days=history_days)
+        channel_perf = await self.kpi_service.get_conversion_by_channel(days=days)
+        version, _ = await get_data_version_async(self.db)
+        return _compute(segments, channel_perf, version, today, days, forecast_days)
+
+
+async def _compute(segments, channel_perf, version, today, days, forecast_days):
+    async def panel(name, fn, *args):
+        return name, await run_cpu(fn, *args)
+
+    pending = [
+        panel('overview', overview, segments, today, days),
+        panel('forecast', forecast, segments, today, forecast_days, version),
+        panel('insights', insights, segments, channel_perf, today),
+    ]
+    for next_done in asyncio.as_completed(pending):
+        name, data = await next_done
+        if name == 'overview':
+            for part in ('summary', 'daily', 'channels'):
+                yield part, data[part]
+        else:
+            yield name, data
@@ -0,0 +1,224 @@
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.base import SessionLocal
+from app.models.job import EtlJob
+
+logger = logging.getLogger(__name__)
+
+# Report keys copied into job progress/result; lists are reduced to counts
+SUMMARY_KEYS = ('chunks', 'inserted', 'updated', 'failed')
+
+
+def summarise(report: Optional[dict]) -> dict:
+    report = report or {}
+    summary = {key: report[key] for key in SUMMARY_KEYS if key in report}
+    for key in ('conflicts', 'errors'):
+        if key in report:
+            summary[key] = len(report[key])
+    if 'error' in report:
+        summary['error'] = report['error']
+    return summary
+
+
+def job_to_dict(job: EtlJob) -> dict:
+    return {
+        'id': job.id,
+        'status': job.status,
+        'trigger': job.trigger,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'progress': job.progress,
+        'result': job.result,
+        'error': job.error,
+    }
+
+
+def get_job(db: Session, job_id: str) -> Optional[EtlJob]:
+    return db.get(EtlJob, job_id)
+
+
+def update_job(job_id: str, **fields):
+    db = SessionLocal()
+    try:
+        db.query(EtlJob).filter(EtlJob.id == job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def record_progress(job_id: str, report: dict):
+    update_job(job_id, progress=summarise(report))
+
+
+def run_job(job_id: str):
+    """
+    Body of one job, executed in a pool process.
+    """
+    # Imported here so the API process does not pay for Prefect until needed
+    from app.etl.flows.main_flow import etl_pipeline
+
+    update_job(job_id, status='running', started_at=datetime.utcnow())
+    try:
+        report = etl_pipeline(job_id=job_id) or {}
+    except Exception as e:
+        update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        return
+    status = 'failed' if 'error' in report else 'succeeded'
+    update_job(job_id, status=status, result=summarise(report), progress=summarise(report),
+               error=report.get('error'), finished_at=datetime.utcnow())
+
+
+ACTIVE = ('queued', 'running')
+
+
+class JobQueue:
+    """
+    Runs ETL jobs one at a time in a local worker process, with single-flight
+    coalescing: while a run is active at most one job waits behind it, and
+    further triggers join that pending job instead of queueing more runs.
+    The pending run claims whatever raw events are pending when it starts,
+    so it covers every upload that triggered it.
+
+    Jobs carry the queue's owner id and a heartbeat, so API processes
+    sharing the database only fail each other's jobs once the owner has
+    stopped beating for ETL_JOB_LEASE_SECONDS.
+    """
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or uuid.uuid4().hex
+        self._pool = None
+        self._heartbeat: Optional[threading.Thread] = None
+        # Re-entrant: a done callback can run inline in _start
+        self._lock = threading.RLock()
+        self._active: Optional[str] = None
+        self._pending: Optional[str] = None
+
+    def submit(self, trigger: str = 'api') -> Tuple[str, bool]:
+        """
+        Queue an ETL run. Returns (job_id, coalesced) where coalesced means
+        the trigger joined an already pending job.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return self._pending, True
+            job_id = uuid.uuid4().hex
+            db = SessionLocal()
+            try:
+                db.add(EtlJob(id=job_id, status='queued', trigger=trigger,
+                              owner=self.owner, heartbeat_at=datetime.utcnow()))
+                db.commit()
+            finally:
+                db.close()
+            if self._active is None:
+                self._start(job_id)
+            else:
+                self._pending = job_id
+            return job_id, False
+
+    def recover(self) -> Optional[str]:
+        """
+        Fail the queued or running jobs of other API processes whose
+        heartbeat expired (their worker died with them) and queue one run in
+        their place, which picks up the raw events they would have loaded
+        once the leases expire. Returns the new job id, if any.
+        """
+        expired = datetime.utcnow() - timedelta(seconds=settings.ETL_JOB_LEASE_SECONDS)
+        db = SessionLocal()
+        try:
+            orphaned = db.query(EtlJob).filter(
+                EtlJob.status.in_(ACTIVE),
+                EtlJob.owner.is_distinct_from(self.owner),
+                func.coalesce(EtlJob.heartbeat_at, EtlJob.created_at) < expired,
+            ).update(
+                {'status': 'failed', 'error': 'Interrupted: its API process stopped',
+                 'finished_at': datetime.utcnow()},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+        if not orphaned:
+            return None
+        return self.submit(trigger='recovery')[0]
+
+    def heartbeat(self):
+        """
+        Mark this queue's queued and running jobs alive.
+        """
+        db = SessionLocal()
+        try:
+            db.query(EtlJob).filter(EtlJob.owner == self.owner, EtlJob.status.in_(ACTIVE)).update(
+                {'heartbeat_at': datetime.utcnow()}, synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def start(self):
+        """
+        Recover orphaned jobs and keep doing so in a background thread that
+        also beats for this queue's jobs. Call once at startup.
+        """
+        self.recover()
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="etl-job-heartbeat",
+                                                   daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(settings.ETL_JOB_LEASE_SECONDS / 4)
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception as e:
+                logger.warning("ETL job heartbeat failed: %s", e)
+
+    def _start(self, job_id: str):
+        # Caller holds the lock
+        self._active = job_id
+        try:
+            future = self._get_pool().submit(run_job, job_id)
+        except Exception as e:
+            self._pool = None
+            self._active = None
+            update_job(job_id, status='failed', error=f"Could not start job: {e!r}",
+                       finished_at=datetime.utcnow())
+            return
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+
+    def _finished(self, job_id: str, future):
+        error = future.exception()
+        if error is not None:
+            # The pool process died (or the job could not be sent); start a new pool next time
+            update_job(job_id, status='failed', error=f"Job process failed: {error!r}",
+                       finished_at=datetime.utcnow())
+        with self._lock:
+            if error is not None and self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            self._active = None
+            if self._pending is not None:
+                job_id, self._pending = self._pending, None
+                self._start(job_id)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: never fork the threads of a running API server
+            self._pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+
+job_queue = JobQueue()
@@ -0,0 +1,194 @@
+import atexit
+import logging
+import threading
+import time
+from typing import List, Optional
+import pandas as pd
+from app.core.config import settings
+from app.etl import raw_batches
+from app.models.base import SessionLocal
+from app.services.etl_jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# raw_batches.source of pushed events; the ETL compacts these batches
+SOURCE = "events"
+
+
+class BufferFull(Exception):
+    pass
+
+
+def write_events(records: List[dict]):
+    """
+    Persist one micro-batch as a raw batch, like an upload of its own.
+    """
+    db = SessionLocal()
+    try:
+        raw_batches.write_batch(db, [pd.DataFrame.from_records(records)], source=SOURCE)
+    finally:
+        db.close()
+
+
+class MicroBatcher:
+    """
+    Buffers pushed events in memory and writes them to raw batches from a
+    background thread, when `batch_size` events are waiting or the oldest
+    has waited `max_wait` seconds. The buffer holds at most `capacity`
+    events: callers wait for room (backpressure) and get BufferFull when
+    none frees up in time. A failed write is retried with the events kept
+    at the head of the buffer, so a database outage turns into
+    backpressure instead of data loss. When `run_etl` is set, written
+    events queue an ETL run, at most one per `etl_interval` seconds: each
+    run publishes a new data version, so a steady stream must not start
+    one per flush. Events written in between wait for the next run.
+    """
+    def __init__(self, batch_size: int, max_wait: float, capacity: int,
+                 run_etl: bool = True, retry_seconds: float = 1.0, etl_interval: float = 0.0):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.capacity = capacity
+        self.run_etl = run_etl
+        self.retry_seconds = retry_seconds
+        self.etl_interval = etl_interval
+        self._buffer: List[dict] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._etl_owed = False
+        self._last_etl = float('-inf')
+        self._stats = {'accepted': 0, 'flushed': 0, 'batches': 0, 'failed_writes': 0,
+                       'last_error': None}
+
+    def offer(self, records: List[dict]) -> bool:
+        """
+        Add all `records` if they fit, without waiting; False otherwise.
+        """
+        with self._cond:
+            return self._add(records)
+
+    def put(self, records: List[dict], timeout: float):
+        """
+        Add all `records`, waiting up to `timeout` seconds for room.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._add(records):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BufferFull(f"{len(self._buffer)} events waiting to be written")
+                self._cond.wait(remaining)
+
+    def _add(self, records: List[dict]) -> bool:
+        # Caller holds the lock; a batch larger than the buffer is let in
+        # when the buffer is empty so it cannot wait forever
+        if self._closed:
+            raise RuntimeError("Event ingestion is shutting down")
+        if self._buffer and len(self._buffer) + len(records) > self.capacity:
+            return False
+        if not self._buffer:
+            self._oldest = time.monotonic()
+        self._buffer.extend(records)
+        self._stats['accepted'] += len(records)
+        self._start()
+        self._cond.notify_all()
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, 'buffered': len(self._buffer), 'capacity': self.capacity}
+
+    def close(self):
+        """
+        Write whatever is buffered and stop the background thread.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _start(self):
+        # Caller holds the lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-batcher", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _next_batch(self) -> Optional[List[dict]]:
+        # An empty list when no batch is due but an owed ETL run is
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = None
+                if self._buffer:
+                    due = self._oldest + self.max_wait - now
+                    if self._closed or len(self._buffer) >= self.batch_size or due <= 0:
+                        break
+                elif self._closed:
+                    return None
+                etl_due = self._last_etl + self.etl_interval - now if self._etl_owed else None
+                if etl_due is not None and etl_due <= 0:
+                    return []
+                waits = [d for d in (due, etl_due) if d is not None]
+                self._cond.wait(min(waits) if waits else None)
+            records = self._buffer[:self.batch_size]
+            del self._buffer[:self.batch_size]
+            self._oldest = time.monotonic() if self._buffer else None
+            # Room freed: wake producers waiting in put()
+            self._cond.notify_all()
+            return records
+
+    def _run(self):
+        while True:
+            records = self._next_batch()
+            if records is None:
+                # Shutting down: the last events do not wait for the interval
+                self._queue_etl(wait=False)
+                return
+            if not records:
+                self._queue_etl()
+                continue
+            try:
+                write_events(records)
+            except Exception as e:
+                with self._cond:
+                    self._stats['failed_writes'] += 1
+                    self._stats['last_error'] = str(e)
+                    if self._closed:
+                        logger.error("Dropping %s events on shutdown: %s",
+                                     len(records) + len(self._buffer), e)
+                        return
+                    self._buffer[:0] = records
+                    self._oldest = time.monotonic() - self.max_wait
+                logger.warning("Could not write %s events, retrying: %s", len(records), e)
+                time.sleep(self.retry_seconds)
+                continue
+            with self._cond:
+                self._stats['flushed'] += len(records)
+                self._stats['batches'] += 1
+                self._etl_owed = self.run_etl
+            self._queue_etl()
+
+    def _queue_etl(self, wait: bool = True):
+        with self._cond:
+            too_soon = wait and time.monotonic() < self._last_etl + self.etl_interval
+            if not self._etl_owed or too_soon:
+                return
+            self._etl_owed = False
+            self._last_etl = time.monotonic()
+        try:
+            job_queue.submit(trigger="events")
+        except Exception as e:
+            logger.warning("Could not queue ETL after writing events: %s", e)
+
+
+event_batcher = MicroBatcher(
+    batch_size=settings.EVENT_BATCH_SIZE,
+    max_wait=settings.EVENT_FLUSH_SECONDS,
+    capacity=settings.EVENT_BUFFER_SIZE,
+    run_etl=settings.EVENT_RUN_ETL,
+    etl_interval=settings.EVENT_ETL_SECONDS,
+)
@@ -0,0 +1,177 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Sequence
+from sqlalchemy import select
+from app.models.base import SessionLocal
+from app.models.sales_event import SalesEvent
+
+EXPORT_COLUMNS = ['order_id', 'customer_id', 'product_id', 'amount', 'currency',
+                  'net_amount', 'channel', 'status', 'timestamp_utc']
+# Rows fetched per round trip from the server-side cursor; also the
+# Parquet row group size
+FETCH_SIZE = 50000
+# Excel's sheet limit is 1,048,576 rows including the header
+XLSX_SHEET_ROWS = 1048575
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# format -> (media type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def check_available(fmt: str):
+    """
+    Raise RuntimeError when the optional writer for `fmt` is not installed,
+    before a response is started.
+    """
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(f"Parquet export requires pyarrow ({e})")
+    elif fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(f"Excel export requires openpyxl ({e})")
+
+
+def iter_batches(start: Optional[date] = None, end: Optional[date] = None,
+                 channel: Sequence[str] = (), product_id: Sequence[str] = (),
+                 status: Sequence[str] = (), batch_size: int = FETCH_SIZE) -> Iterator[List[tuple]]:
+    """
+    Canonical sales events matching the filters, in id order, as lists of
+    row tuples. Rows come from a server-side cursor (yield_per), so at most
+    one batch is held in memory. The session lives as long as the iterator.
+    """
+    query = select(*[getattr(SalesEvent, c) for c in EXPORT_COLUMNS])
+    if start is not None:
+        query = query.where(SalesEvent.timestamp_utc >= start)
+    if end is not None:
+        query = query.where(SalesEvent.timestamp_utc < end + timedelta(days=1))
+    for column, values in (('channel', channel), ('product_id', product_id), ('status', status)):
+        if values:
+            query = query.where(getattr(SalesEvent, column).in_(list(values)))
+    query = query.order_by(SalesEvent.id).execution_options(yield_per=batch_size)
+
+    db = SessionLocal()
+    try:
+        for partition in db.execute(query).partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        db.close()
+
+
+def stream_csv(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only file object that hands written bytes back to the caller.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_parquet(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    One Parquet row group per batch, sent as soon as it is written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('order_id', pa.string()), ('customer_id', pa.string()), ('product_id', pa.string()),
+        ('amount', pa.float64()), ('currency', pa.string()), ('net_amount', pa.float64()),
+        ('channel', pa.string()), ('status', pa.string()), ('timestamp_utc', pa.timestamp('us')),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_xlsx(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    Write rows with openpyxl's write-only workbook, which spools each sheet
+    to a temp file instead of keeping cells in memory, and send the file
+    when it is complete (a zip cannot be sent before it is finished).
+    Rows beyond Excel's sheet limit continue on a new sheet.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, sheets = None, XLSX_SHEET_ROWS, 0
+    for rows in batches:
+        for row in rows:
+            if sheet_rows == XLSX_SHEET_ROWS:
+                sheets += 1
+                title = f"sales_events_{sheets}" if sheets > 1 else "sales_events"
+                sheet = workbook.create_sheet(title)
+                sheet.append(EXPORT_COLUMNS)
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("sales_events").append(EXPORT_COLUMNS)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+WRITERS = {'csv': stream_csv, 'parquet': stream_parquet, 'xlsx': stream_xlsx}
+
+
+def stream(fmt: str, **filters) -> Iterator[bytes]:
+    return WRITERS[fmt](iter_batches(**filters))
@@ -0,0 +1,222 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Hashable, Optional
+import numpy as np
+import pandas as pd
+from app.core.cache import LRUCache
+from app.core.config import settings
+try:
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+except ImportError:
+    ExponentialSmoothing = None
+
+logger = logging.getLogger(__name__)
+
+SEASONAL_PERIODS = 7
+# Smoothing constants for the vectorized model (statsmodels optimises its own)
+ALPHA = 0.3
+GAMMA = 0.1
+
+
+class SeasonalState:
+    """
+    End state of an additive seasonal exponential smoothing model; forecasts
+    any horizon without refitting.
+    """
+    def __init__(self, level: float, season: np.ndarray, n_obs: int):
+        self.level = level
+        self.season = season
+        self.n_obs = n_obs
+
+    def forecast(self, steps: int) -> np.ndarray:
+        idx = (self.n_obs + np.arange(steps)) % len(self.season)
+        return self.level + self.season[idx]
+
+
+def fit_seasonal_matrix(matrix: np.ndarray, period: int = SEASONAL_PERIODS,
+                        alpha: float = ALPHA, gamma: float = GAMMA):
+    """
+    Fit additive seasonal exponential smoothing to every row of a
+    (series x days) matrix at once. Returns (level, season) arrays where
+    season[:, k] is the seasonal term for day index k mod period.
+    """
+    n_series, n_obs = matrix.shape
+    level = matrix[:, :period].mean(axis=1)
+    season = matrix[:, :period] - level[:, None]
+    for t in range(period, n_obs):
+        k = t % period
+        y = matrix[:, t]
+        prev_level = level
+        level = alpha * (y - season[:, k]) + (1 - alpha) * prev_level
+        season[:, k] = gamma * (y - level) + (1 - gamma) * season[:, k]
+    return level, season
+
+
+def _fit_statsmodels(values: np.ndarray):
+    start = time.perf_counter()
+    model = ExponentialSmoothing(values, seasonal='add', seasonal_periods=SEASONAL_PERIODS).fit()
+    return model, time.perf_counter() - start
+
+
+class ForecastEngine:
+    """
+    Fits and caches daily revenue forecast models for many series at once.
+
+    Fitted models are kept per (series key, data version, series window) and
+    reused until the ETL bumps the data version. Long series are fitted with
+    statsmodels Holt-Winters, in a process pool when there are several;
+    short series (or all series when statsmodels is missing) use a NumPy
+    implementation that smooths every series in one vectorized pass.
+    """
+    def __init__(self, workers: int = None, vectorized_max_days: int = None,
+                 cache_size: int = 1024):
+        self.workers = workers if workers is not None else settings.FORECAST_WORKERS
+        self.vectorized_max_days = (
+            vectorized_max_days if vectorized_max_days is not None
+            else settings.FORECAST_VECTORIZED_MAX_DAYS
+        )
+        self.models = LRUCache(cache_size)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'fits': 0,
+            'cache_hits': 0,
+            'failures': 0,
+            'vectorized_fits': 0,
+            'statsmodels_fits': 0,
+            'fit_seconds_total': 0.0,
+            'last_fit_seconds': 0.0,
+            'last_error': None,
+        }
+
+    def forecast_many(self, series: Dict[Hashable, pd.Series], horizon: int,
+                      version: Optional[int] = None) -> pd.DataFrame:
+        """
+        Forecast `horizon` days for each daily series (indexed by day).
+        Returns one long frame with columns series, day, revenue.
+        Every series is zero-filled up to the last day of any series, so a
+        segment without recent sales is forecast from those zero days and
+        over the same days as the others. Series shorter than one season
+        are skipped.
+        """
+        ends = [s.index[-1] for s in series.values() if len(s)]
+        end = max(ends) if ends else None
+        prepared, models, to_fit = {}, {}, {}
+        for key, s in series.items():
+            s = s.astype('float64')
+            if len(s) and (end - s.index[0]).days + 1 != len(s):
+                s = s.reindex(pd.date_range(s.index[0], end, freq='D')).fillna(0)
+            if len(s) < SEASONAL_PERIODS:
+                continue
+            prepared[key] = s
+            cache_key = (key, version, s.index[0], s.index[-1], len(s))
+            model = self.models.get(cache_key)
+            if model is None:
+                to_fit[key] = cache_key
+            else:
+                models[key] = model
+                self._count('cache_hits')
+
+        if to_fit:
+            start = time.perf_counter()
+            fitted = self._fit({key: prepared[key] for key in to_fit})
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stats['last_fit_seconds'] = elapsed
+                self.stats['fit_seconds_total'] += elapsed
+            for key, model in fitted.items():
+                self.models.set(to_fit[key], model)
+                models[key] = model
+
+        keys, days, values = [], [], []
+        if models:
+            forecast_days = pd.date_range(end + pd.Timedelta(days=1), periods=horizon,
+                                          freq='D').to_numpy()
+        for key, model in models.items():
+            keys.append(np.full(horizon, key, dtype=object))
+            days.append(forecast_days)
+            values.append(np.asarray(model.forecast(horizon), dtype='float64'))
+        if not keys:
+            return pd.DataFrame(columns=['series', 'day', 'revenue'])
+        return pd.DataFrame({
+            'series': np.concatenate(keys),
+            'day': np.concatenate(days),
+            'revenue': np.concatenate(values),
+        })
+
+    def _fit(self, series: Dict[Hashable, pd.Series]) -> dict:
+        use_statsmodels = ExponentialSmoothing is not None
+        long_keys = [k for k, s in series.items()
+                     if use_statsmodels and len(s) > self.vectorized_max_days]
+        short_keys = [k for k in series if k not in long_keys]
+
+        fitted = {}
+        failed = []
+        if long_keys:
+            results = self._map(_fit_statsmodels, [series[k].to_numpy() for k in long_keys])
+            for key, result in zip(long_keys, results):
+                if isinstance(result, Exception):
+                    logger.warning("Forecasting error for %s: %s", key, result)
+                    with self._lock:
+                        self.stats['failures'] += 1
+                        self.stats['last_error'] = str(result)
+                    failed.append(key)
+                else:
+                    fitted[key] = result[0]
+                    self._count('statsmodels_fits')
+
+        # Short series, and any statsmodels failure, go through the vectorized model
+        short_keys += failed
+        for length in {len(series[k]) for k in short_keys}:
+            keys = [k for k in short_keys if len(series[k]) == length]
+            matrix = np.vstack([series[k].to_numpy() for k in keys])
+            level, season = fit_seasonal_matrix(matrix)
+            for i, key in enumerate(keys):
+                fitted[key] = SeasonalState(level[i], season[i].copy(), length)
+            self._count('vectorized_fits', len(keys))
+
+        self._count('fits', len(fitted))
+        return fitted
+
+    def _map(self, fn, items):
+        """
+        Run fn over items, in the process pool when there is more than one.
+        Exceptions are returned in place of results.
+        """
+        if len(items) == 1 or self.workers <= 1:
+            return [_safe_call(fn, item) for item in items]
+        pool = self._get_pool()
+        futures = [pool.submit(fn, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: never fork the threads of a running API server
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+
+def _safe_call(fn, item):
+    try:
+        return fn(item)
+    except Exception as e:
+        return e
+
+
+forecast_engine = ForecastEngine()
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import json
+import pandas as pd
+from typing import Callable, Iterator, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.etl import raw_batches
+from app.models.raw import RawBatch
+
+ProgressCallback = Callable[[dict], None]
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def read_upload_chunks(fileobj, filename: str, chunk_size: int,
+                       encoding: Optional[str] = None,
+                       delimiter: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield DataFrame chunks of at most `chunk_size` rows from an uploaded file.
+    CSV is parsed incrementally from the file object (UTF-8 and ',' unless
+    the preview detected otherwise) and kept as text, so every chunk has the
+    same column types; Excel has no streaming reader, so the sheet is
+    loaded once and sliced.
+    """
+    if filename.endswith('.csv'):
+        text = io.TextIOWrapper(fileobj, encoding=encoding or 'utf-8', newline='')
+        try:
+            yield from pd.read_csv(text, chunksize=chunk_size, sep=delimiter or ',', dtype=str)
+        finally:
+            # Leave the underlying upload open, the framework closes it
+            text.detach()
+    elif filename.endswith(('.xls', '.xlsx')):
+        df = pd.read_excel(fileobj)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError("Only CSV or Excel files allowed")
+
+
+def apply_mapping(df: pd.DataFrame, mapping: Optional[dict]) -> pd.DataFrame:
+    """
+    Rename source columns to OpenSight fields.
+    mapping format: {"target_field": "source_column"}
+    """
+    if not mapping:
+        return df
+    inv_map = {v: k for k, v in mapping.items()}
+    return df.rename(columns=inv_map)
+
+
+def content_hash(fileobj, mapping: Optional[dict] = None,
+                 timestamp_format: Optional[str] = None) -> str:
+    """
+    sha256 of the file, its mapping and its confirmed timestamp format (the
+    same file read differently is different data). The file position is
+    restored afterwards.
+    """
+    digest = hashlib.sha256()
+    position = fileobj.tell()
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    fileobj.seek(position)
+    digest.update(json.dumps(mapping or {}, sort_keys=True).encode())
+    if timestamp_format:
+        digest.update(timestamp_format.encode())
+    return digest.hexdigest()
+
+
+def stage_upload(
+    db: Session,
+    fileobj,
+    filename: str,
+    mapping: Optional[dict] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    encoding: Optional[str] = None,
+    delimiter: Optional[str] = None,
+    force: bool = False,
+    timestamp_format: Optional[str] = None,
+) -> dict:
+    """
+    Stream an upload into one raw batch file (see etl.raw_batches), one
+    chunk at a time. Memory is bounded by `chunk_size`, not by the file size.
+    A file already loaded with the same mapping is skipped (`duplicate_of`
+    names its batch) unless `force`. A file whose batch is still pending is
+    staged again, and one whose rows failed has lost its hash (see
+    raw_batches.set_status), so a duplicate always means loaded. Rows
+    already loaded unchanged are dropped while staging (`skipped`).
+    `timestamp_format` is the format the user confirmed for the timestamp
+    column (see upload_preview); otherwise it is inferred while staging.
+    """
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    digest = content_hash(fileobj, mapping, timestamp_format)
+    previous = None if force else _batch_with_hash(db, digest)
+    if previous is not None and raw_batches.is_loaded(db, previous):
+        return {"rows": 0, "chunks": 0, "staged": 0, "skipped": 0, "batch_id": None,
+                "duplicate_of": previous}
+
+    total_bytes = _file_size(fileobj)
+    progress = {"rows": 0, "chunks": 0}
+
+    def mapped_chunks():
+        chunks = read_upload_chunks(fileobj, filename, chunk_size,
+                                    encoding=encoding, delimiter=delimiter)
+        for chunk in chunks:
+            yield apply_mapping(chunk, mapping)
+            progress["rows"] += len(chunk)
+            progress["chunks"] += 1
+            if on_progress:
+                on_progress({**progress, "bytes_read": _tell(fileobj), "total_bytes": total_bytes})
+
+    try:
+        # A forced re-upload, or one while the first is pending, leaves the
+        # hash with the first batch
+        keep_hash = force or previous is not None
+        batch = raw_batches.write_batch(db, mapped_chunks(), source=filename,
+                                        content_hash=None if keep_hash else digest,
+                                        timestamp_format=timestamp_format)
+    except IntegrityError:
+        # A concurrent upload of the same file registered the hash first
+        previous = _batch_with_hash(db, digest)
+        if previous is None:
+            raise
+        return {**progress, "staged": 0, "skipped": 0, "batch_id": None, "duplicate_of": previous}
+    return {**progress, "staged": batch["rows"], "skipped": batch["skipped"],
+            "batch_id": batch["batch_id"]}
+
+
+def _batch_with_hash(db: Session, digest: str) -> Optional[int]:
+    return db.query(RawBatch.id).filter(RawBatch.content_hash == digest).scalar()
+
+
+def _file_size(fileobj) -> Optional[int]:
+    try:
+        pos = fileobj.tell()
+        size = fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(pos)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def _tell(fileobj) -> Optional[int]:
+    try:
+        return fileobj.tell()
+    except (AttributeError, OSError):
+        return None
@@ -1,111 +1,159 @@
 import pandas as pd
-from sqlalchemy.orm import Session
-from app.models.sales_event import SalesEvent
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import cached_result, get_data_version_async
+from app.core.executor import run_cpu
+from app.services.analytics import get_analytics
 from datetime import datetime, timedelta
-import numpy as np
-try:
-    from statsmodels.tsa.holtwinters import ExponentialSmoothing
-except ImportError:
-    ExponentialSmoothing = None
+from typing import Optional
+from app.services.forecasting import forecast_engine
+
+FORECAST_DIMENSIONS = ('channel', 'product_id')
+COMPLETED = {'status': ['completed']}
+# Days of history the forecasts are fitted on
+FORECAST_HISTORY_DAYS = 90
+
+def summary_metrics(daily: pd.DataFrame, start_date, prev_start_date) -> dict:
+    """
+    Revenue, orders and AOV from `start_date` on, with % change against the
+    period from `prev_start_date`, from a daily (day, orders, revenue) frame.
+    """
+    in_current = daily['day'] >= start_date
+    in_previous = (daily['day'] >= prev_start_date) & ~in_current
+
+    def get_metrics(rows):
+        revenue = float(rows['revenue'].sum())
+        orders = int(rows['orders'].sum())
+        aov = revenue / orders if orders > 0 else 0.0
+        return revenue, orders, aov
+
+    curr_rev, curr_ord, curr_aov = get_metrics(daily[in_current])
+    prev_rev, prev_ord, prev_aov = get_metrics(daily[in_previous])
+
+    def calc_change(curr, prev):
+        if prev == 0: return 0.0
+        return ((curr - prev) / prev) * 100
+
+    return {
+        "total_revenue": curr_rev,
+        "total_orders": curr_ord,
+        "avg_order_value": curr_aov,
+        "revenue_change": calc_change(curr_rev, prev_rev),
+        "orders_change": calc_change(curr_ord, prev_ord),
+        "aov_change": calc_change(curr_aov, prev_aov)
+    }
+
+def forecast_total(daily: pd.DataFrame, forecast_days: int, version=None) -> pd.DataFrame:
+    """
+    Forecast total revenue from a daily (day, revenue) frame; empty with
+    less than a week of history. CPU-bound.
+    """
+    if daily.empty or len(daily) < 7:
+        return pd.DataFrame()
+    series = {None: daily.set_index(pd.to_datetime(daily['day']))['revenue']}
+    forecast_df = forecast_engine.forecast_many(series, forecast_days, version=version)
+    if forecast_df.empty:
+        return pd.DataFrame()
+    return forecast_df[['day', 'revenue']]
 
 class KPIService:
-    def __init__(self, db: Session):
+    """
+    KPI queries over the analytics backend chosen by KPI_BACKEND (the daily
+    rollups by default). Forecasting is handed to the CPU executor so the
+    event loop stays free.
+    """
+    def __init__(self, db: AsyncSession):
         self.db = db
+        self.analytics = get_analytics(db)
 
-    def get_daily_revenue(self, days: int = 30):
+    @cached_result
+    async def get_daily_revenue(self, days: int = 30):
         """
         Get daily revenue for the last `days` days.
         """
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Query sales_events for daily revenue
-        results = self.db.query(
-            func.date(SalesEvent.timestamp_utc).label('day'),
-            func.sum(SalesEvent.net_amount).label('revenue')
-        ).filter(
-            SalesEvent.timestamp_utc >= start_date,
-            SalesEvent.status == 'completed'
-        ).group_by('day').order_by('day').all()
-        
-        return pd.DataFrame(results, columns=['day', 'revenue'])
+        start_date = (datetime.utcnow() - timedelta(days=days)).date()
+        df = await self.analytics.aggregate(['day'], start=start_date, filters=COMPLETED)
+        return df[['day', 'revenue']]
 
-    def get_conversion_by_channel(self):
+    @cached_result
+    async def get_conversion_by_channel(self, days: int = 30):
         """
-        Get conversion rate by channel.
-        For now, assume all sales_events are conversions.
+        Get conversion rate by channel for the last `days` days.
+        For now, assume all completed sales_events are conversions.
         """
-        results = self.db.query(
-            SalesEvent.channel,
-            func.count(SalesEvent.id).label('conversions'),
-            func.sum(SalesEvent.net_amount).label('revenue')
-        ).group_by(SalesEvent.channel).all()
-        
-        return pd.DataFrame(results, columns=['channel', 'conversions', 'revenue'])
+        start_date = (datetime.utcnow() - timedelta(days=days)).date()
+        df = await self.analytics.aggregate(['channel'], start=start_date, filters=COMPLETED)
+        return df.rename(columns={'orders': 'conversions'})[['channel', 'conversions', 'revenue']]
 
-    def get_summary_metrics(self, days: int = 30):
+    @cached_result
+    async def get_summary_metrics(self, days: int = 30):
         """
         Get high-level summary metrics with period comparison.
         """
         # Current period
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = (datetime.utcnow() - timedelta(days=days)).date()
         
         # Previous period for comparison
         prev_start_date = start_date - timedelta(days=days)
         
-        def get_metrics(start, end):
-            query = self.db.query(
-                func.sum(SalesEvent.net_amount).label('revenue'),
-                func.count(SalesEvent.id).label('orders')
-            ).filter(
-                SalesEvent.timestamp_utc >= start,
-                SalesEvent.timestamp_utc < end,
-                SalesEvent.status == 'completed'
-            ).first()
-            
-            revenue = query.revenue or 0.0
-            orders = query.orders or 0
-            aov = revenue / orders if orders > 0 else 0.0
-            return revenue, orders, aov
-
-        curr_rev, curr_ord, curr_aov = get_metrics(start_date, datetime.utcnow())
-        prev_rev, prev_ord, prev_aov = get_metrics(prev_start_date, start_date)
-        
-        def calc_change(curr, prev):
-            if prev == 0: return 0.0
-            return ((curr - prev) / prev) * 100
-
-        return {
-            "total_revenue": curr_rev,
-            "total_orders": curr_ord,
-            "avg_order_value": curr_aov,
-            "revenue_change": calc_change(curr_rev, prev_rev),
-            "orders_change": calc_change(curr_ord, prev_ord),
-            "aov_change": calc_change(curr_aov, prev_aov)
-        }
-
-    def get_revenue_forecast(self, forecast_days: int = 30):
+        # Both periods in one daily query
+        daily = await self.analytics.aggregate(['day'], start=prev_start_date, filters=COMPLETED)
+        return summary_metrics(daily, start_date, prev_start_date)
+
+    @cached_result
+    async def get_segment_daily_revenue(self, days: int = 63):
         """
-        Generate revenue forecast for the next `forecast_days` days.
+        Daily completed revenue and orders per (channel, product) for the
+        last `days` days, from one query.
         """
-        df = self.get_daily_revenue(days=90)
-        if df.empty or len(df) < 7 or ExponentialSmoothing is None:
+        start_date = (datetime.utcnow() - timedelta(days=days - 1)).date()
+        df = await self.analytics.aggregate(['day', 'channel', 'product_id'], start=start_date,
+                                            filters=COMPLETED)
+        return df[['day', 'channel', 'product_id', 'revenue', 'orders']]
+
+    @cached_result
+    async def get_segments(self, group_by=('channel',), start=None, end=None,
+                           channel=(), product_id=(), status=()):
+        """
+        Orders and revenue grouped by any of day, channel, product_id and
+        status, for days in [start, end] and the given dimension values
+        (empty = all), in one aggregate query. Arguments are tuples so
+        results can be cached.
+        """
+        filters = {column: values for column, values in (
+            ('channel', channel), ('product_id', product_id), ('status', status)
+        ) if values}
+        return await self.analytics.aggregate(list(group_by), start=start, end=end, filters=filters)
+
+    @cached_result
+    async def get_revenue_forecast(self, forecast_days: int = 30, by: Optional[str] = None):
+        """
+        Generate revenue forecast for the next `forecast_days` days, for total
+        revenue or for every channel / product when `by` names the dimension.
+        """
+        version, _ = await get_data_version_async(self.db)
+        if by is None:
+            df = await self.get_daily_revenue(days=FORECAST_HISTORY_DAYS)
+            return await run_cpu(forecast_total, df, forecast_days, version=version)
+
+        series = await self._daily_revenue_by(by, days=FORECAST_HISTORY_DAYS)
+        forecast_df = await run_cpu(forecast_engine.forecast_many, series, forecast_days,
+                                    version=version)
+        if forecast_df.empty:
             return pd.DataFrame()
-        
-        # Prepare data for forecasting
+        return forecast_df.rename(columns={'series': by})[['day', by, 'revenue']]
+
+    async def _daily_revenue_by(self, by: str, days: int = 90):
+        """
+        Daily completed revenue per value of `by` ('channel' or 'product_id'),
+        as a dict of series indexed by day, from one query.
+        """
+        if by not in FORECAST_DIMENSIONS:
+            raise ValueError(f"Cannot forecast by {by!r}, expected one of {FORECAST_DIMENSIONS}")
+        start_date = (datetime.utcnow() - timedelta(days=days)).date()
+        df = await self.analytics.aggregate(['day', by], start=start_date, filters=COMPLETED)
+        df = df.rename(columns={by: 'segment'})
+        if df.empty:
+            return {}
         df['day'] = pd.to_datetime(df['day'])
-        df = df.set_index('day').asfreq('D').fillna(0)
-        
-        try:
-            # Simple Exponential Smoothing
-            model = ExponentialSmoothing(df['revenue'], seasonal='add', seasonal_periods=7).fit()
-            forecast = model.forecast(forecast_days)
-            
-            forecast_df = pd.DataFrame({
-                'day': [df.index[-1] + timedelta(days=i+1) for i in range(forecast_days)],
-                'revenue': forecast.values
-            })
-            return forecast_df
-        except Exception as e:
-            print(f"Forecasting error: {e}")
-            return pd.DataFrame()
+        matrix = df.pivot_table(index='day', columns='segment', values='revenue', aggfunc='sum')
+        return {key: matrix[key].dropna() for key in matrix.columns}
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from typing import Dict, Iterable
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.etl.processors.deduplication import blocking_keys, normalise_name
+from app.models.bulk import chunked, upsert
+from app.models.customer import CustomerAlias
+
+
+def load_candidates(db: Session, names: Iterable) -> Dict[str, str]:
+    """
+    Load the slice of the canonical-name index that could match `names`:
+    the names themselves plus every indexed name sharing a blocking key.
+    """
+    names = {str(n) for n in names if n is not None}
+    phonetic_keys, prefix_keys = set(), set()
+    for name in names:
+        phonetic, prefix = blocking_keys(normalise_name(name))
+        phonetic_keys.add(phonetic)
+        prefix_keys.add(prefix)
+
+    known = {}
+    for column, values in (
+        (CustomerAlias.name, names),
+        (CustomerAlias.phonetic_key, phonetic_keys),
+        (CustomerAlias.prefix_key, prefix_keys),
+    ):
+        for chunk in chunked(values):
+            rows = db.query(CustomerAlias.name, CustomerAlias.canonical_name).filter(
+                column.in_(chunk)
+            ).all()
+            known.update({row.name: row.canonical_name for row in rows})
+    return known
+
+
+def save_mapping(db: Session, mapping: Dict[str, str]):
+    """
+    Upsert name -> canonical_name pairs into the index. When a new name
+    joins clusters that had different canonical names, every indexed name
+    of those clusters is moved to the surviving canonical name, not only
+    the ones loaded as candidates, so the index stays transitive.
+    """
+    previous = {}
+    for chunk in chunked(list(mapping)):
+        rows = db.query(CustomerAlias.name, CustomerAlias.canonical_name).filter(
+            CustomerAlias.name.in_(chunk)
+        ).all()
+        previous.update({row.name: row.canonical_name for row in rows})
+    # old canonical name -> the one its cluster was merged into
+    merged = {
+        previous[name]: canonical for name, canonical in mapping.items()
+        if name in previous and previous[name] != canonical
+    }
+
+    params = []
+    for name, canonical in mapping.items():
+        phonetic, prefix = blocking_keys(normalise_name(name))
+        params.append({
+            "name": name,
+            "canonical_name": canonical,
+            "phonetic_key": phonetic,
+            "prefix_key": prefix,
+        })
+    for chunk in chunked(params, 5000):
+        stmt = upsert(db, CustomerAlias.__table__, ["name"], ["canonical_name"])
+        db.execute(stmt, chunk)
+
+    by_target = defaultdict(list)
+    for old, canonical in merged.items():
+        by_target[canonical].append(old)
+    for canonical, olds in by_target.items():
+        for chunk in chunked(olds):
+            db.execute(
+                update(CustomerAlias).where(CustomerAlias.canonical_name.in_(chunk))
+                .values(canonical_name=canonical),
+                execution_options={"synchronize_session": False},
+            )
+    db.commit()
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import LRUCache, get_data_version_async
+from app.core.config import settings
+from app.core.executor import run_report
+from app.models.base import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Finished and failed jobs remembered for status lookups
+MAX_JOBS = 256
+
+
+def report_id(client_name: str, version: int, days: int) -> str:
+    key = f"{client_name}\x00{version}\x00{days}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class ReportJob:
+    def __init__(self, report_id: str, client_name: str, version: int, days: int):
+        self.id = report_id
+        self.client_name = client_name
+        self.version = version
+        self.days = days
+        self.status = 'queued'  # queued, running, ready, failed
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'client_name': self.client_name,
+            'data_version': self.version,
+            'days': self.days,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class ReportService:
+    """
+    Renders PDF reports as background tasks on the API's event loop and keeps
+    finished PDFs in memory, keyed by (client name, data version, period).
+
+    Requesting a report that is cached returns the finished job; requesting
+    one that is already rendering joins that render. PDFs are held as bytes,
+    never in a shared file, so concurrent renders cannot overwrite each
+    other. The cache is bounded by total PDF size (REPORT_CACHE_BYTES).
+    """
+    def __init__(self, cache_bytes: int):
+        self.pdfs = LRUCache(cache_bytes, weigh=len)
+        self.jobs = OrderedDict()
+
+    async def request(self, db: AsyncSession, client_name: str, days: int = 30) -> ReportJob:
+        version, _ = await get_data_version_async(db)
+        key = report_id(client_name, version, days)
+        job = self.jobs.get(key)
+        if job is not None and (
+            job.status in ('queued', 'running')
+            or (job.status == 'ready' and self.pdfs.get(key) is not None)
+        ):
+            self.jobs.move_to_end(key)
+            return job
+
+        job = ReportJob(key, client_name, version, days)
+        self.jobs[key] = job
+        while len(self.jobs) > MAX_JOBS:
+            self.jobs.popitem(last=False)
+        job.task = asyncio.create_task(self._render(job))
+        return job
+
+    def get(self, key: str) -> Optional[ReportJob]:
+        return self.jobs.get(key)
+
+    def pdf(self, key: str) -> Optional[bytes]:
+        return self.pdfs.get(key)
+
+    async def _render(self, job: ReportJob):
+        # WeasyPrint is optional; a missing install fails the job, not the API
+        try:
+            from app.generate_report import collect_report_data, render_pdf
+            job.status = 'running'
+            async with AsyncSessionLocal() as db:
+                data = await collect_report_data(db, days=job.days)
+            # An ETL load may have committed since the request read the version
+            job.version = data['data_version']
+            pdf = await run_report(render_pdf, data, job.client_name)
+            self.pdfs.set(job.id, pdf)
+            job.status = 'ready'
+        except Exception as e:
+            logger.exception("Report %s failed", job.id)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+
+report_service = ReportService(settings.REPORT_CACHE_BYTES)
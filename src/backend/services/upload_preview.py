@@ -0,0 +1,250 @@
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Dict, List
+import pandas as pd
+from app.core.config import settings
+from app.etl.processors import timestamps
+
+# OpenSight field -> header names that usually hold it (normalised: lower
+# case, non-alphanumerics as '_')
+FIELD_SYNONYMS = {
+    'order_id': ['order_id', 'order', 'order_no', 'order_number', 'orderid', 'transaction_id',
+                 'invoice', 'invoice_id', 'id'],
+    'customer_id': ['customer_id', 'customer', 'client', 'client_id', 'buyer', 'customer_email',
+                    'email', 'customer_name'],
+    'product_id': ['product_id', 'product', 'sku', 'item', 'item_id', 'product_name'],
+    'amount': ['amount', 'total', 'order_total', 'price', 'revenue', 'value', 'sales',
+               'total_amount'],
+    'currency': ['currency', 'currency_code', 'ccy', 'curr'],
+    'channel': ['channel', 'sales_channel', 'source', 'platform', 'utm_source'],
+    'status': ['status', 'order_status', 'state'],
+    'timestamp': ['timestamp', 'created_at', 'order_date', 'date', 'datetime', 'time',
+                  'purchase_date'],
+}
+# Fields that need a column of a given inferred type
+FIELD_TYPES = {'amount': ('integer', 'float'), 'timestamp': ('datetime',)}
+
+DELIMITERS = ',;\t|'
+ENCODINGS = ('utf-8-sig', 'cp1252', 'latin-1')
+_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def _normalise(name) -> str:
+    return _NON_ALNUM.sub('_', str(name).lower()).strip('_')
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    First encoding that decodes the sample; a multi-byte character cut off
+    at the end of the sample does not count against UTF-8.
+    """
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+def detect_delimiter(text: str) -> str:
+    try:
+        return csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def infer_date_format(values: pd.Series) -> dict:
+    """
+    Date format of sampled values as ingest infers it (see
+    timestamps.FormatInference): `date_format` (None when no format reads
+    every value) and, when the sample reads both day-first and month-first,
+    both formats in `date_format_choices`; `date_format` is then the
+    DEFAULT_DATE_ORDER reading. Confirm one with the upload's
+    timestamp_format.
+    """
+    inference = timestamps.FormatInference()
+    inference.update(values)
+    ambiguous = inference.ambiguous()
+    return {'date_format': inference.result(),
+            'date_format_choices': list(ambiguous) if ambiguous is not None else None}
+
+
+def infer_column(values: pd.Series) -> dict:
+    """
+    Inferred type (integer, float, boolean, datetime, string or empty) of a
+    sampled column, with the date format for datetimes.
+    """
+    present = values.dropna()
+    if present.empty:
+        return {'type': 'empty'}
+    is_boolean = pd.api.types.is_bool_dtype(present)
+    if is_boolean or present.astype(str).str.lower().isin(['true', 'false']).all():
+        return {'type': 'boolean'}
+    numeric = pd.to_numeric(present, errors='coerce')
+    if numeric.notna().all():
+        return {'type': 'integer' if (numeric % 1 == 0).all() else 'float'}
+    if pd.api.types.is_datetime64_any_dtype(present):
+        return {'type': 'datetime', 'date_format': None, 'date_format_choices': None}
+    dates = infer_date_format(present)
+    if dates['date_format'] is not None:
+        return {'type': 'datetime', **dates}
+    return {'type': 'string'}
+
+
+def propose_mapping(columns: List[str], types: Dict[str, dict]) -> Dict[str, str]:
+    """
+    Map OpenSight fields to source columns: an exact synonym beats a
+    synonym contained in the header, earlier synonyms beat later ones, and
+    amount/timestamp only take columns of a compatible type. Every column
+    is used at most once.
+    """
+    candidates = []
+    for field, synonyms in FIELD_SYNONYMS.items():
+        for column in columns:
+            if field in FIELD_TYPES and types[column]['type'] not in FIELD_TYPES[field]:
+                continue
+            header = _normalise(column)
+            for rank, synonym in enumerate(synonyms):
+                if header == synonym:
+                    candidates.append((0, rank, field, column))
+                    break
+                if synonym != 'id' and re.search(rf'(^|_){synonym}(_|$)', header):
+                    candidates.append((1, rank, field, column))
+                    break
+    mapping, used = {}, set()
+    for _, _, field, column in sorted(candidates, key=lambda c: c[:2]):
+        if field not in mapping and column not in used:
+            mapping[field] = column
+            used.add(column)
+    return mapping
+
+
+def sniff(path: str, filename: str, sample_bytes: int = None, rows: int = None) -> dict:
+    """
+    Read the first `sample_bytes` of a CSV (or the first `rows` rows of an
+    Excel sheet) and describe it: encoding, delimiter, columns with their
+    inferred types, sample rows and a proposed mapping.
+    """
+    sample_bytes = sample_bytes or settings.PREVIEW_BYTES
+    rows = rows or settings.PREVIEW_ROWS
+    encoding = delimiter = None
+    if filename.endswith('.csv'):
+        with open(path, 'rb') as f:
+            raw = f.read(sample_bytes)
+            complete = not f.read(1)
+        encoding = detect_encoding(raw)
+        text = codecs.getincrementaldecoder(encoding)().decode(raw, final=complete)
+        if not complete and '\n' in text:
+            # Drop the partial last line
+            text = text[:text.rindex('\n') + 1]
+        delimiter = detect_delimiter(text)
+        sample = pd.read_csv(io.StringIO(text), sep=delimiter)
+    elif filename.endswith(('.xls', '.xlsx')):
+        sample = pd.read_excel(path, nrows=rows * 10)
+    else:
+        raise ValueError("Only CSV or Excel files allowed")
+
+    columns = [str(c) for c in sample.columns]
+    sample.columns = columns
+    types = {column: infer_column(sample[column]) for column in columns}
+    preview = sample.head(rows)
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'columns': [{'name': column, **types[column]} for column in columns],
+        'rows': preview.astype(object).where(preview.notna(), None).to_dict(orient='records'),
+        'sampled_rows': len(sample),
+        'mapping': propose_mapping(columns, types),
+    }
+
+
+def _staging_dir() -> str:
+    return settings.UPLOAD_STAGING_DIR
+
+
+def _paths(token: str):
+    if not _TOKEN.match(token or ''):
+        raise KeyError(token)
+    base = os.path.join(_staging_dir(), token)
+    return base + '.data', base + '.json'
+
+
+def stage(fileobj, filename: str) -> dict:
+    """
+    Copy an upload to the staging directory and sniff it. Returns the
+    preview plus an upload token that /api/ingest/upload accepts instead
+    of the file.
+    """
+    purge_expired()
+    os.makedirs(_staging_dir(), exist_ok=True)
+    token = uuid.uuid4().hex
+    data_path, meta_path = _paths(token)
+    with open(data_path, 'wb') as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    try:
+        preview = sniff(data_path, filename)
+    except Exception:
+        os.remove(data_path)
+        raise
+    meta = {
+        'filename': filename,
+        'encoding': preview['encoding'],
+        'delimiter': preview['delimiter'],
+        'expires_at': time.time() + settings.UPLOAD_TOKEN_TTL,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return {'upload_token': token, 'filename': filename, 'expires_at': meta['expires_at'],
+            **preview}
+
+
+def load(token: str) -> dict:
+    """
+    Metadata and file path of a staged upload; KeyError when the token is
+    unknown or expired.
+    """
+    data_path, meta_path = _paths(token)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise KeyError(token)
+    if meta['expires_at'] < time.time():
+        discard(token)
+        raise KeyError(token)
+    return {**meta, 'path': data_path}
+
+
+def discard(token: str):
+    for path in _paths(token):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_expired():
+    directory = _staging_dir()
+    if not os.path.isdir(directory):
+        return
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        token = name[:-len('.json')]
+        try:
+            with open(os.path.join(directory, name)) as f:
+                expired = json.load(f)['expires_at'] < now
+        except (OSError, ValueError, KeyError):
+            expired = True
+        if expired and _TOKEN.match(token):
+            discard(token)
@@ -2,9 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import requests
 from datetime import datetime, timedelta
-import io
 from pathlib import Path
 
 # Page config
@@ -36,33 +34,8 @@ def load_css():
 
 load_css()
 
-# API URL
-API_URL = "http://localhost:8000"
-
-# Helper functions
-def fetch_kpis(days=30):
-    try:
-        response = requests.get(f"{API_URL}/api/kpis/summary?days={days}")
-        return response.json() if response.status_code == 200 else None
-    except: return None
-
-def fetch_daily_revenue(days=30):
-    try:
-        response = requests.get(f"{API_URL}/api/kpis/daily?days={days}")
-        return pd.DataFrame(response.json()) if response.status_code == 200 else pd.DataFrame()
-    except: return pd.DataFrame()
-
-def fetch_forecast(days=30):
-    try:
-        response = requests.get(f"{API_URL}/api/kpis/forecast?days={days}")
-        return pd.DataFrame(response.json()) if response.status_code == 200 else pd.DataFrame()
-    except: return pd.DataFrame()
-
-def fetch_insights():
-    try:
-        response = requests.get(f"{API_URL}/api/insights")
-        return response.json() if response.status_code == 200 else []
-    except: return []
+# API access, connection pooling and caching
+from frontend import client
 
 # Sidebar
 with st.sidebar:
@@ -75,13 +48,17 @@ with st.sidebar:
     if st.button("🚀 Load Sample Data", use_container_width=True, help="Instantly populate the dashboard with demo data"):
         with st.spinner("Generating demo data..."):
             try:
-                res = requests.post(f"{API_URL}/api/sample-data")
+                res = client.load_sample_data()
                 if res.status_code == 200:
+                    client.wait_for_etl_job(res.json()["job_id"])
                     st.success("Sample data loaded!")
                     st.rerun()
             except:
                 st.error("Could not connect to API")
 
+# Analysis periods offered on the dashboard, in days
+PERIODS = [7, 14, 30, 60, 90]
+
 # Dashboard Page
 if page == "Dashboard":
     st.markdown('<div class="main-header"><h1>Sales Intelligence Dashboard</h1><p>Real-time performance tracking and revenue forecasting</p></div>', unsafe_allow_html=True)
@@ -89,10 +66,17 @@ if page == "Dashboard":
     # Filters
     col_f1, col_f2 = st.columns([1, 3])
     with col_f1:
-        days_range = st.selectbox("Analysis Period", [7, 14, 30, 60, 90], index=2, format_func=lambda x: f"Last {x} Days")
+        days_range = st.selectbox("Analysis Period", PERIODS, index=2,
+                                  format_func=lambda x: f"Last {x} Days")
     
+    # Every panel in one round trip, cached per period
+    dashboard = client.fetch_dashboard(days=days_range)
+    # Warm the other periods so switching between them is instant, once per data version
+    client.prefetch(client.fetch_dashboard, [(d,) for d in PERIODS if d != days_range],
+                    version=dashboard.get("etag"))
+
     # Metrics
-    kpis = fetch_kpis(days=days_range)
+    kpis = dashboard.get("summary")
     if kpis:
         c1, c2, c3 = st.columns(3)
         
@@ -118,8 +102,8 @@ if page == "Dashboard":
     
     with col_c1:
         st.subheader("Revenue Trends & Forecast")
-        df_rev = fetch_daily_revenue(days=days_range)
-        df_fore = fetch_forecast(days=30)
+        df_rev = pd.DataFrame(dashboard.get("daily", []))
+        df_fore = pd.DataFrame(dashboard.get("forecast", []))
         
         if not df_rev.empty:
             fig = go.Figure()
@@ -134,34 +118,54 @@ if page == "Dashboard":
 
     with col_c2:
         st.subheader("Channel Performance")
-        # Mock data for channel if not in API yet
-        channel_data = pd.DataFrame({
-            "Channel": ["Instagram", "WhatsApp", "Web", "Facebook"],
-            "Revenue": [4500, 3200, 2100, 1200]
-        })
-        fig_pie = px.pie(channel_data, values='Revenue', names='Channel', hole=.4, color_discrete_sequence=px.colors.qualitative.Pastel)
-        fig_pie.update_layout(margin=dict(l=0, r=0, t=30, b=0), height=400)
-        st.plotly_chart(fig_pie, use_container_width=True)
-
-    # Export Section
+        channel_data = pd.DataFrame(dashboard.get("channels", []))
+        if not channel_data.empty:
+            fig_pie = px.pie(channel_data, values='revenue', names='channel', hole=.4,
+                             color_discrete_sequence=px.colors.qualitative.Pastel)
+            fig_pie.update_layout(margin=dict(l=0, r=0, t=30, b=0), height=400)
+            st.plotly_chart(fig_pie, use_container_width=True)
+        else:
+            st.info("No channel data for this period.")
+
+    # Segment explorer: every filter is applied by the API in one aggregate query
+    st.markdown("---")
+    st.subheader("🔎 Segment Explorer")
+    dimensions = {"Channel": "channel", "Product": "product_id", "Status": "status", "Day": "day"}
+    col_s1, col_s2, col_s3 = st.columns(3)
+    with col_s1:
+        group_labels = st.multiselect("Break down by", list(dimensions), default=["Channel"])
+    with col_s2:
+        statuses = st.multiselect("Status", ["completed", "pending", "cancelled"],
+                                  default=["completed"])
+    with col_s3:
+        channels = st.multiselect("Channels", [c["channel"] for c in dashboard.get("channels", [])])
+    group_by = [dimensions[label] for label in group_labels] or ["channel"]
+    df_seg = client.fetch_segments(days=days_range, group_by=group_by, status=statuses,
+                                   channel=channels)
+    if not df_seg.empty:
+        df_seg["segment"] = df_seg[group_by].astype(str).agg(" / ".join, axis=1)
+        top_segments = df_seg.sort_values("revenue", ascending=False).head(25)
+        fig_seg = px.bar(top_segments, x="segment", y="revenue", hover_data=["orders"])
+        fig_seg.update_layout(margin=dict(l=0, r=0, t=30, b=0), height=350,
+                              template="plotly_white", xaxis_title=None)
+        st.plotly_chart(fig_seg, use_container_width=True)
+        st.dataframe(df_seg.drop(columns="segment"), use_container_width=True, hide_index=True)
+    else:
+        st.info("No sales match these filters.")
+
+    # Export Section: the browser downloads straight from the API, which
+    # streams the events, so nothing is buffered in Streamlit
     st.markdown("---")
     st.subheader("📤 Export Data")
+    st.caption("Sales events for the selected period, status and channels.")
     exp_col1, exp_col2, exp_col3 = st.columns(3)
-    
-    with exp_col1:
-        if not df_rev.empty:
-            csv = df_rev.to_csv(index=False)
-            st.download_button("Download CSV", csv, "revenue_data.csv", "text/csv", use_container_width=True)
-    
-    with exp_col2:
-        if not df_rev.empty:
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df_rev.to_excel(writer, index=False)
-            st.download_button("Download Excel", buffer.getvalue(), "revenue_data.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
-            
-    with exp_col3:
-        st.info("💡 Tip: Use the 'Reports' page for a full PDF summary.")
+    start_date = (datetime.utcnow() - timedelta(days=days_range)).date()
+    formats = (("CSV", "csv"), ("Excel", "xlsx"), ("Parquet", "parquet"))
+    for col, (label, fmt) in zip((exp_col1, exp_col2, exp_col3), formats):
+        with col:
+            url = client.export_url(fmt, start=start_date, status=statuses, channel=channels)
+            st.link_button(f"Download {label}", url, use_container_width=True)
+    st.info("💡 Tip: Use the 'Reports' page for a full PDF summary.")
 
 # Data Ingestion Page
 elif page == "Data Ingestion":
@@ -171,36 +175,89 @@ elif page == "Data Ingestion":
     uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=["csv", "xlsx", "xls"])
     
     if uploaded_file:
-        df_preview = pd.read_csv(uploaded_file) if uploaded_file.name.endswith('.csv') else pd.read_excel(uploaded_file)
+        # The API sniffs a sample of the file once and keeps it staged, so
+        # reruns of this page reuse the preview and ingest by token
+        preview_key = f"preview:{uploaded_file.name}:{uploaded_file.size}"
+        if preview_key not in st.session_state:
+            with st.spinner("Analysing file..."):
+                try:
+                    st.session_state[preview_key] = client.preview(
+                        uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type
+                    )
+                except Exception as e:
+                    st.error(f"Could not read file: {e}")
+                    st.stop()
+        preview = st.session_state[preview_key]
+        columns = [c["name"] for c in preview["columns"]]
+
         st.subheader("Data Preview")
-        st.dataframe(df_preview.head(5), use_container_width=True)
-        
+        details = [f"{preview['sampled_rows']} rows sampled"]
+        if preview.get("encoding"):
+            details.append(f"encoding {preview['encoding']}, delimiter {preview['delimiter']!r}")
+        st.caption(" · ".join(details))
+        st.dataframe(pd.DataFrame(preview["rows"], columns=columns), use_container_width=True)
+        st.dataframe(pd.DataFrame(preview["columns"]), use_container_width=True, hide_index=True)
+
         st.subheader("Column Mapping")
-        st.info("Map your file columns to OpenSight fields")
-        
+        st.info("Map your file columns to OpenSight fields; suggestions are pre-selected")
+
         cols = st.columns(3)
         mapping = {}
-        fields = ["order_id", "amount", "customer_id", "timestamp", "channel"]
-        
+        fields = ["order_id", "amount", "customer_id", "product_id", "timestamp", "channel",
+                  "currency", "status"]
+        options = ["(none)"] + columns
+
         for i, field in enumerate(fields):
             with cols[i % 3]:
-                mapping[field] = st.selectbox(f"Field: {field}", options=df_preview.columns, index=i if i < len(df_preview.columns) else 0)
-        
+                proposed = preview["mapping"].get(field)
+                index = options.index(proposed) if proposed in options else 0
+                choice = st.selectbox(f"Field: {field}", options=options, index=index,
+                                      key=f"{preview_key}:{field}")
+                if choice != "(none)":
+                    mapping[field] = choice
+
+        # Dates like 03/04/2024 read both ways: let the user say which
+        timestamp_format = None
+        timestamp_column = next(
+            (c for c in preview["columns"] if c["name"] == mapping.get("timestamp")), {}
+        )
+        if timestamp_column.get("date_format_choices"):
+            day_first, month_first = timestamp_column["date_format_choices"]
+            order = st.radio(
+                f"Dates in '{timestamp_column['name']}' read both ways, which comes first?",
+                ["Day (03/04 is 3 April)", "Month (03/04 is 4 March)"],
+                index=0 if timestamp_column["date_format"] == day_first else 1,
+                key=f"{preview_key}:date_order",
+            )
+            timestamp_format = day_first if order.startswith("Day") else month_first
+
         if st.button("Process & Ingest Data", type="primary"):
             with st.spinner("Ingesting data..."):
-                import json
                 try:
-                    # Reset file pointer
-                    uploaded_file.seek(0)
-                    response = requests.post(
-                        f"{API_URL}/api/ingest/upload", 
-                        files={"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)},
-                        data={"mapping": json.dumps(mapping)}
-                    )
-                    if response.status_code == 200:
-                        requests.post(f"{API_URL}/api/etl/run")
-                        st.success("Data successfully ingested and processed!")
-                        st.balloons()
+                    response = client.upload_staged(preview["upload_token"], mapping,
+                                                    timestamp_format)
+                    result = response.json() if response.status_code == 200 else {}
+                    if result.get("duplicate_of") is not None:
+                        del st.session_state[preview_key]
+                        st.info("This file was already ingested, nothing to do.")
+                    elif response.status_code == 200:
+                        del st.session_state[preview_key]
+                        if result.get("skipped"):
+                            st.caption(f"{result['skipped']:,} rows were already loaded "
+                                       "unchanged and were skipped.")
+                        # Processing runs as a background job; a burst of uploads shares one run
+                        job_id = client.run_etl()["job_id"]
+                        st.success("Data ingested, processing in the background.")
+                        job = client.wait_for_etl_job(job_id)
+                        if job and job["status"] == "succeeded":
+                            st.success("Data successfully ingested and processed!")
+                            st.balloons()
+                        elif job:
+                            st.error(f"Processing failed: {job.get('error')}")
+                    elif response.status_code == 404:
+                        # Staged file expired; the next run previews it again
+                        del st.session_state[preview_key]
+                        st.warning("The uploaded file expired, please try again.")
                     else:
                         st.error(f"Upload failed: {response.text}")
                 except Exception as e:
@@ -209,7 +266,7 @@ elif page == "Data Ingestion":
 # Insights Page
 elif page == "Insights":
     st.title("💡 Smart Insights")
-    insights = fetch_insights()
+    insights = client.fetch_insights()
     
     if insights:
         for ins in insights:
@@ -244,7 +301,7 @@ elif page == "Reports":
         if st.button("Generate PDF Report", type="primary"):
             with st.spinner("Generating report..."):
                 try:
-                    res = requests.post(f"{API_URL}/api/report/generate")
+                    res = client.generate_report()
                     if res.status_code == 200:
                         st.download_button("⬇️ Download Report", res.content, "OpenSight_Report.pdf", "application/pdf")
                 except:
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+# Base URL the browser uses for direct downloads, when it differs from API_URL
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", API_URL)
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 30)
+# Uploads and PDF renders can take minutes
+LONG_TIMEOUT = (3.05, 600)
+# Seconds a fetched panel is reused; ingest and ETL clear it sooner
+CACHE_TTL = 300
+FETCH_WORKERS = 4
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    One keep-alive connection pool shared by every rerun and browser session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2 * FETCH_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="opensight-fetch")
+
+
+@st.cache_resource
+def _prefetched() -> tuple:
+    # (function name, data version) pairs already prefetched, across reruns
+    return set(), threading.Lock()
+
+
+def get(path, timeout=TIMEOUT, **kwargs) -> requests.Response:
+    return get_session().get(f"{API_URL}{path}", timeout=timeout, **kwargs)
+
+
+def post(path, timeout=TIMEOUT, **kwargs) -> requests.Response:
+    return get_session().post(f"{API_URL}{path}", timeout=timeout, **kwargs)
+
+
+# Cached fetches raise on failure so errors are never cached; the public
+# wrappers below turn them into empty results for the page.
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _dashboard(days, forecast_days):
+    panels = {}
+    params = {"days": days, "forecast_days": forecast_days}
+    with get("/api/dashboard", params=params, stream=True) as response:
+        response.raise_for_status()
+        # Identifies the data version the panels were computed from
+        panels["etag"] = response.headers.get("ETag")
+        for line in response.iter_lines():
+            if line:
+                item = json.loads(line)
+                panels[item["panel"]] = item["data"]
+    return panels
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _insights():
+    response = get("/api/insights")
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _segments(days, group_by, status, channel, product_id):
+    params = {"days": days, "group_by": list(group_by), "status": list(status),
+              "channel": list(channel), "product_id": list(product_id)}
+    response = get("/api/segments", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_dashboard(days=30, forecast_days=30):
+    """
+    All dashboard panels in one request; the API streams one JSON line per panel.
+    `etag` holds the data version they were computed from.
+    """
+    try:
+        return _dashboard(days, forecast_days)
+    except Exception:
+        return {}
+
+
+def fetch_insights():
+    try:
+        return _insights()
+    except Exception:
+        return []
+
+
+def fetch_segments(days=30, group_by=("channel",), status=(), channel=(), product_id=()):
+    """
+    Orders and revenue per segment, filtered and grouped by the API.
+    """
+    try:
+        rows = _segments(days, tuple(group_by), tuple(status), tuple(channel), tuple(product_id))
+    except Exception:
+        rows = []
+    return pd.DataFrame(rows, columns=[*group_by, "orders", "revenue"])
+
+
+def export_url(fmt, start=None, status=(), channel=(), product_id=()):
+    """
+    Link to a streamed export of sales events, for the browser to download.
+    """
+    params = {"format": fmt, "status": list(status), "channel": list(channel),
+              "product_id": list(product_id)}
+    if start is not None:
+        params["start"] = start.isoformat()
+    return f"{PUBLIC_API_URL}/api/export?{urlencode(params, doseq=True)}"
+
+
+def invalidate():
+    """
+    Drop cached panels; called once new data has been processed.
+    """
+    _dashboard.clear()
+    _insights.clear()
+    _segments.clear()
+
+
+def _in_pool(fn, *args):
+    # Pool threads run outside the script; lend them this run's context
+    ctx = get_script_run_ctx()
+
+    def call():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return get_pool().submit(call)
+
+
+def prefetch(fn, arg_list, version):
+    """
+    Warm the cache for likely next selections in the background, without
+    waiting for the results. Runs once per data `version` (e.g. the ETag of
+    a fetched result), not on every rerun; nothing is fetched without one.
+    """
+    if version is None:
+        return
+    done, lock = _prefetched()
+    with lock:
+        if (fn.__name__, version) in done:
+            return
+        done.add((fn.__name__, version))
+    for args in arg_list:
+        _in_pool(fn, *args)
+
+
+def wait_for_etl_job(job_id, timeout=600, interval=1.0):
+    """
+    Poll a background ETL job until it finishes; returns the final job or None.
+    Cached panels are dropped once it has finished.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            job = get(f"/api/etl/jobs/{job_id}").json()
+        except Exception:
+            return None
+        if job.get("status") in ("succeeded", "failed"):
+            invalidate()
+            return job
+        time.sleep(interval)
+    return None
+
+
+def load_sample_data():
+    return post("/api/sample-data", timeout=LONG_TIMEOUT)
+
+
+def upload(name, content, content_type, mapping):
+    return post(
+        "/api/ingest/upload",
+        files={"file": (name, content, content_type)},
+        data={"mapping": json.dumps(mapping)},
+        timeout=LONG_TIMEOUT,
+    )
+
+
+def preview(name, content, content_type):
+    """
+    Stage a file on the API and get back its sniffed columns, sample rows,
+    proposed mapping and the upload token to ingest it with.
+    """
+    response = post(
+        "/api/ingest/preview",
+        files={"file": (name, content, content_type)},
+        timeout=LONG_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def upload_staged(upload_token, mapping, timestamp_format=None):
+    data = {"upload_token": upload_token, "mapping": json.dumps(mapping)}
+    if timestamp_format:
+        data["timestamp_format"] = timestamp_format
+    return post("/api/ingest/upload", data=data, timeout=LONG_TIMEOUT)
+
+
+def run_etl():
+    return post("/api/etl/run").json()
+
+
+def generate_report():
+    return post("/api/report/generate", timeout=LONG_TIMEOUT)
@@ -0,0 +1,45 @@
+"""
+Load the backend as `app` (its name inside the API container) against a
+scratch SQLite database, before any settings are read.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1] / "src" / "backend"
+
+if "app" not in sys.modules:
+    scratch = Path(tempfile.mkdtemp(prefix="opensight-tests-"))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{scratch / 'test.db'}")
+    os.environ.setdefault("RAW_BATCH_DIR", str(scratch / "raw_batches"))
+    os.environ.setdefault("FX_LIVE_RATES_URL", "")
+    # Importable by path too, for spawned worker processes
+    (scratch / "app").symlink_to(BACKEND, target_is_directory=True)
+    sys.path.insert(0, str(scratch))
+    spec = importlib.util.spec_from_file_location(
+        "app", BACKEND / "__init__.py", submodule_search_locations=[str(BACKEND)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["app"] = module
+    spec.loader.exec_module(module)
+
+
+@pytest.fixture
+def db():
+    """
+    A session on freshly created tables, dropped again afterwards.
+    """
+    from app.models import customer, job, raw, rollup, sales_event, version  # noqa: F401
+    from app.models.base import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
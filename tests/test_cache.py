@@ -0,0 +1,36 @@
+from app.core import cache
+from app.models.base import SessionLocal
+
+calls = []
+
+
+class Totals:
+    def __init__(self, db):
+        self.db = db
+
+    @cache.cached_result
+    def for_days(self, days):
+        calls.append(days)
+        return {'days': days}
+
+
+def test_results_are_cached_until_the_data_version_is_bumped(db):
+    cache.results.clear()
+    calls.clear()
+
+    first = Totals(db).for_days(7)
+    first['days'] = 0
+    # Served from the cache, unharmed by the caller's change
+    assert Totals(db).for_days(7) == {'days': 7}
+    Totals(db).for_days(30)
+    assert calls == [7, 30]
+
+    with SessionLocal() as loader:
+        cache.bump_data_version(loader)
+        loader.commit()
+    # A session keeps the version it read first; a new one sees the bump
+    Totals(db).for_days(7)
+    assert calls == [7, 30]
+    with SessionLocal() as session:
+        assert Totals(session).for_days(7) == {'days': 7}
+    assert calls == [7, 30, 7]
@@ -0,0 +1,72 @@
+import threading
+
+import pandas as pd
+
+from app.etl.loaders import canonical
+from app.models.base import SessionLocal
+from app.models.rollup import DailySalesRollup
+from app.models.sales_event import SalesEvent
+
+
+def _frame(raw_event_id, net_amount):
+    return canonical.build_sales_frame(pd.DataFrame({
+        'order_id': ['A-1'], 'channel': ['web'], 'product_id': ['P1'], 'status': ['completed'],
+        'amount': [net_amount], 'net_amount': [net_amount],
+        'timestamp_utc': [pd.Timestamp('2024-03-01 10:00')], 'raw_event_id': [raw_event_id],
+    }))
+
+
+def _load(frame):
+    session = SessionLocal()
+    try:
+        canonical.upsert_sales_events(session, frame)
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_concurrent_loads_of_one_order_keep_rollups_exact(db, monkeypatch):
+    read_previous = canonical._previous_versions
+    racer = threading.Thread(target=_load, args=(_frame(2, 25.0),))
+
+    def previous_versions(session, order_ids):
+        previous = read_previous(session, order_ids)
+        if not racer.is_alive() and racer.ident is None:
+            # Another worker loads the same order between this read and the write
+            racer.start()
+            racer.join(timeout=0.5)
+        return previous
+
+    monkeypatch.setattr(canonical, '_previous_versions', previous_versions)
+    _load(_frame(1, 10.0))
+    racer.join()
+
+    (net_amount,) = db.query(SalesEvent.net_amount).one()
+    rollups = db.query(DailySalesRollup.order_count, DailySalesRollup.net_amount).all()
+    assert rollups == [(1, net_amount)]
+
+
+def test_a_failing_chunk_is_retried_row_by_row(db, monkeypatch):
+    _load(_frame(1, 10.0))
+    frame = canonical.build_sales_frame(pd.DataFrame({
+        'order_id': ['A-1', 'B-1', 'C-1'], 'channel': ['web'] * 3, 'product_id': ['P1'] * 3,
+        'status': ['completed'] * 3, 'amount': [25.0, 5.0, 7.0], 'net_amount': [25.0, 5.0, 7.0],
+        'timestamp_utc': [pd.Timestamp('2024-03-01 10:00')] * 3, 'raw_event_id': [2, 3, 4],
+    }))
+    write = canonical._write
+
+    def write_rejecting_c1(session, stmt, chunk, previous):
+        write(session, stmt, chunk, previous)
+        if 'C-1' in chunk['order_id'].tolist():
+            raise ValueError("bad row")
+
+    monkeypatch.setattr(canonical, '_write', write_rejecting_c1)
+    report = canonical.upsert_sales_events(db, frame, chunk_size=10)
+    db.commit()
+
+    assert (report['inserted'], report['updated'], report['conflicts']) == (1, 1, ['A-1'])
+    assert sorted(report['loaded_ids']) == [2, 3]
+    assert report['failed_ids'] == [4]
+    assert report['errors'] == [{'raw_event_id': 4, 'order_id': 'C-1', 'error': 'bad row'}]
+    assert sorted(db.query(SalesEvent.order_id, SalesEvent.net_amount)) == [('A-1', 25.0), ('B-1', 5.0)]
+    assert db.query(DailySalesRollup.order_count, DailySalesRollup.net_amount).all() == [(2, 30.0)]
@@ -0,0 +1,148 @@
+import asyncio
+import glob
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from app import main
+from app.core.cache import get_data_version
+from app.core.config import settings
+from app.etl.flows import main_flow
+from app.etl.loaders import columnar
+from app.models.base import AsyncSessionLocal
+from app.models.sales_event import SalesEvent
+from app.services.analytics import DuckDBAnalytics, SQLAnalytics
+
+
+def test_failed_append_is_recorded_and_repaired(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'KPI_BACKEND', 'duckdb')
+    monkeypatch.setattr(settings, 'PARQUET_PATH', str(tmp_path / 'parquet'))
+    valid = pd.DataFrame({
+        'order_id': ['A-1'], 'channel': ['web'], 'product_id': ['P1'], 'status': ['completed'],
+        'amount': [10.0], 'net_amount': [10.0], 'currency': ['USD'],
+        'timestamp_utc': [pd.Timestamp('2024-03-01 10:00')], 'raw_event_id': [1],
+    })
+    append = columnar.append
+
+    def full_disk(frame, root=None):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(columnar, 'append', full_disk)
+    with pytest.raises(OSError):
+        main_flow.load_to_canonical.fn(valid, pd.DataFrame(), raise_errors=True)
+
+    # The load itself is committed and cached results are invalidated
+    db.expire_all()
+    assert db.query(SalesEvent.order_id).all() == [('A-1',)]
+    assert get_data_version(db)[0] == 1
+    assert get_data_version(db, columnar.STALE)[0] == 1
+
+    monkeypatch.setattr(columnar, 'append', append)
+    db.info.clear()
+    assert columnar.repair(db)
+    assert glob.glob(os.path.join(settings.PARQUET_PATH, 'day=2024-03-01', '*.parquet'))
+    db.info.clear()
+    assert get_data_version(db, columnar.STALE)[0] == 0
+    assert not columnar.repair(db)
+
+
+def test_an_append_during_rebuild_waits_for_the_swap(db, monkeypatch, tmp_path):
+    root = str(tmp_path / 'parquet')
+    db.add(SalesEvent(order_id='A-1', channel='web', product_id='P1', status='completed',
+                      amount=10.0, net_amount=10.0, timestamp_utc=datetime(2024, 3, 1, 10)))
+    db.commit()
+    late = pd.DataFrame({
+        'order_id': ['B-1'], 'timestamp_utc': [pd.Timestamp('2024-03-02 10:00')], 'channel': ['web'],
+        'product_id': ['P1'], 'status': ['completed'], 'amount': [5.0], 'net_amount': [5.0], 'sign': [1],
+    })
+    append = columnar.append
+    loads = []
+
+    def append_then_load(frame, target=None):
+        append(frame, target)
+        if not loads:
+            # A load commits and appends while the new copy is being written
+            def load():
+                with columnar.locked(root):
+                    append(late, root)
+            loads.append(threading.Thread(target=load))
+            loads[0].start()
+            loads[0].join(0.2)
+            assert loads[0].is_alive()
+
+    monkeypatch.setattr(columnar, 'append', append_then_load)
+    columnar.rebuild(db, root)
+    loads[0].join()
+
+    files = glob.glob(os.path.join(root, 'day=*', '*.parquet'))
+    orders = pd.concat(pd.read_parquet(f) for f in files)['order_id']
+    assert sorted(orders) == ['A-1', 'B-1']
+
+
+def test_readers_find_a_complete_copy_throughout_a_rebuild(db, monkeypatch, tmp_path):
+    root = str(tmp_path / 'parquet')
+    db.add(SalesEvent(order_id='A-1', channel='web', product_id='P1', status='completed',
+                      amount=10.0, net_amount=10.0, timestamp_utc=datetime(2024, 3, 1, 10)))
+    db.commit()
+    columnar.rebuild(db, root)
+    first_copy = os.path.realpath(root)
+    analytics = DuckDBAnalytics(root)
+    orders = []
+    replace = os.replace
+
+    def replace_and_read(src, dst):
+        replace(src, dst)
+        orders.append(analytics._aggregate([], None, None, {})['orders'].tolist())
+
+    monkeypatch.setattr(columnar.os, 'replace', replace_and_read)
+    columnar.rebuild(db, root)
+
+    assert orders and all(o == [1] for o in orders)
+    assert os.path.realpath(root) != first_copy
+    assert not os.path.exists(first_copy)
+
+
+def test_reloading_sample_data_replaces_the_parquet_copy(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'KPI_BACKEND', 'duckdb')
+    monkeypatch.setattr(settings, 'PARQUET_PATH', str(tmp_path / 'parquet'))
+    analytics = DuckDBAnalytics(settings.PARQUET_PATH)
+
+    for _ in range(2):
+        main._load_sample_data()
+        main_flow.etl_pipeline.fn(chunked=False)
+
+        db.expire_all()
+        sales = db.query(SalesEvent).count()
+        assert sales == 120
+        totals = analytics._aggregate([], None, None, {})
+        assert totals['orders'].tolist() == [sales]
+
+
+def test_both_backends_leave_out_groups_whose_orders_were_retracted(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, 'KPI_BACKEND', 'duckdb')
+    monkeypatch.setattr(settings, 'PARQUET_PATH', str(tmp_path / 'parquet'))
+
+    def load(order_id, channel):
+        main_flow.load_to_canonical.fn(pd.DataFrame({
+            'order_id': [order_id], 'channel': [channel], 'product_id': ['P1'], 'status': ['completed'],
+            'amount': [10.0], 'net_amount': [10.0], 'currency': ['USD'],
+            'timestamp_utc': [pd.Timestamp('2024-03-01 10:00')], 'raw_event_id': [1],
+        }), pd.DataFrame(), raise_errors=True)
+
+    load('A-1', 'web')
+    load('B-1', 'retail')
+    # A-1 moves to retail: its web order is retracted
+    load('A-1', 'retail')
+
+    async def from_rollups():
+        async with AsyncSessionLocal() as session:
+            return await SQLAnalytics(session).aggregate(['channel'])
+
+    sql = asyncio.run(from_rollups())
+    duck = DuckDBAnalytics(settings.PARQUET_PATH)._aggregate(['channel'], None, None, {})
+
+    assert sql.to_dict('records') == [{'channel': 'retail', 'orders': 2, 'revenue': 20.0}]
+    assert duck.to_dict('records') == sql.to_dict('records')
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from app.core.config import settings
+from app.etl.processors import currency
+
+
+def test_orders_are_converted_at_the_rate_in_effect_on_their_day(monkeypatch, tmp_path):
+    rates = tmp_path / 'rates.csv'
+    rates.write_text(
+        "date,currency,rate\n"
+        "2024-01-01,EUR,1.10\n"
+        "2024-02-01,EUR,1.20\n"
+    )
+    monkeypatch.setattr(settings, 'FX_RATES_PATH', str(rates))
+    currency._rate_cache.clear()
+    df = pd.DataFrame({
+        'amount': [100.0, 100.0, 100.0, 100.0, 100.0],
+        'currency': ['eur', 'EUR', 'EUR', 'USD', 'XYZ'],
+        'timestamp_utc': pd.to_datetime([
+            '2024-01-15 12:00', '2024-02-01 09:00', '2023-12-01 12:00', '2024-01-15 12:00', '2024-01-15 12:00',
+        ]),
+    })
+
+    try:
+        out = currency.normalise(df)
+    finally:
+        currency._rate_cache.clear()
+
+    # As of mid-January, the February quote, before the table (earliest
+    # rate), USD as is, unknown currencies at par
+    assert out['net_amount'].round(6).tolist() == [110.0, 120.0, 110.0, 100.0, 100.0]
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.core import cache
+from app.main import app
+from app.models.rollup import DailySalesRollup
+
+
+def test_dashboard_streams_every_panel_as_one_json_line(db):
+    today = datetime.utcnow().date()
+    db.add_all([
+        DailySalesRollup(day=today - timedelta(days=d), channel=channel, product_id='P1',
+                         status='completed', order_count=1, amount=amount, net_amount=amount)
+        for d in range(1, 15) for channel, amount in (('Web', 100.0), ('Retail', 40.0))
+    ])
+    db.commit()
+    cache.results.clear()
+    client = TestClient(app)
+
+    response = client.get('/api/dashboard', params={'days': 7, 'forecast_days': 3})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    panels = {line['panel']: line['data'] for line in lines}
+    assert len(panels) == len(lines)
+    assert set(panels) == {'summary', 'daily', 'channels', 'forecast', 'insights'}
+    assert panels['channels'] == [
+        {'channel': 'Web', 'orders': 7, 'revenue': 700.0},
+        {'channel': 'Retail', 'orders': 7, 'revenue': 280.0},
+    ]
+    assert len(panels['daily']) == 7
+    assert len(panels['forecast']) == 3
+
+    # Unchanged data: the client's copy is still current
+    again = client.get('/api/dashboard', params={'days': 7, 'forecast_days': 3},
+                       headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
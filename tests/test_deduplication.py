@@ -0,0 +1,23 @@
+from app.etl.processors import deduplication
+
+NAMES = ['Jane Smith', 'Jane Smiht', 'jane smith', 'John Brown', 'Jon Brown', 'Ana Lopez']
+
+
+def test_pooled_scoring_runs_in_spawned_workers_and_matches_in_process(monkeypatch):
+    serial = deduplication.build_customer_mapping(NAMES, workers=1)
+    monkeypatch.setattr(deduplication, 'PARALLEL_MIN_PAIRS', 0)
+
+    try:
+        first = deduplication.build_customer_mapping(NAMES, workers=2)
+        pool = deduplication._pool
+        second = deduplication.build_customer_mapping(NAMES, workers=2)
+
+        assert pool._mp_context.get_start_method() == 'spawn'
+        # Reused across calls, as ETL makes one per chunk
+        assert deduplication._pool is pool
+    finally:
+        deduplication._discard_pool()
+
+    assert first == second == serial
+    assert serial['Jane Smith'] == serial['Jane Smiht'] == serial['jane smith']
+    assert serial['John Brown'] != serial['Jane Smith']
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from app.models.job import EtlJob
+from app.services.etl_jobs import JobQueue
+
+
+def test_recover_fails_expired_jobs_of_other_processes_and_queues_one_run(db, monkeypatch):
+    now = datetime.utcnow()
+    stale = now - timedelta(hours=1)
+    db.add_all([
+        EtlJob(id='queued', status='queued', owner='dead', heartbeat_at=stale),
+        EtlJob(id='running', status='running', owner='dead', heartbeat_at=stale),
+        EtlJob(id='unowned', status='running', created_at=stale),
+        EtlJob(id='done', status='succeeded', owner='dead', heartbeat_at=stale),
+        # Another API process that is still beating
+        EtlJob(id='alive', status='running', owner='other', heartbeat_at=now),
+    ])
+    db.commit()
+    queue = JobQueue(owner='this')
+    started = []
+    monkeypatch.setattr(queue, '_start', started.append)
+
+    job_id = queue.recover()
+
+    db.expire_all()
+    statuses = {job.id: (job.status, job.trigger) for job in db.query(EtlJob)}
+    assert statuses.pop(job_id) == ('queued', 'recovery')
+    assert statuses == {
+        'queued': ('failed', None), 'running': ('failed', None), 'unowned': ('failed', None),
+        'done': ('succeeded', None), 'alive': ('running', None),
+    }
+    assert started == [job_id]
+
+
+def test_recover_leaves_this_processes_jobs_alone(db, monkeypatch):
+    db.add(EtlJob(id='mine', status='running', owner='this',
+                  heartbeat_at=datetime.utcnow() - timedelta(hours=1)))
+    db.commit()
+    queue = JobQueue(owner='this')
+    monkeypatch.setattr(queue, '_start', lambda job_id: None)
+
+    assert queue.recover() is None
+    db.expire_all()
+    assert db.get(EtlJob, 'mine').status == 'running'
+
+
+def test_heartbeat_refreshes_only_this_processes_active_jobs(db):
+    stale = datetime.utcnow() - timedelta(hours=1)
+    db.add_all([
+        EtlJob(id='mine', status='queued', owner='this', heartbeat_at=stale),
+        EtlJob(id='finished', status='succeeded', owner='this', heartbeat_at=stale),
+        EtlJob(id='theirs', status='running', owner='other', heartbeat_at=stale),
+    ])
+    db.commit()
+
+    JobQueue(owner='this').heartbeat()
+
+    db.expire_all()
+    beats = {job.id: job.heartbeat_at > stale for job in db.query(EtlJob)}
+    assert beats == {'mine': True, 'finished': False, 'theirs': False}
+
+
+def test_recover_without_orphans_queues_nothing(db, monkeypatch):
+    queue = JobQueue()
+    monkeypatch.setattr(queue, '_start', lambda job_id: None)
+
+    assert queue.recover() is None
+    assert db.query(EtlJob).count() == 0
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from app.services import event_stream
+
+
+@pytest.fixture
+def batcher(monkeypatch):
+    written, queued = [], []
+    monkeypatch.setattr(event_stream, 'write_events', written.append)
+    monkeypatch.setattr(event_stream.job_queue, 'submit', lambda trigger: queued.append(time.monotonic()))
+    batcher = event_stream.MicroBatcher(batch_size=1, max_wait=0.01, capacity=100, etl_interval=0.3)
+    yield batcher, written, queued
+    batcher.close()
+
+
+def test_etl_runs_are_rate_limited_but_never_skipped(batcher):
+    batcher, written, queued = batcher
+    start = time.monotonic()
+    for i in range(5):
+        batcher.put([{'order_id': i}], timeout=1)
+        time.sleep(0.02)
+    while len(queued) < 2 and time.monotonic() - start < 2:
+        time.sleep(0.01)
+
+    assert len(written) == 5
+    # One run right after the first write, one for the rest once the interval passed
+    assert len(queued) == 2
+    assert queued[1] - queued[0] >= 0.3
+
+
+def test_close_queues_the_owed_run_at_once(batcher):
+    batcher, written, queued = batcher
+    batcher.put([{'order_id': 1}], timeout=1)
+    batcher.put([{'order_id': 2}], timeout=1)
+    batcher.close()
+
+    assert len(written) == 2
+    assert len(queued) == 2
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.core import cache, executor
+from app.core.config import settings
+from app.main import app
+from app.models.rollup import DailySalesRollup
+from app.services import ingest_service
+
+
+def test_kpis_are_served_while_uploads_and_reports_hold_their_executors(db, monkeypatch):
+    today = datetime.utcnow().date()
+    db.add_all([
+        DailySalesRollup(day=today - timedelta(days=d), channel='Web', product_id='P1',
+                         status='completed', order_count=1, amount=100.0, net_amount=100.0)
+        for d in range(1, 15)
+    ])
+    db.commit()
+    cache.results.clear()
+    release = threading.Event()
+
+    def slow_stage_upload(*args, **kwargs):
+        release.wait(30)
+        return {"rows": 0, "chunks": 0, "staged": 0, "skipped": 0, "batch_id": None}
+
+    monkeypatch.setattr(ingest_service, 'stage_upload', slow_stage_upload)
+
+    async def busy_then_kpis():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            # An upload in flight, and every ingest and report thread taken
+            upload = asyncio.create_task(client.post(
+                '/api/ingest/upload', files={'file': ('orders.csv', b'order_id\nO-1\n', 'text/csv')}
+            ))
+            blockers = [executor.run_ingest(release.wait, 30) for _ in range(settings.INGEST_WORKERS)]
+            blockers += [executor.run_report(release.wait, 30) for _ in range(settings.REPORT_WORKERS)]
+            blocked = asyncio.gather(*blockers)
+            try:
+                summary = await asyncio.wait_for(client.get('/api/kpis/summary', params={'days': 7}), 10)
+                dashboard = await asyncio.wait_for(
+                    client.get('/api/dashboard', params={'days': 7, 'forecast_days': 3}), 10
+                )
+                assert not upload.done()
+            finally:
+                release.set()
+            await blocked
+            return summary, dashboard, await upload
+
+    summary, dashboard, upload = asyncio.run(busy_then_kpis())
+
+    assert summary.status_code == 200
+    assert dashboard.status_code == 200
+    assert len(dashboard.text.splitlines()) == 5
+    assert upload.status_code == 200
@@ -0,0 +1,47 @@
+import io
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from app.models.sales_event import SalesEvent
+from app.services import export
+
+
+def _add_sales(db):
+    db.add_all([
+        SalesEvent(order_id=f'A-{i}', customer_id='C1', product_id='P1', amount=10.0 + i, currency='USD',
+                   net_amount=10.0 + i, channel='Web' if i % 2 else 'Retail', status='completed',
+                   timestamp_utc=datetime(2024, 3, 1 + i, 12))
+        for i in range(6)
+    ])
+    db.commit()
+
+
+def _read(fmt, data: bytes) -> pd.DataFrame:
+    if fmt == 'csv':
+        return pd.read_csv(io.BytesIO(data))
+    if fmt == 'parquet':
+        return pq.read_table(io.BytesIO(data)).to_pandas()
+    return pd.read_excel(io.BytesIO(data), sheet_name='sales_events')
+
+
+def test_every_format_streams_the_filtered_rows(db):
+    _add_sales(db)
+
+    for fmt in export.FORMATS:
+        batches = export.iter_batches(start=date(2024, 3, 2), end=date(2024, 3, 5),
+                                      channel=['Web'], batch_size=1)
+        df = _read(fmt, b''.join(export.WRITERS[fmt](batches)))
+
+        assert list(df.columns) == export.EXPORT_COLUMNS, fmt
+        assert df['order_id'].tolist() == ['A-1', 'A-3'], fmt
+        assert df['net_amount'].tolist() == [11.0, 13.0], fmt
+
+
+def test_an_empty_export_still_has_the_header(db):
+    for fmt in export.FORMATS:
+        df = _read(fmt, b''.join(export.stream(fmt, channel=['Nowhere'])))
+
+        assert list(df.columns) == export.EXPORT_COLUMNS, fmt
+        assert df.empty, fmt
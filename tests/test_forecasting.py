@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from app.services.forecasting import ForecastEngine
+
+
+def test_segments_without_recent_sales_are_zero_filled_to_the_common_end():
+    days = pd.date_range('2024-01-01', periods=28, freq='D')
+    series = {
+        'web': pd.Series(100.0, index=days),
+        # Stopped selling two weeks before the other segment's last day
+        'retail': pd.Series(100.0, index=days[:14]),
+    }
+    engine = ForecastEngine(workers=1, vectorized_max_days=365)
+
+    forecast = engine.forecast_many(series, horizon=7)
+
+    expected_days = pd.date_range('2024-01-29', periods=7, freq='D')
+    for key in series:
+        rows = forecast[forecast['series'] == key]
+        assert (pd.DatetimeIndex(rows['day']) == expected_days).all()
+    web = forecast.loc[forecast['series'] == 'web', 'revenue'].to_numpy()
+    retail = forecast.loc[forecast['series'] == 'retail', 'revenue'].to_numpy()
+    assert np.allclose(web, 100.0)
+    assert (retail < 10.0).all()
+
+
+def test_series_are_fitted_in_spawned_worker_processes():
+    days = pd.date_range('2024-01-01', periods=120, freq='D')
+    series = {key: pd.Series(100.0 + np.arange(120) % 7, index=days) for key in ('web', 'retail')}
+    engine = ForecastEngine(workers=2, vectorized_max_days=30)
+
+    try:
+        forecast = engine.forecast_many(series, horizon=7)
+        assert engine._pool._mp_context.get_start_method() == 'spawn'
+    finally:
+        engine._pool.shutdown()
+
+    assert engine.stats['failures'] == 0
+    assert engine.stats['statsmodels_fits'] == 2
+    assert len(forecast) == 14
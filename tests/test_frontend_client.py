@@ -0,0 +1,39 @@
+import sys
+from datetime import date
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+pytest.importorskip("streamlit")
+# The frontend runs with PYTHONPATH=src
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from frontend import client  # noqa: E402
+
+
+def test_prefetch_runs_once_per_data_version(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(client, "_in_pool", lambda fn, *args: submitted.append(args))
+
+    def fetch_panels(days):
+        return days
+
+    client.prefetch(fetch_panels, [(7,), (90,)], 'W/"1-2024-03-01"')
+    client.prefetch(fetch_panels, [(7,), (90,)], 'W/"1-2024-03-01"')
+    assert submitted == [(7,), (90,)]
+
+    client.prefetch(fetch_panels, [(7,)], 'W/"2-2024-03-01"')
+    client.prefetch(fetch_panels, [(7,)], None)
+    assert submitted == [(7,), (90,), (7,)]
+
+
+def test_export_url_repeats_multi_valued_filters(monkeypatch):
+    monkeypatch.setattr(client, "PUBLIC_API_URL", "https://api.example.com")
+
+    url = client.export_url("parquet", start=date(2024, 3, 1), channel=("Web", "Retail"))
+
+    parts = urlsplit(url)
+    assert parts.netloc == "api.example.com" and parts.path == "/api/export"
+    assert parse_qs(parts.query) == {
+        "format": ["parquet"], "channel": ["Web", "Retail"], "start": ["2024-03-01"],
+    }
@@ -0,0 +1,55 @@
+import io
+
+from fastapi.testclient import TestClient
+
+from app.etl import raw_batches
+from app.main import app
+from app.models.raw import RawBatch
+from app.services import ingest_service
+
+CSV = b"order_id,amount,timestamp\nO-1,10,2024-03-01\nO-2,20,2024-03-02\n"
+
+
+def _upload(db):
+    return ingest_service.stage_upload(db, io.BytesIO(CSV), 'orders.csv')
+
+
+def test_a_file_is_a_duplicate_only_once_its_batch_is_loaded(db):
+    first = _upload(db)['batch_id']
+
+    # Still pending: staged again, the hash stays with the first batch
+    second = _upload(db)
+    assert second['staged'] == 2 and 'duplicate_of' not in second
+    assert db.get(RawBatch, second['batch_id']).content_hash is None
+
+    raw_batches.set_status(db, raw_batches.refs(first, 0, 2), 'processed')
+    db.commit()
+    assert _upload(db)['duplicate_of'] == first
+
+
+def test_a_batch_with_failed_rows_releases_its_hash(db):
+    first = _upload(db)['batch_id']
+    raw_batches.set_status(db, raw_batches.refs(first, 0, 1), 'processed')
+    raw_batches.set_status(db, raw_batches.refs(first, 1, 2), 'failed')
+    db.commit()
+
+    again = _upload(db)
+    assert again['staged'] == 2 and 'duplicate_of' not in again
+    db.expire_all()
+    assert db.get(RawBatch, first).content_hash is None
+    assert db.get(RawBatch, again['batch_id']).content_hash is not None
+
+
+def test_upload_progress_is_published_under_the_upload_id(db):
+    client = TestClient(app)
+    assert client.get('/api/ingest/uploads/first-upload').status_code == 404
+
+    response = client.post('/api/ingest/upload', files={'file': ('orders.csv', CSV, 'text/csv')},
+                           data={'upload_id': 'first-upload'})
+
+    assert response.status_code == 200
+    assert response.json()['upload_id'] == 'first-upload'
+    progress = client.get('/api/ingest/uploads/first-upload').json()
+    assert progress['status'] == 'done'
+    assert (progress['rows'], progress['chunks'], progress['staged']) == (2, 1, 2)
+    assert progress['bytes_read'] == progress['total_bytes'] == len(CSV)
@@ -0,0 +1,19 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.insights.generator import ANOMALY_DAYS, build_insights
+
+
+def test_todays_partial_day_is_not_scored_as_a_drop():
+    today = date(2024, 6, 15)
+    days = [today - timedelta(days=n) for n in range(ANOMALY_DAYS)]
+    segments = pd.DataFrame({
+        'day': days, 'channel': 'web', 'product_id': 'P1',
+        # Steady full days; today has only its first hour of sales so far
+        'revenue': [1000.0 if day < today else 40.0 for day in days],
+    })
+
+    insights = build_insights(segments, pd.DataFrame(), today)
+
+    assert [i['type'] for i in insights] == ['general']
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.core import cache
+from app.models.base import AsyncSessionLocal
+from app.models.rollup import DailySalesRollup
+from app.services.kpi_service import KPIService
+
+
+def _rollup(day, channel, status, orders, revenue):
+    return DailySalesRollup(day=day, channel=channel, product_id='p1', status=status,
+                            order_count=orders, amount=revenue, net_amount=revenue)
+
+
+def test_conversion_by_channel_counts_completed_orders_in_the_period(db):
+    today = datetime.utcnow().date()
+    db.add_all([
+        _rollup(today - timedelta(days=1), 'Web', 'completed', 2, 200.0),
+        _rollup(today - timedelta(days=1), 'Web', 'cancelled', 5, 500.0),
+        _rollup(today - timedelta(days=1), 'Retail', 'completed', 1, 50.0),
+        # Before the 7-day period
+        _rollup(today - timedelta(days=20), 'Retail', 'completed', 9, 900.0),
+    ])
+    db.commit()
+    cache.results.clear()
+
+    async def conversion():
+        async with AsyncSessionLocal() as session:
+            return await KPIService(session).get_conversion_by_channel(days=7)
+
+    df = asyncio.run(conversion())
+
+    rows = {row.channel: (row.conversions, row.revenue) for row in df.itertuples()}
+    assert rows == {'Retail': (1, 50.0), 'Web': (2, 200.0)}
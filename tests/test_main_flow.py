@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from app.etl.flows import main_flow
+from app.etl.pipeline import PipelineError
+
+
+def test_failed_chunk_stops_the_chunked_run(db, monkeypatch):
+    chunks = [(pd.DataFrame({'raw_event_id': [1]}), pd.DataFrame()) for _ in range(3)]
+    loaded = []
+
+    def upsert(db, frame):
+        loaded.append(frame)
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(main_flow, 'iter_raw_event_chunks', lambda worker_id, size: iter(chunks))
+    monkeypatch.setattr(main_flow.clean_data, 'fn', lambda chunk: chunk)
+    monkeypatch.setattr(main_flow.canonical, 'build_sales_frame', lambda df: df)
+    monkeypatch.setattr(main_flow.canonical, 'upsert_sales_events', upsert)
+
+    with pytest.raises(PipelineError, match="database is gone"):
+        main_flow.run_chunked('worker', 1, 1)
+    assert len(loaded) == 1
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, inspect
+
+from app.models import raw  # noqa: F401
+from app.models.base import add_missing_columns
+
+
+def test_lease_columns_are_added_to_an_old_raw_events_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE raw_events (id INTEGER PRIMARY KEY, source VARCHAR, data JSON, "
+            "timestamp DATETIME, status VARCHAR)"
+        )
+        conn.exec_driver_sql("INSERT INTO raw_events (id, status) VALUES (1, 'pending')")
+
+    add_missing_columns(engine)
+    # Idempotent: a second startup finds nothing to add
+    add_missing_columns(engine)
+
+    columns = {column['name'] for column in inspect(engine).get_columns('raw_events')}
+    assert {'claimed_by', 'lease_until'} <= columns
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT status, claimed_by FROM raw_events").all() == [('pending', None)]
@@ -0,0 +1,25 @@
+from app.models.customer import CustomerAlias
+from app.services import name_index
+
+
+def _index(db):
+    return {row.name: row.canonical_name for row in db.query(CustomerAlias)}
+
+
+def test_merging_clusters_moves_every_member(db):
+    name_index.save_mapping(db, {
+        "John Smith": "John Smith", "Jon Smith": "John Smith", "J. Smith": "John Smith",
+        "Johnny Smith": "Johnny Smith", "Johny Smith": "Johnny Smith",
+    })
+    # A new name links one member of each cluster; the other members were
+    # not loaded as candidates but must follow their cluster
+    name_index.save_mapping(db, {"Jon Smith": "John Smith", "Johny Smith": "John Smith", "Jonny Smith": "John Smith"})
+
+    assert set(_index(db).values()) == {"John Smith"}
+
+
+def test_unrelated_clusters_are_untouched(db):
+    name_index.save_mapping(db, {"Ali Khan": "Ali Khan", "Sara Malik": "Sara Malik"})
+    name_index.save_mapping(db, {"Ali Khann": "Ali Khan"})
+
+    assert _index(db) == {"Ali Khan": "Ali Khan", "Sara Malik": "Sara Malik", "Ali Khann": "Ali Khan"}
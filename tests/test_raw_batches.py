@@ -0,0 +1,153 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.core.config import settings
+from app.etl import leases, raw_batches
+from app.etl.loaders import canonical
+from app.models.base import SessionLocal
+from app.models.raw import RawBatch, RawBatchRange
+from app.models.sales_event import SalesEvent
+
+
+def _batch(db, rows):
+    frame = pd.DataFrame({'order_id': [f'O-{i}' for i in range(rows)], 'amount': ['1.0'] * rows})
+    return raw_batches.write_batch(db, [frame], source='orders.csv')['batch_id']
+
+
+def _ranges(db, batch_id):
+    return [(r.start, r.stop, r.status) for r in
+            db.query(RawBatchRange).filter(RawBatchRange.batch_id == batch_id).order_by(RawBatchRange.start)]
+
+
+def test_set_status_splits_ranges_at_run_boundaries(db):
+    batch_id = _batch(db, 100)
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 10, 20), 'processed')
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 30, 35), 'failed')
+
+    assert _ranges(db, batch_id) == [
+        (0, 10, 'pending'), (10, 20, 'processed'), (20, 30, 'pending'), (30, 35, 'failed'), (35, 100, 'pending'),
+    ]
+
+
+def test_set_status_merges_equal_neighbours(db):
+    batch_id = _batch(db, 100)
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 0, 40), 'processed')
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 60, 100), 'processed')
+    # One call with two runs around a failed row, then the gap between chunks
+    ids = [*raw_batches.refs(batch_id, 40, 45), *raw_batches.refs(batch_id, 46, 50)]
+    raw_batches.set_status(db, ids, 'processed')
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 45, 46), 'failed')
+    raw_batches.set_status(db, raw_batches.refs(batch_id, 50, 60), 'processed')
+
+    assert _ranges(db, batch_id) == [(0, 45, 'processed'), (45, 46, 'failed'), (46, 100, 'processed')]
+
+
+def test_racing_claims_get_disjoint_ranges_covering_the_batch(db):
+    batch_id = _batch(db, 1000)
+    claims, start = [], threading.Barrier(4)
+
+    def worker():
+        session = SessionLocal()
+        worker_id = leases.new_worker_id()
+        try:
+            start.wait()
+            while True:
+                claim = leases.claim_range(session, worker_id, 7, 60)
+                if claim is None:
+                    return
+                claims.append(claim)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rows = sorted(row for b, first, stop in claims for row in range(first, stop))
+    assert {b for b, _, _ in claims} == {batch_id}
+    assert rows == list(range(1000))
+
+
+def test_loaded_batch_rows_keep_their_batch_reference(db):
+    batch_id = _batch(db, 2)
+    refs = raw_batches.refs(batch_id, 0, 2)
+    frame = canonical.build_sales_frame(pd.DataFrame({
+        'order_id': ['O-0', 'O-1'], 'timestamp_utc': [pd.Timestamp('2024-03-01')] * 2, 'raw_event_id': refs,
+    }))
+    canonical.upsert_sales_events(db, frame)
+    db.commit()
+
+    rows = db.query(SalesEvent.order_id, SalesEvent.raw_event_id, SalesEvent.raw_batch_ref).order_by(SalesEvent.order_id)
+    assert [tuple(row) for row in rows] == [('O-0', None, int(refs[0])), ('O-1', None, int(refs[1]))]
+
+
+def test_collect_garbage_removes_old_finished_batches_only(db):
+    done, pending, recent = _batch(db, 10), _batch(db, 10), _batch(db, 10)
+    for batch_id in (done, recent):
+        raw_batches.set_status(db, raw_batches.refs(batch_id, 0, 10), 'processed')
+    db.query(RawBatch).filter(RawBatch.id.in_([done, pending])).update(
+        {'timestamp': datetime.utcnow() - timedelta(days=30)}, synchronize_session=False
+    )
+    db.commit()
+    files = {b.id: os.path.join(settings.RAW_BATCH_DIR, b.path) for b in db.query(RawBatch)}
+
+    assert raw_batches.collect_garbage(db, retention_days=7) == 1
+
+    db.expire_all()
+    assert db.get(RawBatch, done).path is None
+    assert not os.path.exists(files[done])
+    assert _ranges(db, done) == []
+    assert all(os.path.exists(files[b]) for b in (pending, recent))
+
+
+def test_compact_merges_small_pending_batches_of_a_source(db):
+    small = [raw_batches.write_batch(db, [pd.DataFrame({'order_id': [f'E-{i}-{j}' for j in range(3)]})],
+                                     source='events')['batch_id'] for i in range(5)]
+    upload = _batch(db, 3)
+    started = small.pop()
+    claim = leases.claim_range(db, 'other-worker', None, 60)
+    assert claim[0] == small[0]
+    db.rollback()
+    raw_batches.set_status(db, raw_batches.refs(started, 0, 1), 'processed')
+    db.commit()
+    files = {b.id: os.path.join(settings.RAW_BATCH_DIR, b.path) for b in db.query(RawBatch)}
+
+    # The claimed and the partly processed batch are not touched; two of the
+    # other three fit in 6 rows, the last one has nothing to merge with
+    assert raw_batches.compact(db, 'events', 6, 'compactor', 60) == 2
+
+    batches = {b.id: b for b in db.query(RawBatch)}
+    assert {small[0], small[3], started, upload} <= set(batches)
+    assert not {small[1], small[2]} & set(batches)
+    merged = max(batches)
+    assert batches[merged].rows == 6
+    assert _ranges(db, merged) == [(0, 6, 'pending')]
+    assert raw_batches.read_rows(db, merged, 0, 6)['order_id'].tolist() == [
+        f'E-{i}-{j}' for i in (1, 2) for j in range(3)
+    ]
+    assert [os.path.exists(files[b]) for b in small] == [True, False, False, True]
+
+
+def test_compact_merges_only_batches_with_the_same_timestamp_format(db):
+    def push(*days):
+        frame = pd.DataFrame({'order_id': [f'E-{d}' for d in days], 'timestamp': list(days)})
+        return raw_batches.write_batch(db, [frame], source='events')['batch_id']
+
+    iso = push('2024-03-01')
+    day_first = push('03/04/2024')
+    iso_later = push('2024-03-05')
+    formats = {b.id: b.timestamp_format for b in db.query(RawBatch)}
+    assert formats[iso] == formats[iso_later] != formats[day_first]
+
+    assert raw_batches.compact(db, 'events', 10, 'compactor', 60) == 2
+
+    batches = {b.id: b for b in db.query(RawBatch)}
+    assert set(batches) == {day_first, max(batches)}
+    merged = batches[max(batches)]
+    assert merged.timestamp_format == formats[iso]
+    assert raw_batches.read_rows(db, merged.id, 0, 2)['order_id'].tolist() == ['E-2024-03-01', 'E-2024-03-05']
@@ -0,0 +1,47 @@
+import asyncio
+import sys
+import types
+
+from app.core.cache import bump_data_version
+from app.models.base import AsyncSessionLocal
+from app.services.reports import ReportService
+
+
+def test_reports_are_rendered_once_per_data_version(db, monkeypatch):
+    renders = []
+
+    async def collect_report_data(session, days=30):
+        return {'data_version': version, 'days': days}
+
+    def render_pdf(data, client_name):
+        renders.append((client_name, data['data_version']))
+        return b'%PDF-' + client_name.encode()
+
+    # The renderer itself (WeasyPrint) is not under test
+    monkeypatch.setitem(sys.modules, 'app.generate_report', types.SimpleNamespace(
+        collect_report_data=collect_report_data, render_pdf=render_pdf,
+    ))
+    service = ReportService(cache_bytes=1024)
+
+    async def request_twice():
+        async with AsyncSessionLocal() as session:
+            first = await service.request(session, 'Acme')
+            # Joins the render in progress
+            second = await service.request(session, 'Acme')
+            await first.task
+            # Served from the cache once ready
+            third = await service.request(session, 'Acme')
+        return first, second, third
+
+    version = 0
+    first, second, third = asyncio.run(request_twice())
+    assert first is second is third
+    assert first.status == 'ready'
+    assert service.pdf(first.id) == b'%PDF-Acme'
+
+    bump_data_version(db)
+    db.commit()
+    version = 1
+    fresh, _, _ = asyncio.run(request_twice())
+    assert fresh.id != first.id
+    assert renders == [('Acme', 0), ('Acme', 1)]
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from app.etl.loaders import rollups
+from app.models.rollup import DailySalesRollup
+
+
+def _sales(status, amount):
+    return pd.DataFrame({
+        'timestamp_utc': [pd.Timestamp('2024-03-01 10:00')], 'channel': ['web'], 'product_id': ['P1'],
+        'status': [status], 'amount': [amount], 'net_amount': [amount],
+    })
+
+
+def test_rows_left_without_orders_are_deleted(db):
+    rollups.apply_deltas(db, rollups.aggregate(_sales('pending', 10.0)))
+    db.commit()
+
+    # The order is completed: it leaves the pending row
+    rollups.apply_deltas(db, pd.concat([
+        rollups.aggregate(_sales('completed', 10.0)),
+        rollups.aggregate(_sales('pending', 10.0), sign=-1),
+    ], ignore_index=True))
+    db.commit()
+
+    rows = db.query(DailySalesRollup.status, DailySalesRollup.order_count, DailySalesRollup.net_amount).all()
+    assert rows == [('completed', 1, 10.0)]
@@ -0,0 +1,31 @@
+import asyncio
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.models.base import begin_snapshot
+
+
+def test_reads_after_begin_snapshot_see_one_state(tmp_path):
+    path = tmp_path / 'snapshot.db'
+    writer = create_engine(f"sqlite:///{path}")
+    with writer.begin() as conn:
+        # WAL lets the writer commit while the snapshot is open
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("CREATE TABLE data_versions (version INTEGER)")
+        conn.exec_driver_sql("INSERT INTO data_versions VALUES (1)")
+
+    async def read_twice():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with AsyncSession(engine) as db:
+                await begin_snapshot(db)
+                before = (await db.execute(text("SELECT version FROM data_versions"))).scalar()
+                with writer.begin() as conn:
+                    conn.exec_driver_sql("UPDATE data_versions SET version = 2")
+                after = (await db.execute(text("SELECT version FROM data_versions"))).scalar()
+            return before, after
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(read_twice()) == (1, 1)
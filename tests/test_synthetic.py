@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import pandas as pd
+
+from app.etl import synthetic
+
+
+def test_generated_sales_are_reproducible_and_within_the_window():
+    end = datetime(2024, 3, 31, 12)
+    df = synthetic.generate_sales(5000, days=30, seed=7, end=end, duplicate_rate=0.1)
+
+    assert df.equals(synthetic.generate_sales(5000, days=30, seed=7, end=end, duplicate_rate=0.1))
+    timestamps = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M:%S')
+    assert timestamps.min() >= pd.Timestamp('2024-03-02')
+    assert timestamps.max() < pd.Timestamp('2024-04-01')
+    assert set(df['currency']) == set(synthetic.CURRENCIES)
+    assert 0.05 < df['order_id'].duplicated().mean() < 0.15
+
+
+def test_chunks_have_globally_unique_order_ids():
+    chunks = list(synthetic.iter_sales_chunks(2500, chunk_size=1000, seed=1, duplicate_rate=0.0))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    order_ids = pd.concat(chunk['order_id'] for chunk in chunks)
+    assert order_ids.is_unique
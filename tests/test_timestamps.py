@@ -0,0 +1,76 @@
+import pandas as pd
+
+from app.core.config import settings
+from app.etl import raw_batches
+from app.etl.flows import main_flow
+from app.etl.processors import timestamps
+
+
+def _dates(values):
+    return [None if pd.isna(v) else v.strftime('%Y-%m-%d') for v in timestamps.parse(pd.Series(values), key=object())]
+
+
+def test_month_first_values_beyond_the_sample_decide_the_format():
+    # The first SAMPLE_SIZE distinct values all have a day <= 12
+    early = [f'{m:02d}/{d:02d}/{y}' for y in range(2001, 2021) for m in range(1, 13) for d in range(1, 13) if d != m]
+    values = early[:timestamps.SAMPLE_SIZE + 50] + ['03/25/2024']
+
+    parsed = _dates(values)
+
+    assert parsed[0] == '2001-01-02'
+    assert parsed[-1] == '2024-03-25'
+
+
+def test_ambiguous_day_month_order_follows_the_configuration(monkeypatch):
+    values = ['03/04/2024', '05/06/2024', '01/01/2024']
+    assert _dates(values) == ['2024-04-03', '2024-06-05', '2024-01-01']
+
+    monkeypatch.setattr(settings, 'DEFAULT_DATE_ORDER', 'month')
+    assert _dates(values) == ['2024-03-04', '2024-05-06', '2024-01-01']
+
+    monkeypatch.setattr(settings, 'DEFAULT_DATE_ORDER', 'day')
+    monkeypatch.setitem(settings.SOURCE_TIMESTAMP_FORMATS, 'us_*.csv', '%m/%d/%Y')
+    parsed = timestamps.parse(pd.Series(values), source='us_orders.csv')
+    assert parsed.dt.strftime('%Y-%m-%d').tolist() == ['2024-03-04', '2024-05-06', '2024-01-01']
+
+
+def test_day_equal_to_month_is_not_ambiguous():
+    assert _dates(['01/01/2024', '02/02/2024']) == ['2024-01-01', '2024-02-02']
+
+
+def test_a_cached_format_that_misses_is_inferred_again_from_every_value():
+    key = object()
+    first = timestamps.parse(pd.Series(['25/03/2024', '04/03/2024']), key=key)
+    assert first.dt.strftime('%Y-%m-%d').tolist() == ['2024-03-25', '2024-03-04']
+
+    # A later chunk that is month-first throughout is read month-first throughout
+    second = timestamps.parse(pd.Series(['03/26/2024', '04/03/2024']), key=key)
+    assert second.dt.strftime('%Y-%m-%d').tolist() == ['2024-03-26', '2024-04-03']
+
+
+def test_values_the_format_misses_are_not_read_with_another_one():
+    assert _dates(['2024-03-01', '2024-03-02', '03/25/2024', 'soon']) == ['2024-03-01', '2024-03-02', None, None]
+
+
+def test_inference_spans_every_chunk_of_a_batch(db, monkeypatch):
+    monkeypatch.setattr(settings, 'ETL_CHUNK_SIZE', 4)
+    # Only the last chunk shows the dates are month-first
+    days = [f'03/{d:02d}/2024 10:00' for d in (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 25)]
+    chunks = [pd.DataFrame({'order_id': [f'O-{i}', f'O-{i + 1}'], 'customer_id': 'c', 'amount': '1',
+                            'timestamp': days[i:i + 2]}) for i in range(0, len(days), 2)]
+    batch_id = raw_batches.write_batch(db, chunks, source='orders.csv')['batch_id']
+
+    loaded = []
+    for start in range(0, len(days), 4):
+        valid, invalid = main_flow.clean_data.fn(raw_batches.read_rows(db, batch_id, start, start + 4))
+        assert invalid.empty
+        loaded.extend(valid['timestamp_utc'].dt.strftime('%m-%d').tolist())
+
+    assert loaded == [f'03-{d[3:5]}' for d in days]
+
+
+def test_a_single_ambiguous_day_is_staged_with_the_default_order(db):
+    chunk = pd.DataFrame({'order_id': ['O-1', 'O-2'], 'timestamp': ['03/04/2024', '03/04/2024']})
+    batch_id = raw_batches.write_batch(db, [chunk], source='daily.csv')['batch_id']
+
+    assert raw_batches.read_rows(db, batch_id, 0, 2).attrs['timestamp_format'] == '%d/%m/%Y'
@@ -0,0 +1,53 @@
+import io
+
+import pandas as pd
+
+from app.etl import raw_batches
+from app.etl.flows import main_flow
+from app.services import ingest_service, upload_preview
+
+CSV = ("order_id,customer,total,order_date\n"
+       "O-1,c1,10.5,03/04/2024\n"
+       "O-2,c2,20,05/06/2024\n")
+
+
+def test_infer_column_shows_both_readings_of_ambiguous_dates():
+    column = upload_preview.infer_column(pd.Series(['03/04/2024', '05/06/2024']))
+
+    assert column == {'type': 'datetime', 'date_format': '%d/%m/%Y',
+                      'date_format_choices': ['%d/%m/%Y', '%m/%d/%Y']}
+
+
+def test_infer_column_matches_ingest_inference():
+    assert upload_preview.infer_column(pd.Series(['03/25/2024', '04/03/2024'])) == {
+        'type': 'datetime', 'date_format': '%m/%d/%Y', 'date_format_choices': None,
+    }
+    assert upload_preview.infer_column(pd.Series(['2024-03-01T10:00:00Z']))['date_format'] == 'ISO8601'
+    assert upload_preview.infer_column(pd.Series(['x', 'y'])) == {'type': 'string'}
+
+
+def test_sniff_proposes_mapping_from_headers_and_types(tmp_path):
+    path = tmp_path / 'orders.csv'
+    path.write_text(CSV)
+
+    preview = upload_preview.sniff(str(path), 'orders.csv')
+
+    assert preview['delimiter'] == ','
+    assert preview['mapping'] == {'order_id': 'order_id', 'customer_id': 'customer',
+                                  'amount': 'total', 'timestamp': 'order_date'}
+    assert [c['type'] for c in preview['columns']] == ['string', 'string', 'float', 'datetime']
+
+
+def test_confirmed_format_reaches_validation(db):
+    mapping = {'customer_id': 'customer', 'amount': 'total', 'timestamp': 'order_date'}
+    result = ingest_service.stage_upload(db, io.BytesIO(CSV.encode()), 'orders.csv', mapping=mapping,
+                                         timestamp_format='%m/%d/%Y')
+
+    valid, invalid = main_flow.clean_data.fn(raw_batches.read_rows(db, result['batch_id'], 0, 2))
+
+    assert invalid.empty
+    assert valid['timestamp_utc'].dt.strftime('%Y-%m-%d').tolist() == ['2024-03-04', '2024-05-06']
+    # Read the other way it is a different upload, not a duplicate
+    again = ingest_service.stage_upload(db, io.BytesIO(CSV.encode()), 'orders.csv', mapping=mapping)
+    assert again['batch_id'] is not None
+    assert raw_batches.read_rows(db, again['batch_id'], 0, 2).attrs['timestamp_format'] == '%d/%m/%Y'
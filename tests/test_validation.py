@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from app.etl.flows import main_flow
+from app.etl.processors import validation
+from app.etl.processors.validation import CompiledSchema, Field, code, describe
+
+SCHEMA = [
+    Field('order_id', required=True),
+    Field('amount', 'number', required=True, min=0, max=100),
+    Field('currency', 'category', pattern=r'[A-Z]{3}', case='upper'),
+    Field('status', 'category', allowed=['completed', 'refunded']),
+    Field('channel', 'category'),
+    Field('timestamp', 'datetime', min=pd.Timestamp('2000-01-01')),
+]
+
+
+def _code(*checks):
+    return sum(code(name, check, SCHEMA) for name, check in checks)
+
+
+def test_apply_sets_one_bit_per_failed_check():
+    df = pd.DataFrame({
+        'order_id': ['A', ' ', 'C', 'D', 'E', 'F', 'G'],
+        'amount': ['1.5', '2', 'x', '-1', None, '3', '4'],
+        'currency': ['usd', 'EUR', 'EUR', 'EURO', 'EUR', 'EUR', None],
+        'status': ['Completed', 'refunded', 'lost', 'completed', None, 'completed', 'completed'],
+        'channel': ['web', 'web', 'store', None, 'web', 'web', 'web'],
+        'timestamp': ['2024-03-01', '2024-03-02', 'soon', '1999-12-31', '2024-03-05', '2024-03-06', None],
+    })
+
+    _, codes = CompiledSchema(SCHEMA).apply(df)
+
+    assert codes.tolist() == [
+        0,
+        _code(('order_id', 'required')),
+        _code(('amount', 'type'), ('status', 'allowed'), ('timestamp', 'type')),
+        _code(('amount', 'range'), ('currency', 'pattern'), ('timestamp', 'range')),
+        _code(('amount', 'required')),
+        0,
+        0,
+    ]
+    assert describe(int(codes[2]), SCHEMA) == ['amount: type', 'status: allowed', 'timestamp: type']
+
+
+def test_missing_required_column_fails_every_row():
+    _, codes = CompiledSchema(SCHEMA).apply(pd.DataFrame({'amount': ['1', '2']}))
+
+    assert codes.tolist() == [_code(('order_id', 'required'))] * 2
+
+
+def test_apply_returns_typed_columns():
+    df = pd.DataFrame({
+        'order_id': [' A ', 'B', 'A'],
+        'amount': ['1.5', '2', None],
+        'currency': ['usd', 'eur', 'usd'],
+        'status': ['COMPLETED', 'refunded', 'lost'],
+        'channel': ['web', None, 'store'],
+        'timestamp': ['2024-03-01T10:00:00Z', '2024-03-02', None],
+    })
+
+    out, _ = CompiledSchema(SCHEMA).apply(df)
+
+    assert out['order_id'].dtype == object
+    assert out['order_id'].tolist() == ['A', 'B', 'A']
+    assert out['amount'].dtype == 'float64'
+    assert np.isnan(out['amount'].iloc[2])
+    assert out['currency'].dtype == 'category'
+    assert out['currency'].tolist() == ['USD', 'EUR', 'USD']
+    # Declared values keep their declared spelling and order
+    assert list(out['status'].cat.categories) == ['completed', 'refunded']
+    assert out['status'].tolist()[:2] == ['completed', 'refunded'] and pd.isna(out['status'].iloc[2])
+    assert pd.isna(out['channel'].iloc[1])
+    assert str(out['timestamp_utc'].dtype) == 'datetime64[ns]'
+    assert out['timestamp_utc'].tolist()[:2] == [pd.Timestamp('2024-03-01 10:00'), pd.Timestamp('2024-03-02')]
+    assert pd.isna(out['timestamp_utc'].iloc[2])
+    # The raw text is kept as it was
+    assert out['timestamp'].equals(df['timestamp'])
+
+
+def test_clean_data_marks_repeated_orders_as_duplicates():
+    df = pd.DataFrame({
+        'order_id': ['A', 'A', 'B'],
+        'customer_id': ['c1', 'c1', 'c2'],
+        'amount': ['1', '2', '3'],
+        'timestamp': ['2024-03-01', '2024-03-02', '2024-03-03'],
+        'raw_event_id': [1, 2, 3],
+    })
+
+    valid, invalid = main_flow.clean_data.fn(df)
+
+    assert sorted(valid['order_id']) == ['A', 'B']
+    assert invalid['error_codes'].tolist() == [validation.DUPLICATE_ORDER]
+    assert describe(validation.DUPLICATE_ORDER) == ['order_id: duplicate in batch']